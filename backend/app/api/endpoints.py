@@ -1,9 +1,38 @@
-from fastapi import APIRouter, UploadFile, File
-from app.core.ingest import parse_portfolio_csv
-from app.models import Portfolio, AnalysisResponse
+import os
+import shutil
+import tempfile
+from contextlib import AsyncExitStack
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Query
+from pydantic import ValidationError, TypeAdapter
+from typing import AsyncIterator, Iterator, List, Optional, Literal
+from app.core.ingest import parse_portfolio_csv, parse_portfolio_frame
+from app.models import (
+    Portfolio, AnalysisResponse, MonteCarloConfig, MonteCarloResult, ConcentrationRule, ExposureCubeResponse, CacheStats,
+    PortfolioDelta, DeltaAnalysisResponse, JobStatus, JobResult, AuditRecord, StressScenario, LibraryScenario,
+    ScenarioSet, SelectionRule, CalibrationConfig, ReverseStressConfig, ReverseStressResult,
+    BatchReport, PortfolioSensitivities, WhatIfRequest, WhatIfResult, ImpactQuery, LargeBookAnalysis
+)
+from fastapi.responses import StreamingResponse, Response
+from starlette.concurrency import iterate_in_threadpool
+from app.core.pipeline import run_analysis, analyze_frame_cached
+from app.core.streaming import stream_analysis
+from app.core.export import pnl_matrix_table, serialize_table
 from app.core.exposure import calculate_exposure
 from app.engine.scenarios import select_scenarios
-from app.engine.simulation import run_stress_test
+from app.engine.library import get_scenario_library, ScenarioInUse
+from app.engine.calibration import load_factor_history, calibrate_scenarios, get_calibration_cache
+from app.core.cache import result_cache
+from app.core.aggregation import aggregate_exposure, portfolio_metrics, evaluate_rules, DEFAULT_CONCENTRATION_RULES
+from app.engine.montecarlo import run_monte_carlo
+from app.engine.reverse import reverse_stress_test
+from app.engine.incremental import analysis_store
+from app.core.audit import audit_queue, audit_writer, make_audit_entry, AuditIndexDisabled
+from app.core.executor import admission, run_cpu_bound, run_in_thread
+from app.core.jobs import get_job_manager, JobQueueFull
+from app.core.batch import run_batch
+from app.core.outofcore import analyze_out_of_core
+from app.core.config import settings
+from app.core.metrics import stage
 
 router = APIRouter()
 
@@ -14,44 +43,537 @@ def read_root():
 @router.post("/upload_portfolio", response_model=Portfolio)
 async def upload_portfolio(file: UploadFile = File(...)):
     content = await file.read()
-    portfolio = parse_portfolio_csv(content, file.filename)
+    async with admission.slot(len(content)):
+        portfolio = await run_cpu_bound(parse_portfolio_csv, content, file.filename)
     return portfolio
 
-from app.core.audit import log_analysis_request
+ImpactOrder = Literal["worst", "best", "largest"]
+RollupDimension = Literal["sector", "issuer", "asset_class", "rating"]
+
+def _impact_query(top_k: Optional[int], impact_order: str, impact_threshold: Optional[float],
+                  rollup: List[str]) -> Optional[ImpactQuery]:
+    # No query keeps the full per-ticker impacts (and the original cache keys)
+    if top_k is None and impact_threshold is None and not rollup:
+        return None
+    return ImpactQuery(top_k=top_k, order=impact_order, threshold=impact_threshold, rollup=rollup)
+
+def _analyze_and_track(content: bytes, filename: str, revaluation: str = "linear",
+                       scenario_set: Optional[str] = None,
+                       impact_query: Optional[ImpactQuery] = None) -> AnalysisResponse:
+    # Keep the portfolio state so later deltas can be applied incrementally
+    with stage("ingest"):
+        frame = parse_portfolio_frame(content, filename)
+    response = analyze_frame_cached(frame, revaluation, scenario_set, impact_query)
+    state = analysis_store.register(frame)
+    return response.model_copy(update={"portfolio_id": state.portfolio_id})
 
 @router.post("/analyze", response_model=AnalysisResponse)
-async def analyze_portfolio(file: UploadFile = File(...)):
-    # 1. Ingest
+async def analyze_portfolio(
+    file: UploadFile = File(...),
+    track: bool = False,
+    revaluation: Literal["linear", "full"] = "linear",
+    scenario_set: Optional[str] = None,
+    top_k: Optional[int] = Query(None, ge=1),
+    impact_order: ImpactOrder = "largest",
+    impact_threshold: Optional[float] = Query(None, ge=0),
+    rollup: List[RollupDimension] = Query([])
+):
+    """
+    revaluation="full" adds bond convexity and reprices options with
+    Black-Scholes from the optional term columns (Option Type, Strike,
+    Expiry, Vol, Underlying Price, Beta, Convexity). scenario_set runs a
+    named set from the scenario library instead of rule-based selection.
+    Deltas applied to a tracked portfolio are always evaluated with the
+    linear model and rule-based selection.
+
+    position_impacts can be narrowed to the top_k tickers by impact_order
+    (worst, best or largest absolute P&L) and/or to those beyond
+    impact_threshold; rollup adds per-scenario P&L by sector, issuer,
+    asset class or rating.
+    """
+    if scenario_set is not None:
+        _set_or_404(scenario_set)
+    impact_query = _impact_query(top_k, impact_order, impact_threshold, rollup)
+
+    # 1-5. Ingest, exposure, scenarios, simulation, explanation (cached)
     content = await file.read()
-    portfolio = parse_portfolio_csv(content, file.filename)
-    
-    # 2. Exposure
-    exposure = calculate_exposure(portfolio)
-    
-    # 3. Scenarios
-    scenarios = select_scenarios(exposure)
-    
-    # 4. Simulation
-    raw_results = run_stress_test(portfolio, scenarios)
-    # Convert simulation results to dict for JSON response
-    results_dict = [r.model_dump() for r in raw_results]
-    
-    # 5. Explanation Stub
-    explanation = f"Analysis complete. Found {len(exposure.concentration_alerts)} concentration alerts. "
-    explanation += f"Selected {len(scenarios)} scenarios based on portfolio profile. "
-    worst_case = min(raw_results, key=lambda x: x.total_pnl) if raw_results else None
-    if worst_case:
-        explanation += f"Worst case scenario is '{worst_case.scenario_name}' with user estimated loss of {worst_case.percentage_loss:.1%}."
-
-    response = AnalysisResponse(
-        portfolio_summary=portfolio,
-        exposure_report=exposure,
-        selected_scenarios=scenarios,
-        simulation_results=results_dict,
-        risk_explanation=explanation
-    )
+    async with admission.slot(len(content)):
+        if track:
+            # Tracked state lives in this process, so stay on a thread
+            response = await run_in_thread(_analyze_and_track, content, file.filename, revaluation, scenario_set,
+                                           impact_query)
+        else:
+            response = await run_cpu_bound(run_analysis, content, file.filename, revaluation, scenario_set,
+                                           impact_query)
     
-    # 6. Audit Log
-    log_analysis_request(file.filename, response)
+    # 6. Audit Log (queued, written in the background)
+    with stage("audit"):
+        await audit_queue.submit(file.filename, response)
     
     return response
+
+def _prepare_analysis(content: bytes, filename: str, scenario_set: Optional[str] = None):
+    frame = parse_portfolio_frame(content, filename)
+    exposure = calculate_exposure(frame)
+    if scenario_set is not None:
+        return frame, exposure, get_scenario_library().resolve_set(scenario_set)
+    return frame, exposure, select_scenarios(exposure)
+
+@router.post("/analyze/stream")
+async def analyze_portfolio_stream(
+    file: UploadFile = File(...),
+    include_positions: bool = True,
+    revaluation: Literal["linear", "full"] = "linear",
+    scenario_set: Optional[str] = None,
+    top_k: Optional[int] = Query(None, ge=1),
+    impact_order: ImpactOrder = "largest",
+    impact_threshold: Optional[float] = Query(None, ge=0),
+    rollup: List[RollupDimension] = Query([])
+):
+    """
+    /analyze as NDJSON (application/x-ndjson), sent while scenarios are
+    simulated: summary, positions, exposure, scenarios, one line per
+    scenario result, explanation. include_positions=false skips echoing the
+    positions; revaluation and scenario_set choose the model and scenarios,
+    and top_k, impact_order, impact_threshold and rollup narrow each
+    scenario's position_impacts, as in /analyze. Results are not cached.
+    """
+    if scenario_set is not None:
+        _set_or_404(scenario_set)
+    impact_query = _impact_query(top_k, impact_order, impact_threshold, rollup)
+    content = await file.read()
+    # The slot is held until the last line is sent, not just while the analysis is prepared
+    slot = AsyncExitStack()
+    await slot.enter_async_context(admission.slot(len(content)))
+    try:
+        try:
+            frame, exposure, scenarios = await run_cpu_bound(_prepare_analysis, content, file.filename,
+                                                             scenario_set)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    except BaseException:
+        await slot.aclose()
+        raise
+    audit: List[dict] = []
+    lines = stream_analysis(frame, exposure, scenarios, file.filename, include_positions, impact_query,
+                            revaluation, audit.append)
+    return StreamingResponse(_release_after(slot, lines, audit), media_type="application/x-ndjson")
+
+async def _release_after(slot: AsyncExitStack, lines: Iterator[bytes], audit: List[dict]) -> AsyncIterator[bytes]:
+    # Scenarios are simulated on a worker thread; the slot is released once the
+    # stream ends, fails or the client goes away
+    try:
+        async for line in iterate_in_threadpool(lines):
+            yield line
+    finally:
+        await slot.aclose()
+    # Only a stream that ran to the end produces an audit entry
+    with stage("audit"):
+        for entry in audit:
+            await audit_queue.submit_entry(entry)
+
+def _pnl_matrix(content: bytes, filename: str, fmt: str):
+    frame, _, scenarios = _prepare_analysis(content, filename)
+    return serialize_table(pnl_matrix_table(frame, scenarios), fmt)
+
+@router.post("/analyze/matrix")
+async def analyze_pnl_matrix(file: UploadFile = File(...), format: Literal["arrow", "parquet"] = "arrow"):
+    """
+    The selected scenarios' P&L per position as an Arrow IPC file or Parquet
+    (one "pnl:<scenario name>" column per scenario) instead of nested JSON.
+    Needs pyarrow.
+    """
+    content = await file.read()
+    async with admission.slot(len(content)):
+        try:
+            body, media_type = await run_cpu_bound(_pnl_matrix, content, file.filename, format)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    return Response(content=body, media_type=media_type)
+
+@router.post("/batch", response_model=BatchReport)
+async def analyze_batch(
+    file: UploadFile = File(...),
+    revaluation: Literal["linear", "full"] = "linear",
+    include_positions: bool = False,
+    workers: Optional[int] = Query(None, ge=1)
+):
+    """
+    Stress-tests every portfolio file in a zip or tar archive on a process
+    pool and returns per-portfolio results plus firm-level exposure and
+    stress. Directories on the server are only taken by the CLI
+    (python -m app.core.batch).
+    """
+    content = await file.read()
+    async with admission.slot(len(content)):
+        try:
+            # The batch runs its own process pool; this thread only waits for it
+            return await run_in_thread(_run_batch_upload, content, file.filename, revaluation, include_positions, workers)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+def _run_batch_upload(content: bytes, filename: str, revaluation: str, include_positions: bool,
+                      workers: Optional[int]) -> BatchReport:
+    with tempfile.TemporaryDirectory(prefix="batch-") as tmp:
+        path = os.path.join(tmp, os.path.basename(filename or "batch"))
+        with open(path, "wb") as f:
+            f.write(content)
+        return run_batch(path, workers, revaluation, include_positions)
+
+@router.post("/analyze/large", response_model=LargeBookAnalysis)
+async def analyze_large_portfolio(
+    file: UploadFile = File(...),
+    revaluation: Literal["linear", "full"] = "linear",
+    scenario_set: Optional[str] = None,
+    block_rows: Optional[int] = Query(None, ge=1),
+    top_k: Optional[int] = Query(None, ge=1),
+    impact_order: ImpactOrder = "largest",
+    impact_threshold: Optional[float] = Query(None, ge=0),
+    rollup: List[RollupDimension] = Query([])
+):
+    """
+    /analyze for books larger than memory. The upload is spooled to disk,
+    converted to memory-mapped columns and streamed through the pipeline in
+    blocks of block_rows positions. Positions are not echoed back, and
+    position_impacts keep the top settings.OUT_OF_CORE_TOP_K tickers unless
+    top_k or impact_threshold is given. Results are not cached.
+    """
+    if scenario_set is not None:
+        _set_or_404(scenario_set)
+    impact_query = ImpactQuery(top_k=top_k, order=impact_order, threshold=impact_threshold, rollup=rollup)
+    async with admission.slot(settings.LARGE_UPLOAD_BYTES):
+        try:
+            report = await run_in_thread(_run_large_upload, file.file, file.filename, revaluation, scenario_set,
+                                         block_rows, impact_query)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    with stage("audit"):
+        await audit_queue.submit_entry(make_audit_entry(
+            file.filename, report.total_value, report.exposure_report.concentration_alerts,
+            len(report.selected_scenarios), min((r["percentage_loss"] for r in report.simulation_results), default=0.0)
+        ))
+    return report
+
+def _run_large_upload(upload, filename: str, revaluation: str, scenario_set: Optional[str],
+                      block_rows: Optional[int], impact_query: ImpactQuery) -> LargeBookAnalysis:
+    # Keep the extension so Parquet/Arrow uploads are detected by name as well as by magic bytes
+    with tempfile.TemporaryDirectory(prefix="large-", dir=settings.OUT_OF_CORE_DIR) as tmp:
+        path = os.path.join(tmp, os.path.basename(filename or "portfolio.csv"))
+        with open(path, "wb") as f:
+            shutil.copyfileobj(upload, f)
+        return analyze_out_of_core(path, impact_query, scenario_set, revaluation, block_rows,
+                                   store_dir=os.path.join(tmp, "columns"))
+
+def _tracked_or_404(portfolio_id: str):
+    try:
+        return analysis_store.get(portfolio_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Unknown portfolio_id: {portfolio_id}")
+
+@router.post("/portfolios/{portfolio_id}/delta", response_model=DeltaAnalysisResponse)
+def apply_portfolio_delta(portfolio_id: str, delta: PortfolioDelta):
+    """
+    Applies adds, removes and quantity/price changes to a portfolio analyzed
+    with /analyze?track=true and returns the updated exposure and P&L.
+    """
+    state = _tracked_or_404(portfolio_id)
+    try:
+        return state.apply(delta)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/portfolios/{portfolio_id}/sensitivities", response_model=PortfolioSensitivities)
+def portfolio_sensitivities(portfolio_id: str):
+    """Per-ticker equity delta, DV01, spread DV01 and liquidity sensitivity of a tracked portfolio."""
+    return _tracked_or_404(portfolio_id).sensitivity_report()
+
+@router.post("/portfolios/{portfolio_id}/what_if", response_model=WhatIfResult)
+def what_if(portfolio_id: str, request: WhatIfRequest):
+    """
+    Linear P&L of an ad-hoc shock on a tracked portfolio, from its cached
+    sensitivities: no revaluation, cheap enough for every slider move.
+    """
+    return _tracked_or_404(portfolio_id).what_if(request)
+
+@router.post("/jobs", response_model=JobStatus, status_code=202)
+async def submit_job(file: UploadFile = File(...)):
+    """
+    Queues a full analysis to run in the background. Poll /jobs/{job_id}
+    for progress and fetch the result from /jobs/{job_id}/result. The upload
+    waits on disk until a worker picks it up; once settings.JOB_MAX_QUEUED
+    jobs are waiting, submissions are rejected with 503.
+    """
+    path = await run_in_thread(_spool_job_upload, file.file, file.filename)
+    try:
+        return get_job_manager().submit(path, file.filename, delete_after=True)
+    except JobQueueFull as e:
+        raise HTTPException(status_code=503, detail=f"Server busy ({e}), retry later", headers={"Retry-After": "5"})
+
+def _spool_job_upload(upload, filename: str) -> str:
+    # Keep the extension so Parquet/Arrow uploads are detected by name as well as by magic bytes
+    fd, path = tempfile.mkstemp(prefix="job-", suffix=os.path.splitext(filename or "")[1], dir=settings.JOB_SPOOL_DIR)
+    with os.fdopen(fd, "wb") as f:
+        shutil.copyfileobj(upload, f)
+    return path
+
+def _job_or_404(job_id: str) -> JobStatus:
+    job = get_job_manager().store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job_id: {job_id}")
+    return job
+
+@router.get("/jobs/{job_id}", response_model=JobStatus)
+def job_status(job_id: str):
+    return _job_or_404(job_id)
+
+@router.get("/jobs/{job_id}/result", response_model=JobResult)
+def job_result(job_id: str, offset: int = Query(0, ge=0), limit: Optional[int] = Query(None, ge=1)):
+    """
+    Result of a finished job. Positions (and each scenario's position_impacts)
+    are paged with offset/limit so large books can be fetched in pieces.
+    """
+    job = _job_or_404(job_id)
+    if job.status != "succeeded":
+        raise HTTPException(status_code=409, detail=f"Job is {job.status}, no result available")
+    response = get_job_manager().result(job_id)
+    limit = limit or settings.JOB_PAGE_SIZE
+
+    positions = response.portfolio_summary.positions
+    page = positions[offset:offset + limit]
+    tickers = {p.ticker for p in page}
+    results = [
+        {**r, "position_impacts": {t: v for t, v in r["position_impacts"].items() if t in tickers}}
+        for r in response.simulation_results
+    ]
+    return JobResult(
+        job_id=job_id,
+        offset=offset,
+        limit=limit,
+        total_positions=len(positions),
+        result=response.model_copy(update={
+            "portfolio_summary": response.portfolio_summary.model_copy(update={"positions": page}),
+            "simulation_results": results
+        })
+    )
+
+@router.delete("/jobs/{job_id}", response_model=JobStatus)
+def cancel_job(job_id: str):
+    _job_or_404(job_id)
+    return get_job_manager().cancel(job_id)
+
+@router.get("/audit", response_model=List[AuditRecord])
+def query_audit_log(
+    input_file: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    max_loss_pct: Optional[float] = None,
+    order_by: Literal["timestamp", "worst_case_loss_pct"] = "timestamp",
+    limit: int = Query(100, ge=1, le=10_000)
+):
+    """
+    Audit entries from the index, e.g. the worst losses for one file in a
+    month: ?input_file=book.csv&since=2024-05-01&until=2024-06-01&order_by=worst_case_loss_pct
+    """
+    try:
+        return audit_writer.query(input_file=input_file, since=since, until=until,
+                                  max_loss_pct=max_loss_pct, order_by=order_by, limit=limit)
+    except AuditIndexDisabled as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+@router.get("/scenarios", response_model=List[LibraryScenario])
+def list_scenarios(tag: Optional[str] = None):
+    return get_scenario_library().entries(tag)
+
+@router.post("/scenarios/calibrate", response_model=List[LibraryScenario])
+async def calibrate_historical_scenarios(file: UploadFile = File(...), config: Optional[str] = Form(None)):
+    """
+    Scenarios from the worst N-day moves in a factor history file (CSV,
+    Parquet or Arrow: date, equity, rate, spread, vol). `config` is an
+    optional JSON-encoded CalibrationConfig; with save=true the scenarios
+    are added to the library.
+    """
+    try:
+        cal_config = CalibrationConfig() if config is None else CalibrationConfig.model_validate_json(config)
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors(include_url=False, include_context=False))
+
+    content = await file.read()
+    async with admission.slot(len(content)):
+        try:
+            scenarios = await run_cpu_bound(_calibrate_upload, content, file.filename, cal_config)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    if cal_config.save:
+        get_scenario_library().put_scenarios(scenarios)
+    return scenarios
+
+def _calibrate_upload(content: bytes, filename: str, config: CalibrationConfig) -> List[LibraryScenario]:
+    history = load_factor_history(content, filename)
+    return calibrate_scenarios(history, config.windows, config.anchor, config.top_n,
+                               config.liquidity_shock, get_calibration_cache())
+
+@router.get("/scenarios/{name}", response_model=LibraryScenario)
+def get_scenario(name: str):
+    try:
+        return get_scenario_library().get(name)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Unknown scenario: {name}")
+
+@router.put("/scenarios/{name}", response_model=LibraryScenario)
+def put_scenario(name: str, scenario: LibraryScenario):
+    """Creates or replaces a library scenario. Cached results are invalidated by the library version."""
+    if scenario.name != name:
+        raise HTTPException(status_code=400, detail=f"Scenario name '{scenario.name}' does not match the path")
+    get_scenario_library().put_scenario(scenario)
+    return scenario
+
+@router.delete("/scenarios/{name}")
+def delete_scenario(name: str):
+    try:
+        get_scenario_library().delete_scenario(name)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Unknown scenario: {name}")
+    except ScenarioInUse as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"deleted": name}
+
+def _set_or_404(name: str) -> ScenarioSet:
+    try:
+        return get_scenario_library().get_set(name)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Unknown scenario set: {name}")
+
+@router.get("/scenario_sets", response_model=List[ScenarioSet])
+def list_scenario_sets():
+    return get_scenario_library().sets()
+
+@router.get("/scenario_sets/{name}", response_model=List[StressScenario])
+def resolve_scenario_set(name: str):
+    """The scenarios a set runs: its listed scenarios, then those carrying any of its tags."""
+    _set_or_404(name)
+    return get_scenario_library().resolve_set(name)
+
+@router.put("/scenario_sets/{name}", response_model=ScenarioSet)
+def put_scenario_set(name: str, scenario_set: ScenarioSet):
+    if scenario_set.name != name:
+        raise HTTPException(status_code=400, detail=f"Set name '{scenario_set.name}' does not match the path")
+    try:
+        get_scenario_library().put_set(scenario_set)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return scenario_set
+
+@router.delete("/scenario_sets/{name}")
+def delete_scenario_set(name: str):
+    _set_or_404(name)
+    get_scenario_library().delete_set(name)
+    return {"deleted": name}
+
+@router.get("/selection_rules", response_model=List[SelectionRule])
+def list_selection_rules():
+    """Rules used by scenario selection, in evaluation (priority) order."""
+    return get_scenario_library().rules()
+
+@router.put("/selection_rules/{name}", response_model=SelectionRule)
+def put_selection_rule(name: str, rule: SelectionRule):
+    if rule.name != name:
+        raise HTTPException(status_code=400, detail=f"Rule name '{rule.name}' does not match the path")
+    try:
+        get_scenario_library().put_rule(rule)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return rule
+
+@router.delete("/selection_rules/{name}")
+def delete_selection_rule(name: str):
+    try:
+        get_scenario_library().delete_rule(name)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Unknown selection rule: {name}")
+    return {"deleted": name}
+
+@router.get("/cache/stats", response_model=CacheStats)
+def cache_stats():
+    return result_cache.stats()
+
+@router.post("/cache/invalidate")
+def invalidate_cache():
+    return {"invalidated": result_cache.invalidate()}
+
+@router.post("/monte_carlo", response_model=MonteCarloResult)
+async def monte_carlo_stress(file: UploadFile = File(...), config: str = Form(...)):
+    """
+    Monte Carlo stress run. `config` is a JSON-encoded MonteCarloConfig; its
+    n_draws (capped by settings.MC_MAX_DRAWS) and deadline_seconds bound the
+    request time.
+    """
+    try:
+        mc_config = MonteCarloConfig.model_validate_json(config)
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors(include_url=False, include_context=False))
+
+    content = await file.read()
+    async with admission.slot(len(content)):
+        try:
+            return await run_cpu_bound(_run_monte_carlo_upload, content, file.filename, mc_config)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+def _run_monte_carlo_upload(content: bytes, filename: str, config: MonteCarloConfig) -> MonteCarloResult:
+    return run_monte_carlo(parse_portfolio_frame(content, filename), config)
+
+@router.post("/reverse_stress", response_model=ReverseStressResult)
+async def reverse_stress(file: UploadFile = File(...), config: str = Form(...)):
+    """
+    Reverse stress test: the most likely combination of equity, rate, spread
+    and liquidity shocks that loses target_loss_pct of the portfolio.
+    `config` is a JSON-encoded ReverseStressConfig.
+    """
+    try:
+        rs_config = ReverseStressConfig.model_validate_json(config)
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors(include_url=False, include_context=False))
+
+    content = await file.read()
+    async with admission.slot(len(content)):
+        try:
+            return await run_cpu_bound(_reverse_stress_upload, content, file.filename, rs_config)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+def _reverse_stress_upload(content: bytes, filename: str, config: ReverseStressConfig) -> ReverseStressResult:
+    return reverse_stress_test(parse_portfolio_frame(content, filename), config)
+
+@router.post("/exposure_cube", response_model=ExposureCubeResponse)
+async def exposure_cube(
+    file: UploadFile = File(...),
+    dimensions: str = Form("sector*rating"),
+    rules: Optional[str] = Form(None)
+):
+    """
+    Exposure breakdowns across arbitrary dimensions. `dimensions` is a comma
+    separated list of group-bys, each a `*`-joined set of dimension names
+    (e.g. "sector*rating,issuer*asset_class"). `rules` is an optional JSON
+    list of ConcentrationRule; the default rule set is used otherwise.
+    """
+    group_bys = [tuple(d.strip() for d in g.split("*") if d.strip()) for g in dimensions.split(",") if g.strip()]
+    try:
+        rule_set = DEFAULT_CONCENTRATION_RULES if rules is None else TypeAdapter(List[ConcentrationRule]).validate_json(rules)
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors(include_url=False, include_context=False))
+
+    content = await file.read()
+    async with admission.slot(len(content)):
+        try:
+            return await run_cpu_bound(_exposure_cube, content, file.filename, group_bys, rule_set)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+def _exposure_cube(content: bytes, filename: str, group_bys, rule_set) -> ExposureCubeResponse:
+    frame = parse_portfolio_frame(content, filename)
+    groups = aggregate_exposure(frame, group_bys + [tuple(r.dimensions) for r in rule_set if r.dimensions])
+    return ExposureCubeResponse(
+        cubes=[groups[g].to_cube() for g in group_bys],
+        concentration_alerts=evaluate_rules(rule_set, groups, portfolio_metrics(frame))
+    )
@@ -0,0 +1,174 @@
+import numpy as np
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+from app.models import Portfolio, ExposureCube, ExposureCell, ConcentrationRule, Rating
+from app.core.frame import PortfolioFrame, as_frame, ordered_sum, ASSET_CLASSES, RATINGS, RATING_CODES, NO_RATING_CODE
+
+# Rules that used to be hardcoded in calculate_exposure
+DEFAULT_CONCENTRATION_RULES = [
+    ConcentrationRule(dimensions=["sector"], threshold=0.25),
+    ConcentrationRule(dimensions=["issuer"], threshold=0.10),
+    ConcentrationRule(
+        metric="liquidity_profile", operator="<", threshold=50,
+        message="Low portfolio liquidity score: {value:.1f}"
+    ),
+]
+
+PORTFOLIO_METRICS = ["weighted_average_duration", "liquidity_profile"]
+
+
+def _asset_class_codes(frame: PortfolioFrame):
+    return frame.asset_class, [ac.value for ac in ASSET_CLASSES]
+
+
+def _rating_codes(frame: PortfolioFrame):
+    # Positions without a rating are reported as Not Rated
+    codes = np.where(frame.rating == NO_RATING_CODE, RATING_CODES[Rating.NR.value], frame.rating)
+    return codes, [r.value for r in RATINGS]
+
+
+# Dimension name -> (codes, labels). Issuer uses the ticker as a proxy.
+DIMENSIONS = {
+    "asset_class": _asset_class_codes,
+    "sector": lambda f: (f.sector_code, f.sector_labels),
+    "rating": _rating_codes,
+    "ticker": lambda f: (f.ticker_code, f.ticker_labels),
+    "issuer": lambda f: (f.ticker_code, f.ticker_labels),
+}
+
+
+class GroupedExposure:
+    """
+    Sums for one group-by. `keys` holds one label tuple per group in
+    first-appearance order; `market_value`, `weight` and `count` (number of
+    positions) are aligned arrays.
+    """
+
+    def __init__(self, dimensions: Tuple[str, ...], keys: List[Tuple[str, ...]],
+                 market_value: np.ndarray, weight: np.ndarray, count: Optional[np.ndarray] = None):
+        self.dimensions = dimensions
+        self.keys = keys
+        self.market_value = market_value
+        self.weight = weight
+        self.count = count
+
+    def weights_by_label(self) -> Dict[str, float]:
+        return {" / ".join(k): float(w) for k, w in zip(self.keys, self.weight.tolist())}
+
+    def to_cube(self) -> ExposureCube:
+        return ExposureCube(
+            dimensions=list(self.dimensions),
+            cells=[
+                ExposureCell(keys=list(k), market_value=round(mv, 2), weight=round(w, 4))
+                for k, mv, w in zip(self.keys, self.market_value.tolist(), self.weight.tolist())
+            ]
+        )
+
+
+def _group_codes(frame: PortfolioFrame, dimensions: Sequence[str]):
+    """
+    Combines the codes of several dimensions into one dense group id per
+    row. Returns (group ids, first row of each group, per-dimension codes
+    and labels).
+    """
+    unknown = [d for d in dimensions if d not in DIMENSIONS]
+    if unknown:
+        raise ValueError(f"Unknown exposure dimension(s): {', '.join(unknown)}")
+    parts = [DIMENSIONS[d](frame) for d in dimensions]
+
+    combined = np.zeros(len(frame), dtype=np.int64)
+    for codes, labels in parts:
+        combined = combined * max(len(labels), 1) + codes
+    _, first_idx, inverse = np.unique(combined, return_index=True, return_inverse=True)
+    return inverse.ravel(), first_idx, parts
+
+
+def aggregate_exposure(portfolio: Union[Portfolio, PortfolioFrame],
+                       group_bys: Sequence[Sequence[str]]) -> Dict[Tuple[str, ...], GroupedExposure]:
+    """
+    Computes every requested group-by (e.g. [["sector"], ["sector", "rating"]])
+    with one bincount over the columnar portfolio each. bincount accumulates
+    in row order, so single-dimension weights match a per-position loop.
+    """
+    frame = as_frame(portfolio)
+    total_val = frame.total_value
+    weight = frame.market_value / total_val if total_val else np.zeros(len(frame))
+
+    results: Dict[Tuple[str, ...], GroupedExposure] = {}
+    for dims in group_bys:
+        dims = tuple(dims)
+        if dims in results:
+            continue
+        group, first_idx, parts = _group_codes(frame, dims)
+        n_groups = len(first_idx)
+        mv = np.bincount(group, weights=frame.market_value, minlength=n_groups)
+        w = np.bincount(group, weights=weight, minlength=n_groups)
+        count = np.bincount(group, minlength=n_groups)
+
+        # Order groups by first appearance, like a dict filled in a loop
+        order = np.argsort(first_idx, kind="stable")
+        rows = first_idx[order]
+        columns = [[labels[c] for c in codes[rows].tolist()] for codes, labels in parts]
+        keys = list(zip(*columns)) if columns else [()] * len(rows)
+        results[dims] = GroupedExposure(dims, keys, mv[order], w[order], count[order])
+    return results
+
+
+def merge_grouped_exposure(parts: Sequence[GroupedExposure], total_value: float) -> GroupedExposure:
+    """
+    Sums the same group-by across several portfolios (keys in first-appearance
+    order) and reweights against their combined value.
+    """
+    index: Dict[Tuple[str, ...], int] = {}
+    market_value: List[float] = []
+    count: List[int] = []
+    for part in parts:
+        counts = part.count.tolist() if part.count is not None else [0] * len(part.keys)
+        for key, mv, c in zip(part.keys, part.market_value.tolist(), counts):
+            i = index.get(key)
+            if i is None:
+                index[key] = len(market_value)
+                market_value.append(mv)
+                count.append(c)
+            else:
+                market_value[i] += mv
+                count[i] += c
+    mv = np.array(market_value, dtype=np.float64)
+    weight = mv / total_value if total_value else np.zeros_like(mv)
+    return GroupedExposure(parts[0].dimensions, list(index), mv, weight, np.array(count, dtype=np.int64))
+
+
+def portfolio_metrics(portfolio: Union[Portfolio, PortfolioFrame]) -> Dict[str, float]:
+    """Value-weighted duration and liquidity score."""
+    frame = as_frame(portfolio)
+    total_val = frame.total_value
+    if total_val == 0:
+        return {m: 0.0 for m in PORTFOLIO_METRICS}
+    weight = frame.market_value / total_val
+    return {
+        "weighted_average_duration": float(ordered_sum(frame.duration * weight)),
+        "liquidity_profile": float(ordered_sum(frame.liquidity_score * weight)),
+    }
+
+
+def evaluate_rules(rules: Sequence[ConcentrationRule],
+                   groups: Dict[Tuple[str, ...], GroupedExposure],
+                   metrics: Dict[str, float]) -> List[str]:
+    """
+    Evaluates concentration rules against aggregated results, in rule
+    order. Group rules must use the "weight" metric; portfolio-level rules
+    (no dimensions) read from `metrics`.
+    """
+    alerts = []
+    for rule in rules:
+        if not rule.dimensions:
+            value = metrics.get(rule.metric)
+            if value is not None and (value > rule.threshold if rule.operator == ">" else value < rule.threshold):
+                alerts.append(rule.message.format(label="Portfolio", value=value))
+            continue
+        if rule.metric != "weight":
+            raise ValueError(f"Rule on {rule.dimensions} must use the 'weight' metric")
+        g = groups[tuple(rule.dimensions)]
+        breached = g.weight > rule.threshold if rule.operator == ">" else g.weight < rule.threshold
+        for i in np.flatnonzero(breached).tolist():
+            alerts.append(rule.message.format(label=" / ".join(g.keys[i]), value=float(g.weight[i])))
+    return alerts
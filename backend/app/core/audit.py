@@ -1,23 +1,382 @@
+import asyncio
+import glob
+import gzip
 import json
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import time
 from datetime import datetime
-from app.models import AnalysisResponse
+from typing import List, Optional
+from app.models import AnalysisResponse, AuditRecord
+from app.core.config import settings
 
 AUDIT_FILE = "audit_log.jsonl"
 
-def log_analysis_request(filename: str, response: AnalysisResponse):
-    """
-    Logs the analysis request and result summary to an immutable-ish audit log.
-    """
-    entry = {
+logger = logging.getLogger(__name__)
+
+def make_audit_entry(filename: str, portfolio_value: float, alerts: List[str],
+                     scenarios_run: int, worst_case_loss_pct: float) -> dict:
+    return {
         "timestamp": datetime.now().isoformat(),
         "event_type": "PORTFOLIO_ANALYSIS",
         "input_file": filename,
-        "portfolio_value": response.portfolio_summary.total_value,
-        "alerts_triggered": len(response.exposure_report.concentration_alerts),
-        "scenarios_run": len(response.selected_scenarios),
-        "worst_case_loss_pct": min([r['percentage_loss'] for r in response.simulation_results], default=0.0) if response.simulation_results else 0.0,
-        "raw_alerts": response.exposure_report.concentration_alerts
+        "portfolio_value": portfolio_value,
+        "alerts_triggered": len(alerts),
+        "scenarios_run": scenarios_run,
+        "worst_case_loss_pct": worst_case_loss_pct,
+        "raw_alerts": alerts
     }
-    
-    with open(AUDIT_FILE, "a") as f:
-        f.write(json.dumps(entry) + "\n")
+
+def build_audit_entry(filename: str, response: AnalysisResponse) -> dict:
+    return make_audit_entry(
+        filename,
+        response.portfolio_summary.total_value,
+        response.exposure_report.concentration_alerts,
+        len(response.selected_scenarios),
+        min([r['percentage_loss'] for r in response.simulation_results], default=0.0) if response.simulation_results else 0.0
+    )
+
+
+def index_path_for(log_path: str) -> str:
+    root, _ = os.path.splitext(log_path)
+    return root + ".index.sqlite3"
+
+
+def log_segments(log_path: str) -> List[str]:
+    """Rotated segments of a log (oldest first), then the active one if it exists."""
+    root, ext = os.path.splitext(log_path)
+    pattern = glob.escape(root) + ".*" + ext
+    rotated = sorted(glob.glob(pattern) + glob.glob(pattern + ".gz"))
+    return rotated + ([log_path] if os.path.exists(log_path) else [])
+
+
+def _index_row(entry: dict, segment: str, offset: int) -> tuple:
+    return (
+        entry["timestamp"], entry["input_file"], entry["portfolio_value"],
+        entry["worst_case_loss_pct"], entry["alerts_triggered"], entry["scenarios_run"],
+        segment, offset
+    )
+
+
+class AuditIndexDisabled(Exception):
+    """Raised by AuditWriter.query when settings.AUDIT_INDEX_ENABLED is off."""
+
+
+class AuditIndex:
+    """
+    SQLite index over the audit log: one row per entry with the queryable
+    fields and where the full line lives (segment file + byte offset).
+    Given the log path, a newly created index is filled from the segments
+    already on disk, so entries written before it existed are found too.
+    """
+
+    COLUMNS = ["timestamp", "input_file", "portfolio_value", "worst_case_loss_pct",
+               "alerts_triggered", "scenarios_run", "segment", "offset"]
+
+    def __init__(self, db_path: str, log_path: Optional[str] = None):
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            created = self._db.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'entries'"
+            ).fetchone() is None
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "timestamp TEXT, input_file TEXT, portfolio_value REAL, worst_case_loss_pct REAL, "
+                "alerts_triggered INTEGER, scenarios_run INTEGER, segment TEXT, offset INTEGER)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS entries_timestamp ON entries (timestamp)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS entries_file ON entries (input_file, timestamp)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS entries_loss ON entries (worst_case_loss_pct)")
+            self._db.commit()
+        if created and log_path is not None:
+            self.rebuild(log_path)
+
+    def rebuild(self, log_path: str) -> int:
+        """
+        Re-indexes every segment of the log (rotated and active), replacing
+        the current rows. Lines that are not valid entries are skipped.
+        Returns the number of entries indexed.
+        """
+        rows = []
+        for path in log_segments(log_path):
+            segment = os.path.basename(path)
+            opener = gzip.open if path.endswith(".gz") else open
+            offset = 0
+            with opener(path, "rb") as f:
+                for line in f:
+                    try:
+                        rows.append(_index_row(json.loads(line), segment, offset))
+                    except (ValueError, KeyError, TypeError):
+                        logger.warning("Skipping unreadable audit line in %s at offset %d", segment, offset)
+                    offset += len(line)
+        with self._lock:
+            self._db.execute("DELETE FROM entries")
+            self._db.executemany(f"INSERT INTO entries VALUES ({', '.join('?' * len(self.COLUMNS))})", rows)
+            self._db.commit()
+        return len(rows)
+
+    def add(self, rows: List[tuple]):
+        with self._lock:
+            self._db.executemany(f"INSERT INTO entries VALUES ({', '.join('?' * len(self.COLUMNS))})", rows)
+            self._db.commit()
+
+    def rename_segment(self, old: str, new: str):
+        with self._lock:
+            self._db.execute("UPDATE entries SET segment = ? WHERE segment = ?", (new, old))
+            self._db.commit()
+
+    def query(self, input_file: Optional[str] = None, since: Optional[str] = None, until: Optional[str] = None,
+              max_loss_pct: Optional[float] = None, order_by: str = "timestamp", limit: int = 100) -> List[AuditRecord]:
+        """
+        Entries matching all given filters. Timestamps are ISO strings (they
+        compare correctly as text); `max_loss_pct` keeps entries whose worst
+        case loss is at or below it (losses are negative). order_by
+        "worst_case_loss_pct" lists the worst losses first.
+        """
+        clauses, params = [], []
+        if input_file is not None:
+            clauses.append("input_file = ?")
+            params.append(input_file)
+        if since is not None:
+            clauses.append("timestamp >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("timestamp < ?")
+            params.append(until)
+        if max_loss_pct is not None:
+            clauses.append("worst_case_loss_pct <= ?")
+            params.append(max_loss_pct)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        order = "worst_case_loss_pct ASC" if order_by == "worst_case_loss_pct" else "timestamp DESC"
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT {', '.join(self.COLUMNS)} FROM entries {where} ORDER BY {order} LIMIT ?",
+                (*params, limit)
+            ).fetchall()
+        return [AuditRecord(**dict(zip(self.COLUMNS, row))) for row in rows]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class AuditWriter:
+    """
+    Appends audit entries to the active log segment. Each call is one group
+    commit: the whole batch is written with a single write (and, per
+    settings.AUDIT_FSYNC, a single fsync) and indexed in one transaction.
+    The active segment is rotated once it exceeds settings.AUDIT_MAX_BYTES
+    or its first entry is older than settings.AUDIT_ROTATE_SECONDS; rotated
+    segments are renamed with a timestamp and gzipped.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self._path_override = path
+        self._lock = threading.Lock()
+        self._file = None
+        self._open_path: Optional[str] = None
+        self._opened_at = 0.0 # Time of the segment's first entry
+        self._last_fsync = 0.0
+        self._index: Optional[AuditIndex] = None
+        self._index_path: Optional[str] = None # Log path the index belongs to
+
+    @property
+    def path(self) -> str:
+        # Follows the module-level AUDIT_FILE unless a path was given
+        return self._path_override or AUDIT_FILE
+
+    def _open(self):
+        path = self.path
+        if self._open_path != path:
+            self._close()
+            self._file = open(path, "ab")
+            self._open_path = path
+            self._opened_at = self._first_entry_time(path)
+            if settings.AUDIT_INDEX_ENABLED:
+                self._index = AuditIndex(index_path_for(path), path)
+                self._index_path = path
+
+    @staticmethod
+    def _first_entry_time(path: str) -> float:
+        try:
+            with open(path, "rb") as f:
+                first = f.readline()
+            return datetime.fromisoformat(json.loads(first)["timestamp"]).timestamp()
+        except (OSError, ValueError, KeyError):
+            return 0.0 # Empty or unreadable: the clock starts with the next entry
+
+    def _close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self._index is not None:
+            self._index.close()
+            self._index = None
+        self._index_path = None
+        self._open_path = None
+
+    def _should_rotate(self, now: float) -> bool:
+        size = self._file.tell()
+        if size == 0:
+            return False
+        if size >= settings.AUDIT_MAX_BYTES:
+            return True
+        max_age = settings.AUDIT_ROTATE_SECONDS
+        return max_age is not None and self._opened_at > 0 and now - self._opened_at >= max_age
+
+    def _rotate(self):
+        self._file.close()
+        root, ext = os.path.splitext(self._open_path)
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        target = f"{root}.{stamp}{ext}"
+        n = 1
+        while os.path.exists(target) or os.path.exists(target + ".gz"):
+            target = f"{root}.{stamp}-{n}{ext}"
+            n += 1
+        os.replace(self._open_path, target)
+        if settings.AUDIT_COMPRESS_ROTATED:
+            with open(target, "rb") as src, gzip.open(target + ".gz", "wb") as dst:
+                shutil.copyfileobj(src, dst)
+            os.remove(target)
+            target += ".gz"
+        if self._index is not None:
+            self._index.rename_segment(os.path.basename(self._open_path), os.path.basename(target))
+        self._file = open(self._open_path, "ab")
+        self._opened_at = 0.0
+
+    def _sync(self, now: float):
+        policy = settings.AUDIT_FSYNC
+        if policy == "never":
+            return
+        if policy == "interval" and now - self._last_fsync < settings.AUDIT_FSYNC_INTERVAL_SECONDS:
+            return
+        os.fsync(self._file.fileno())
+        self._last_fsync = now
+
+    def write(self, entries: List[dict]):
+        if not entries:
+            return
+        with self._lock:
+            self._open()
+            now = time.time()
+            if self._should_rotate(now):
+                self._rotate()
+
+            lines = [(json.dumps(entry) + "\n").encode() for entry in entries]
+            offset = self._file.tell()
+            self._file.write(b"".join(lines))
+            self._file.flush()
+            self._sync(now)
+            if self._opened_at == 0.0:
+                self._opened_at = now
+
+            if self._index is not None:
+                segment = os.path.basename(self._open_path)
+                rows = []
+                for entry, line in zip(entries, lines):
+                    rows.append(_index_row(entry, segment, offset))
+                    offset += len(line)
+                self._index.add(rows)
+
+    def query(self, **filters) -> List[AuditRecord]:
+        """Queries the index of the current log; the log itself is not opened."""
+        if not settings.AUDIT_INDEX_ENABLED:
+            raise AuditIndexDisabled("Audit index is disabled (settings.AUDIT_INDEX_ENABLED)")
+        with self._lock:
+            path = self.path
+            if self._index_path != path:
+                if not os.path.exists(index_path_for(path)) and not log_segments(path):
+                    return [] # Nothing logged yet
+                if self._index is not None:
+                    self._index.close()
+                # Backfilled from the segments on disk if the index is new
+                self._index = AuditIndex(index_path_for(path), path)
+                self._index_path = path
+            index = self._index
+        return index.query(**filters)
+
+    def close(self):
+        with self._lock:
+            if self._file is not None and settings.AUDIT_FSYNC != "never":
+                os.fsync(self._file.fileno())
+            self._close()
+
+
+audit_writer = AuditWriter()
+
+def write_audit_entries(entries: List[dict]):
+    audit_writer.write(entries)
+
+def log_analysis_request(filename: str, response: AnalysisResponse):
+    """
+    Logs the analysis request and result summary to an immutable-ish audit log.
+    """
+    write_audit_entries([build_audit_entry(filename, response)])
+
+
+class AuditQueue:
+    """
+    Moves audit writes off the request path. Requests enqueue an entry and
+    return; a background task drains the queue and appends whatever has
+    accumulated in one write on a worker thread. If the consumer is not
+    running (e.g. app started without its lifespan), entries are written
+    directly on a thread instead.
+    """
+
+    def __init__(self):
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self):
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=settings.AUDIT_QUEUE_SIZE)
+        self._task = asyncio.create_task(self._consume())
+
+    async def stop(self):
+        """Flushes pending entries, stops the consumer and closes the log."""
+        if not self.running:
+            return
+        await self._queue.join()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        await asyncio.to_thread(audit_writer.close)
+
+    async def submit(self, filename: str, response: AnalysisResponse):
+        await self.submit_entry(build_audit_entry(filename, response))
+
+    async def submit_entry(self, entry: dict):
+        """Queues an entry built with make_audit_entry (for responses that are not an AnalysisResponse)."""
+        if self.running:
+            # Blocks only when the queue is full (backpressure)
+            await self._queue.put(entry)
+        else:
+            await asyncio.to_thread(write_audit_entries, [entry])
+
+    async def _consume(self):
+        while True:
+            batch = [await self._queue.get()]
+            while not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            try:
+                await asyncio.to_thread(write_audit_entries, batch)
+            except (OSError, sqlite3.Error) as e:
+                logger.error("Audit write failed, %d entries dropped: %s", len(batch), e)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+
+audit_queue = AuditQueue()
@@ -0,0 +1,293 @@
+"""
+Multi-portfolio batch analysis.
+
+    python -m app.core.batch funds/                    # directory of CSV/Parquet/Arrow files
+    python -m app.core.batch funds.zip -o report.json  # zip or tar archive
+    python -m app.core.batch funds/ --workers 8 --revaluation full
+
+Portfolios are ingested and analyzed in parallel on a process pool. The
+shock matrix of every library scenario is built once and placed in shared
+memory; each worker maps it instead of rebuilding it. Every portfolio is
+run against all library scenarios so the firm-level stress report can add
+them up, and its own selected scenarios are read off the same batch.
+"""
+import argparse
+import os
+import sys
+import tarfile
+import time
+import zipfile
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Tuple
+from app.models import BatchReport, BatchPortfolioResult, FirmScenarioResult, ExposureReport
+from app.core.config import settings
+from app.core.ingest import parse_portfolio_frame, COLUMNAR_EXTENSIONS
+from app.core.aggregation import aggregate_exposure, merge_grouped_exposure, DEFAULT_CONCENTRATION_RULES
+from app.core.exposure import calculate_exposure, build_exposure_report, REPORT_GROUP_BYS
+from app.core.metrics import stage, POSITIONS_PROCESSED, SCENARIOS_RUN
+from app.engine.library import get_scenario_library, LibrarySnapshot
+from app.engine.matrix import evaluate_scenario_matrix, ATTRIBUTION_LABELS
+from app.engine.shared import SharedArray
+from app.engine.simulation import build_simulation_result
+
+PORTFOLIO_EXTENSIONS = {".csv", *COLUMNAR_EXTENSIONS}
+
+# Group-bys each worker returns for the firm-level exposure
+FIRM_GROUP_BYS = REPORT_GROUP_BYS + [tuple(r.dimensions) for r in DEFAULT_CONCENTRATION_RULES if r.dimensions]
+
+# A portfolio file: (kind, path, name) with kind "file", "zip" or "tar"; name is the
+# archive member or the path relative to the batch directory
+BatchSource = Tuple[str, str, str]
+
+
+def _wanted(name: str) -> bool:
+    parts = name.replace("\\", "/").split("/")
+    # Skip hidden files and archive metadata (e.g. __MACOSX/)
+    if any(p.startswith((".", "__")) for p in parts if p):
+        return False
+    return os.path.splitext(name)[1].lower() in PORTFOLIO_EXTENSIONS
+
+
+def list_batch_sources(path: str) -> List[BatchSource]:
+    """Portfolio files in a directory (recursively), zip or tar archive, sorted by name."""
+    if os.path.isdir(path):
+        sources = []
+        for root, _, files in os.walk(path):
+            for f in files:
+                full = os.path.join(root, f)
+                name = os.path.relpath(full, path).replace(os.sep, "/")
+                if _wanted(name):
+                    sources.append(("file", full, name))
+        sources.sort(key=lambda s: s[2])
+    elif zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as z:
+            sources = [("zip", path, n) for n in sorted(z.namelist()) if not n.endswith("/") and _wanted(n)]
+    elif tarfile.is_tarfile(path):
+        with tarfile.open(path) as t:
+            sources = [("tar", path, m.name) for m in sorted(t.getmembers(), key=lambda m: m.name)
+                       if m.isfile() and _wanted(m.name)]
+    else:
+        raise ValueError("Batch input must be a directory, zip or tar archive")
+
+    if not sources:
+        raise ValueError(f"No portfolio files ({', '.join(sorted(PORTFOLIO_EXTENSIONS))}) found")
+    if len(sources) > settings.BATCH_MAX_FILES:
+        raise ValueError(f"Batch has {len(sources)} files, the limit is {settings.BATCH_MAX_FILES}")
+    return sources
+
+
+def read_batch_source(source: BatchSource) -> bytes:
+    kind, path, member = source
+    if kind == "zip":
+        with zipfile.ZipFile(path) as z:
+            return z.read(member)
+    if kind == "tar":
+        with tarfile.open(path) as t:
+            return t.extractfile(member).read()
+    with open(path, "rb") as f:
+        return f.read()
+
+
+class _Parts:
+    """What a worker sends back for the firm-level aggregates."""
+
+    def __init__(self, total_value, groups, sum_mv_duration, sum_mv_liquidity, totals, attribution):
+        self.total_value = total_value
+        self.groups = groups
+        self.sum_mv_duration = sum_mv_duration
+        self.sum_mv_liquidity = sum_mv_liquidity
+        self.totals = totals
+        self.attribution = attribution
+
+
+class _WorkerState:
+    def __init__(self, spec, entries, rules, revaluation: str, include_positions: bool):
+        self.shared = SharedArray.attach(spec)
+        block = self.shared.array
+        self.snapshot = LibrarySnapshot(entries, [], rules, matrix=block[:, :4])
+        self.vol_shocks = block[:, 4]
+        self.revaluation = revaluation
+        self.include_positions = include_positions
+
+
+# Set once per worker process by _init_worker
+_worker: Optional[_WorkerState] = None
+
+
+def _init_worker(spec, entries, rules, revaluation: str, include_positions: bool):
+    global _worker
+    _worker = _WorkerState(spec, entries, rules, revaluation, include_positions)
+
+
+def _close_worker():
+    # Drop every view of the block before unmapping it
+    global _worker
+    shared, _worker = _worker.shared, None
+    shared.close()
+
+
+def _analyze_source(source: BatchSource) -> Tuple[BatchPortfolioResult, Optional[_Parts]]:
+    name = source[2]
+    state = _worker
+    try:
+        frame = parse_portfolio_frame(read_batch_source(source), name)
+        exposure = calculate_exposure(frame)
+        snap = state.snapshot
+        selected = snap.select(exposure)
+        rows = [snap.row[s.name] for s in selected]
+
+        # Every library scenario (for the firm report); positions only for the selected ones
+        batch = evaluate_scenario_matrix(frame, snap.matrix, keep_positions=False,
+                                         revaluation=state.revaluation, vol_shocks=state.vol_shocks)
+        detail = None
+        if state.include_positions and rows:
+            detail = evaluate_scenario_matrix(frame, snap.matrix[rows], revaluation=state.revaluation,
+                                              vol_shocks=state.vol_shocks[rows])
+        results = [
+            build_simulation_result(frame, s, detail.pnl[j] if detail is not None else None,
+                                    float(batch.totals[r]), batch.attribution[r])
+            for j, (s, r) in enumerate(zip(selected, rows))
+        ]
+    except Exception as e:
+        return BatchPortfolioResult(filename=name, status="failed", error=str(e)), None
+
+    parts = _Parts(
+        total_value=frame.total_value,
+        groups=aggregate_exposure(frame, FIRM_GROUP_BYS),
+        sum_mv_duration=float(np.dot(frame.market_value, frame.duration)),
+        sum_mv_liquidity=float(np.dot(frame.market_value, frame.liquidity_score)),
+        totals=batch.totals,
+        attribution=batch.attribution
+    )
+    result = BatchPortfolioResult(
+        filename=name,
+        status="succeeded",
+        total_value=frame.total_value,
+        position_count=len(frame),
+        exposure_report=exposure,
+        selected_scenarios=[s.name for s in selected],
+        simulation_results=[r.model_dump() for r in results],
+        worst_case_loss_pct=min((r.percentage_loss for r in results), default=None)
+    )
+    return result, parts
+
+
+def _firm_report(names: List[str], outputs: List[Tuple[BatchPortfolioResult, Optional[_Parts]]],
+                 snapshot: LibrarySnapshot) -> Tuple[float, ExposureReport, List[FirmScenarioResult]]:
+    done = [(name, parts) for name, (_, parts) in zip(names, outputs) if parts is not None]
+    total_value = sum(parts.total_value for _, parts in done)
+    if not done or total_value == 0:
+        empty = ExposureReport(by_asset_class={}, by_sector={}, by_rating={}, weighted_average_duration=0.0,
+                               liquidity_profile=0.0, concentration_alerts=["No portfolio value analyzed"])
+        return total_value, empty, []
+
+    groups = {
+        g: merge_grouped_exposure([parts.groups[g] for _, parts in done], total_value) for g in FIRM_GROUP_BYS
+    }
+    metrics = {
+        "weighted_average_duration": sum(p.sum_mv_duration for _, p in done) / total_value,
+        "liquidity_profile": sum(p.sum_mv_liquidity for _, p in done) / total_value,
+    }
+    exposure = build_exposure_report(groups, metrics, DEFAULT_CONCENTRATION_RULES)
+
+    # Portfolios x scenarios, summed in file order
+    totals = np.vstack([parts.totals for _, parts in done])
+    attribution = np.stack([parts.attribution for _, parts in done])
+    firm_totals = totals.sum(axis=0)
+    firm_attribution = attribution.sum(axis=0)
+    worst = totals.argmin(axis=0)
+    stress = [
+        FirmScenarioResult(
+            scenario_name=s.name,
+            total_pnl=round(float(firm_totals[i]), 2),
+            percentage_loss=round(float(firm_totals[i]) / total_value, 4),
+            shock_details={label: round(float(v), 2) for label, v in zip(ATTRIBUTION_LABELS, firm_attribution[i])},
+            worst_portfolio=done[worst[i]][0],
+            worst_portfolio_pnl=round(float(totals[worst[i], i]), 2)
+        )
+        for i, s in enumerate(snapshot.scenarios)
+    ]
+    stress.sort(key=lambda r: r.total_pnl)
+    return total_value, exposure, stress
+
+
+def run_batch(path: str, workers: Optional[int] = None, revaluation: str = "linear",
+              include_positions: bool = False) -> BatchReport:
+    """
+    Analyzes every portfolio file under `path` (directory, zip or tar).
+    Files that fail to parse are reported as failed and left out of the
+    firm aggregates; they do not stop the batch.
+    """
+    start = time.perf_counter()
+    sources = list_batch_sources(path)
+    snapshot = get_scenario_library().snapshot
+    workers = min(workers or settings.BATCH_WORKERS or os.cpu_count() or 1, len(sources))
+
+    # Shocks and vol shocks of every library scenario, one shared block
+    block = np.column_stack([snapshot.matrix, snapshot.vol_shocks])
+    with SharedArray.create(block) as shared, stage("batch"):
+        initargs = (shared.spec, snapshot.entries, snapshot.rules, revaluation, include_positions)
+        if workers <= 1:
+            _init_worker(*initargs)
+            try:
+                outputs = [_analyze_source(s) for s in sources]
+            finally:
+                _close_worker()
+        else:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=initargs) as pool:
+                outputs = list(pool.map(_analyze_source, sources))
+
+    names = [s[2] for s in sources]
+    total_value, exposure, stress = _firm_report(names, outputs, snapshot)
+    portfolios = [result for result, _ in outputs]
+    succeeded = [p for p in portfolios if p.status == "succeeded"]
+    POSITIONS_PROCESSED.inc(sum(p.position_count for p in succeeded))
+    SCENARIOS_RUN.inc(len(succeeded) * len(snapshot.scenarios))
+
+    return BatchReport(
+        portfolio_count=len(portfolios),
+        failed_count=len(portfolios) - len(succeeded),
+        total_value=round(total_value, 2),
+        firm_exposure=exposure,
+        firm_stress=stress,
+        portfolios=portfolios,
+        revaluation=revaluation,
+        workers=workers,
+        elapsed_seconds=round(time.perf_counter() - start, 3)
+    )
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Stress-test every portfolio in a directory or archive")
+    parser.add_argument("path", help="Directory, zip or tar archive of portfolio files")
+    parser.add_argument("-o", "--output", help="Write the JSON report here instead of stdout")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--revaluation", choices=["linear", "full"], default="linear")
+    parser.add_argument("--include-positions", action="store_true", help="Per-position impacts in the report")
+    args = parser.parse_args(argv)
+
+    try:
+        report = run_batch(args.path, args.workers, args.revaluation, args.include_positions)
+    except ValueError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 2
+
+    body = report.model_dump_json(indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(body)
+    else:
+        print(body)
+    print(
+        f"{report.portfolio_count} portfolios ({report.failed_count} failed) in {report.elapsed_seconds:.2f}s "
+        f"on {report.workers} workers", file=sys.stderr
+    )
+    for p in report.portfolios:
+        if p.status == "failed":
+            print(f"FAILED {p.filename}: {p.error}", file=sys.stderr)
+    return 1 if report.failed_count else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
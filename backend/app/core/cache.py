@@ -0,0 +1,162 @@
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+from app.models import AnalysisResponse, CacheStats
+from app.core.config import settings
+from app.core.frame import PortfolioFrame, FLOAT_COLUMNS, TERM_COLUMNS
+
+
+def scenario_fingerprint() -> str:
+    """
+    Hash of the scenario library version (any edit to its scenarios, sets or
+    selection rules bumps it) plus the engine version, so cached results die
+    with either of them.
+    """
+    # Imported here: the engine depends on app.core, not the other way round
+    from app.engine.library import get_scenario_library
+    library = get_scenario_library().fingerprint
+    return hashlib.sha256(f"{settings.ENGINE_VERSION}|{library}".encode()).hexdigest()
+
+
+def upload_key(content: bytes) -> str:
+    """Key for a raw upload: only needs one pass of hashing."""
+    h = hashlib.sha256(content).hexdigest()
+    return f"upload:{h}:{scenario_fingerprint()}"
+
+
+def portfolio_key(frame: PortfolioFrame) -> str:
+    """
+    Key for normalized portfolio content, independent of CSV formatting
+    (header spelling, number formatting, asset class aliases).
+    """
+    h = hashlib.sha256()
+    for codes, labels in (
+        (frame.ticker_code, frame.ticker_labels),
+        (frame.sector_code, frame.sector_labels),
+        (frame.name_code, frame.name_labels),
+    ):
+        h.update("\x00".join(labels).encode())
+        h.update(codes.tobytes())
+    h.update(frame.asset_class.tobytes())
+    h.update(frame.rating.tobytes())
+    for c in FLOAT_COLUMNS:
+        h.update(getattr(frame, c).tobytes())
+    for c in TERM_COLUMNS:
+        if c in frame.terms:
+            h.update(c.encode())
+            h.update(frame.terms[c].tobytes())
+    return f"portfolio:{h.hexdigest()}:{scenario_fingerprint()}"
+
+
+class ResultCache:
+    """
+    Size-bounded in-process LRU with TTL, backed by an optional SQLite tier
+    that survives restarts. Disk hits are promoted to memory.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float, db_path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.db_path = db_path
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict() # key -> (stored_at, response)
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0, "expirations": 0}
+        self._db = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, stored_at REAL, payload TEXT)"
+            )
+            self._db.commit()
+
+    def _expired(self, stored_at: float) -> bool:
+        return time.time() - stored_at > self.ttl_seconds
+
+    def get(self, key: str, count_miss: bool = True) -> Optional[AnalysisResponse]:
+        """
+        Cached response for `key`, or None. Pass count_miss=False for a first
+        probe that falls back to another key, so one logical lookup is
+        counted once in the stats.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if not self._expired(entry[0]):
+                    self._entries.move_to_end(key)
+                    self._stats["hits"] += 1
+                    return entry[1]
+                del self._entries[key]
+                self._stats["expirations"] += 1
+
+            if self._db is not None:
+                row = self._db.execute("SELECT stored_at, payload FROM results WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    if not self._expired(row[0]):
+                        response = AnalysisResponse.model_validate_json(row[1])
+                        self._insert(key, row[0], response)
+                        self._stats["disk_hits"] += 1
+                        return response
+                    self._db.execute("DELETE FROM results WHERE key = ?", (key,))
+                    self._db.commit()
+                    self._stats["expirations"] += 1
+
+            if count_miss:
+                self._stats["misses"] += 1
+            return None
+
+    def put(self, key: str, response: AnalysisResponse):
+        stored_at = time.time()
+        with self._lock:
+            self._insert(key, stored_at, response)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO results (key, stored_at, payload) VALUES (?, ?, ?)",
+                    (key, stored_at, response.model_dump_json())
+                )
+                # Keep the disk tier bounded too, dropping the oldest rows
+                self._db.execute(
+                    "DELETE FROM results WHERE key NOT IN "
+                    "(SELECT key FROM results ORDER BY stored_at DESC LIMIT ?)",
+                    (settings.CACHE_DISK_MAX_ENTRIES,)
+                )
+                self._db.commit()
+
+    def _insert(self, key: str, stored_at: float, response: AnalysisResponse):
+        self._entries[key] = (stored_at, response)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def invalidate(self) -> int:
+        """Drops every cached result (both tiers). Returns entries removed."""
+        with self._lock:
+            removed = len(self._entries)
+            self._entries.clear()
+            if self._db is not None:
+                removed += self._db.execute("DELETE FROM results").rowcount
+                self._db.commit()
+            return removed
+
+    def stats(self) -> CacheStats:
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["disk_hits"] + self._stats["misses"]
+            hit_rate = (self._stats["hits"] + self._stats["disk_hits"]) / lookups if lookups else 0.0
+            return CacheStats(
+                entries=len(self._entries),
+                max_entries=self.max_entries,
+                ttl_seconds=self.ttl_seconds,
+                disk_enabled=self._db is not None,
+                hit_rate=round(hit_rate, 4),
+                **self._stats
+            )
+
+
+result_cache = ResultCache(
+    max_entries=settings.CACHE_MAX_ENTRIES if settings.CACHE_ENABLED else 0,
+    ttl_seconds=settings.CACHE_TTL_SECONDS,
+    db_path=settings.CACHE_DB_PATH if settings.CACHE_ENABLED else None
+)
@@ -1,8 +1,80 @@
 from pydantic import BaseModel
+from typing import Optional
 
 class Settings(BaseModel):
     PROJECT_NAME: str = "Portfolio Stress-Testing Agent"
     VERSION: str = "1.0.0"
     API_V1_STR: str = "/api/v1"
 
+    # Bump whenever a change alters analysis results, so cached results are not reused
+    ENGINE_VERSION: str = "3"
+
+    # Startup: heavy imports, the scenario library and first-call costs are paid by a warm-up
+    WARMUP_MODE: str = "background" # "background" (/ready is 503 until done), "blocking" (before serving) or "off"
+    STARTUP_BUDGET_MS: Optional[float] = None # Default cap for `python -m app.core.warmup --profile`
+
+    # Engine tuning
+    MATRIX_CHUNK_ELEMENTS: int = 2_000_000 # Max scenario x position cells held per chunk
+    MC_BATCH_SIZE: int = 10_000 # Draws per Monte Carlo batch (unit of work for the process pool)
+    MC_MAX_DRAWS: int = 1_000_000 # Hard cap on draws per request
+    MC_MAX_WORKERS: int = 8 # Monte Carlo pool size; caps MonteCarloConfig.workers
+    SIMULATION_WORKERS: int = 1 # Process pool size for sharding scenarios in run_stress_test; 1 runs serially
+    PARALLEL_MIN_CELLS: int = 5_000_000 # Scenario x position cells below which sharding is not worth it
+    PARALLEL_SHARDS_PER_WORKER: int = 2
+
+    # Out-of-core analysis (/api/analyze/large) over memory-mapped column files
+    OUT_OF_CORE_BLOCK_ROWS: int = 250_000 # Positions per streamed block
+    OUT_OF_CORE_TOP_K: int = 50 # Tickers kept per scenario when no top_k/threshold is asked for
+    OUT_OF_CORE_MAX_GROUPS: int = 10_000_000 # Cells of one exposure group-by (labels multiplied)
+    OUT_OF_CORE_DIR: Optional[str] = None # Where uploads are converted; None uses the system temp dir
+
+    # Full revaluation (revaluation="full")
+    RISK_FREE_RATE: float = 0.04 # Black-Scholes base rate; scenario rate shocks move it
+    DEFAULT_BOND_YIELD: float = 0.04 # For the convexity estimate when a bond has none
+    MIN_VOL: float = 0.0001 # Floor for shocked implied volatility
+
+    # Result cache for /api/analyze
+    CACHE_ENABLED: bool = True
+    CACHE_MAX_ENTRIES: int = 128
+    CACHE_TTL_SECONDS: float = 3600.0
+    CACHE_DB_PATH: Optional[str] = None # e.g. "result_cache.sqlite3" to persist across restarts
+    CACHE_DISK_MAX_ENTRIES: int = 1024
+
+    # Request pipeline: CPU-bound stages run off the event loop
+    EXECUTOR_KIND: str = "thread" # "thread" or "process"
+    EXECUTOR_WORKERS: int = 4
+    LARGE_UPLOAD_BYTES: int = 5_000_000 # Uploads at or above this use the "large" admission lane
+    MAX_CONCURRENT_SMALL: int = 8
+    MAX_WAITING_SMALL: int = 64
+    MAX_CONCURRENT_LARGE: int = 2
+    MAX_WAITING_LARGE: int = 4
+    AUDIT_QUEUE_SIZE: int = 10_000
+
+    # Audit log: group-committed writes, rotation and a query index
+    AUDIT_FSYNC: str = "batch" # "batch" (fsync every write batch), "interval" or "never"
+    AUDIT_FSYNC_INTERVAL_SECONDS: float = 1.0
+    AUDIT_MAX_BYTES: int = 50_000_000 # Rotate the active log above this size
+    AUDIT_ROTATE_SECONDS: Optional[float] = 86_400.0 # ... or once its first entry is this old
+    AUDIT_COMPRESS_ROTATED: bool = True
+    AUDIT_INDEX_ENABLED: bool = True # SQLite index next to the log (<log name>.index.sqlite3)
+
+    # Portfolios kept in memory for incremental (delta) re-analysis
+    INCREMENTAL_MAX_PORTFOLIOS: int = 32
+
+    # Background jobs (/api/jobs) for large stress runs
+    JOBS_DB_PATH: str = "jobs.sqlite3"
+    JOB_WORKERS: int = 2
+    JOB_RESULT_CACHE_SIZE: int = 8 # Parsed results kept in memory for paging
+    JOB_PAGE_SIZE: int = 1000
+    JOB_MAX_QUEUED: int = 32 # Jobs waiting for a worker; further submissions get 503
+    JOB_SPOOL_DIR: Optional[str] = None # Where queued uploads wait on disk; None uses the system temp dir
+
+    # Scenario library (scenarios, named sets and selection rules)
+    SCENARIO_DB_PATH: str = "scenario_library.sqlite3"
+    CALIBRATION_CACHE_DIR: Optional[str] = "calibration_cache" # N-day factor moves by data hash; None disables
+
+    # Multi-portfolio batch runs (/api/batch, python -m app.core.batch)
+    BATCH_WORKERS: Optional[int] = None # Process pool size; None uses every core
+    BATCH_MAX_FILES: int = 5000
+
 settings = Settings()
@@ -0,0 +1,125 @@
+import asyncio
+import contextvars
+import functools
+import threading
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Callable, Optional, TypeVar
+from fastapi import HTTPException
+from app.core.config import settings
+
+T = TypeVar("T")
+
+_executor: Optional[Executor] = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> Executor:
+    """
+    Pool for CPU-bound pipeline stages (settings.EXECUTOR_KIND). Threads are
+    the default: the heavy NumPy/pandas work releases the GIL and the result
+    cache and tracked portfolios stay shared. A process pool isolates
+    pure-Python work but each worker keeps its own cache.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            if settings.EXECUTOR_KIND == "process":
+                _executor = ProcessPoolExecutor(max_workers=settings.EXECUTOR_WORKERS)
+            else:
+                _executor = ThreadPoolExecutor(max_workers=settings.EXECUTOR_WORKERS, thread_name_prefix="pipeline")
+        return _executor
+
+
+def shutdown_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True)
+            _executor = None
+
+
+async def run_cpu_bound(func: Callable[..., T], *args, **kwargs) -> T:
+    """Runs func off the event loop so other requests (and /health) stay responsive."""
+    loop = asyncio.get_running_loop()
+    executor = get_executor()
+    call = functools.partial(func, *args, **kwargs)
+    if isinstance(executor, ThreadPoolExecutor):
+        # Carry the request context (e.g. an active profile) into the worker thread
+        call = functools.partial(contextvars.copy_context().run, call)
+    return await loop.run_in_executor(executor, call)
+
+
+async def run_in_thread(func: Callable[..., T], *args, **kwargs) -> T:
+    """
+    Like run_cpu_bound, but always on a thread: for work that must share
+    in-process state (e.g. registering a tracked portfolio).
+    """
+    return await asyncio.to_thread(func, *args, **kwargs)
+
+
+class _Lane:
+    def __init__(self, name: str, max_concurrent: int, max_waiting: int):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_waiting = max_waiting
+        self.active = 0
+        self.waiting = 0
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop = None
+
+    def semaphore(self) -> asyncio.Semaphore:
+        # Semaphores bind to the running loop; rebuild if the loop changed
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.max_concurrent)
+            self._loop = loop
+            self.active = self.waiting = 0
+        return self._semaphore
+
+
+class AdmissionController:
+    """
+    Concurrency limits for pipeline requests. Uploads above
+    settings.LARGE_UPLOAD_BYTES go through a separate, narrower lane, so a
+    few big books cannot starve small requests. When a lane's wait queue is
+    full the request is rejected with 503 instead of piling up.
+    """
+
+    def __init__(self):
+        self.small = _Lane("small", settings.MAX_CONCURRENT_SMALL, settings.MAX_WAITING_SMALL)
+        self.large = _Lane("large", settings.MAX_CONCURRENT_LARGE, settings.MAX_WAITING_LARGE)
+
+    def lane_for(self, size: int) -> _Lane:
+        return self.large if size >= settings.LARGE_UPLOAD_BYTES else self.small
+
+    @asynccontextmanager
+    async def slot(self, size: int):
+        lane = self.lane_for(size)
+        semaphore = lane.semaphore()
+        if semaphore.locked() and lane.waiting >= lane.max_waiting:
+            raise HTTPException(
+                status_code=503,
+                detail=f"Server busy ({lane.name} requests queue full), retry later",
+                headers={"Retry-After": "1"}
+            )
+        lane.waiting += 1
+        try:
+            await semaphore.acquire()
+        finally:
+            lane.waiting -= 1
+        lane.active += 1
+        try:
+            yield
+        finally:
+            lane.active -= 1
+            semaphore.release()
+
+    def stats(self) -> dict:
+        return {
+            lane.name: {"active": lane.active, "waiting": lane.waiting, "max_concurrent": lane.max_concurrent}
+            for lane in (self.small, self.large)
+        }
+
+
+admission = AdmissionController()
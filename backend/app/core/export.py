@@ -0,0 +1,64 @@
+import io
+import json
+from typing import List, Tuple
+from app.models import StressScenario
+from app.core.frame import PortfolioFrame
+from app.core.ingest import import_pyarrow
+from app.engine.matrix import evaluate_scenario_matrix, scenario_matrix
+
+MEDIA_TYPES = {
+    "arrow": "application/vnd.apache.arrow.file",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+# Scenario P&L columns are named "pnl:<scenario name>", so no scenario name can shadow a position column
+PNL_COLUMN_PREFIX = "pnl:"
+
+
+def pnl_matrix_table(frame: PortfolioFrame, scenarios: List[StressScenario]):
+    """
+    The scenarios x positions P&L matrix as an Arrow table: one row per
+    position (ticker, sector, market_value) and one float64 column per
+    scenario ("pnl:<name>"), unrounded. Scenario totals, descriptions and
+    the portfolio value go into the schema metadata.
+    """
+    pa = import_pyarrow()
+    names = [s.name for s in scenarios]
+    duplicates = sorted({n for n in names if names.count(n) > 1})
+    if duplicates:
+        raise ValueError(f"Duplicate scenario names: {', '.join(duplicates)}")
+    batch = evaluate_scenario_matrix(frame, scenario_matrix(scenarios))
+
+    # Tickers and sectors stay dictionary-encoded, as in the frame
+    columns = {
+        "ticker": pa.DictionaryArray.from_arrays(frame.ticker_code, frame.ticker_labels),
+        "sector": pa.DictionaryArray.from_arrays(frame.sector_code, frame.sector_labels),
+        "market_value": pa.array(frame.market_value),
+    }
+    for s, row in zip(scenarios, batch.pnl):
+        # Each matrix row is contiguous, so Arrow wraps it without copying
+        columns[PNL_COLUMN_PREFIX + s.name] = pa.array(row)
+
+    metadata = {
+        "as_of_date": frame.as_of_date,
+        "total_value": json.dumps(frame.total_value),
+        "scenarios": json.dumps([
+            {"name": s.name, "description": s.description, "total_pnl": float(total)}
+            for s, total in zip(scenarios, batch.totals)
+        ]),
+    }
+    return pa.table(columns).replace_schema_metadata(metadata)
+
+
+def serialize_table(table, fmt: str) -> Tuple[bytes, str]:
+    """Encodes a table as an Arrow IPC file or Parquet; returns (bytes, media type)."""
+    pa = import_pyarrow()
+    sink = io.BytesIO()
+    if fmt == "arrow":
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    elif fmt == "parquet":
+        pa.parquet.write_table(table, sink)
+    else:
+        raise ValueError(f"Unknown result format: {fmt}")
+    return sink.getvalue(), MEDIA_TYPES[fmt]
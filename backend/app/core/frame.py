@@ -0,0 +1,215 @@
+import numpy as np
+from typing import List, Optional, Union, Dict, Any, Tuple
+from app.models import Portfolio, PortfolioPosition, AssetClass, Rating
+from app.core.lazy import lazy_module
+
+pd = lazy_module("pandas")
+
+# Integer codes used for the columnar representation. The order follows the
+# enum definitions so a code can always be mapped back with list(Enum)[code].
+ASSET_CLASSES = list(AssetClass)
+RATINGS = list(Rating)
+ASSET_CLASS_CODES = {ac.value: i for i, ac in enumerate(ASSET_CLASSES)}
+RATING_CODES = {r.value: i for i, r in enumerate(RATINGS)}
+NO_RATING_CODE = -1  # Position has rating=None
+
+FLOAT_COLUMNS = ["quantity", "market_price", "market_value", "duration", "liquidity_score"]
+
+# Optional instrument terms used by full revaluation; NaN where not given.
+# option_type is +1 for calls, -1 for puts.
+TERM_COLUMNS = ["convexity", "option_type", "strike", "expiry", "vol", "underlying_price", "beta"]
+
+
+def ordered_sum(values: np.ndarray, axis: int = -1, initial: Optional[np.ndarray] = None):
+    """
+    Sums along `axis` strictly in position order. np.sum uses pairwise
+    summation, which can differ from a Python loop in the last bit;
+    accumulating keeps totals identical to the loop. `initial` continues
+    a running sum, so summing a book block by block gives the same result
+    as one pass.
+    """
+    if initial is not None:
+        values = np.concatenate([np.expand_dims(initial, axis), values], axis=axis)
+    if values.shape[axis] == 0:
+        return np.zeros(np.delete(values.shape, axis)) if values.ndim > 1 else 0.0
+    return np.add.accumulate(values, axis=axis).take(-1, axis=axis)
+
+
+def _intern(values) -> Tuple[np.ndarray, List[str]]:
+    codes, labels = pd.factorize(pd.Series(values, dtype=object), sort=False)
+    return codes.astype(np.int32), [str(v) for v in labels]
+
+
+class PortfolioFrame:
+    """
+    Struct-of-arrays portfolio. Numeric fields are float64 columns, asset
+    class and rating are int8 enum codes, and ticker, sector and name are
+    interned int32 codes into label lists (first-appearance order). The
+    Pydantic Portfolio is only built on demand via to_portfolio().
+    """
+
+    def __init__(self, asset_class: np.ndarray, rating: np.ndarray,
+                 ticker_code: np.ndarray, ticker_labels: List[str],
+                 sector_code: np.ndarray, sector_labels: List[str],
+                 name_code: np.ndarray, name_labels: List[str],
+                 quantity: np.ndarray, market_price: np.ndarray, market_value: np.ndarray,
+                 duration: np.ndarray, liquidity_score: np.ndarray,
+                 as_of_date: str, total_value: Optional[float] = None,
+                 terms: Optional[Dict[str, np.ndarray]] = None):
+        self.asset_class = asset_class
+        self.rating = rating
+        self.ticker_code = ticker_code
+        self.ticker_labels = ticker_labels
+        self.sector_code = sector_code
+        self.sector_labels = sector_labels
+        self.name_code = name_code
+        self.name_labels = name_labels
+        self.quantity = quantity
+        self.market_price = market_price
+        self.market_value = market_value
+        self.duration = duration
+        self.liquidity_score = liquidity_score
+        self.as_of_date = as_of_date
+        self.total_value = float(ordered_sum(market_value)) if total_value is None else total_value
+        # Only the TERM_COLUMNS present in the upload
+        self.terms: Dict[str, np.ndarray] = terms or {}
+
+        # Derived data (leg masks, tickers per row, Pydantic model) built lazily
+        self.derived: Dict[str, Any] = {}
+
+    def __len__(self) -> int:
+        return len(self.market_value)
+
+    def term(self, name: str) -> np.ndarray:
+        """Term column, all NaN if the upload did not have it."""
+        values = self.terms.get(name)
+        return values if values is not None else np.full(len(self), np.nan)
+
+    @property
+    def tickers(self) -> List[str]:
+        """Ticker per row."""
+        if "tickers" not in self.derived:
+            labels = self.ticker_labels
+            self.derived["tickers"] = [labels[c] for c in self.ticker_code.tolist()]
+        return self.derived["tickers"]
+
+    @classmethod
+    def from_dataframe(cls, df: "pd.DataFrame", as_of_date: str) -> "PortfolioFrame":
+        """
+        Builds a frame from a normalized ingest chunk (PortfolioPosition field
+        names as columns, enum values as strings).
+        """
+        ticker_code, ticker_labels = _intern(df["ticker"])
+        sector_code, sector_labels = _intern(df["sector"])
+        name_code, name_labels = _intern(df["name"])
+        return cls(
+            asset_class=df["asset_class"].map(ASSET_CLASS_CODES).to_numpy(dtype=np.int8),
+            rating=df["rating"].map(RATING_CODES).fillna(NO_RATING_CODE).to_numpy(dtype=np.int8),
+            ticker_code=ticker_code, ticker_labels=ticker_labels,
+            sector_code=sector_code, sector_labels=sector_labels,
+            name_code=name_code, name_labels=name_labels,
+            as_of_date=as_of_date,
+            terms={c: df[c].to_numpy(dtype=np.float64) for c in TERM_COLUMNS if c in df.columns},
+            **{c: df[c].to_numpy(dtype=np.float64) for c in FLOAT_COLUMNS}
+        )
+
+    @classmethod
+    def from_portfolio(cls, portfolio: Portfolio) -> "PortfolioFrame":
+        positions = portfolio.positions
+        df = pd.DataFrame({
+            "asset_class": [AssetClass(p.asset_class).value for p in positions],
+            "rating": [Rating(p.rating).value if p.rating is not None else None for p in positions],
+            "ticker": [p.ticker for p in positions],
+            "sector": [p.sector for p in positions],
+            "name": [p.name for p in positions],
+            "quantity": [p.quantity for p in positions],
+            "market_price": [p.market_price for p in positions],
+            "market_value": [p.market_value for p in positions],
+            "duration": [p.duration or 0.0 for p in positions],
+            "liquidity_score": [p.liquidity_score for p in positions],
+        }, columns=["asset_class", "rating", "ticker", "sector", "name"] + FLOAT_COLUMNS)
+        frame = cls.from_dataframe(df, portfolio.as_of_date)
+        frame.total_value = portfolio.total_value
+        frame.derived["portfolio"] = portfolio
+        return frame
+
+    @classmethod
+    def concat(cls, frames: List["PortfolioFrame"], as_of_date: str) -> "PortfolioFrame":
+        """
+        Concatenates frames (e.g. ingest chunks), re-interning label codes.
+        """
+        if len(frames) == 1:
+            return frames[0]
+
+        def merge(code_attr: str, label_attr: str):
+            labels: List[str] = []
+            index: Dict[str, int] = {}
+            parts = []
+            for f in frames:
+                remap = np.empty(len(getattr(f, label_attr)), dtype=np.int32)
+                for i, label in enumerate(getattr(f, label_attr)):
+                    if label not in index:
+                        index[label] = len(labels)
+                        labels.append(label)
+                    remap[i] = index[label]
+                parts.append(remap[getattr(f, code_attr)])
+            codes = np.concatenate(parts) if parts else np.empty(0, dtype=np.int32)
+            return codes, labels
+
+        ticker_code, ticker_labels = merge("ticker_code", "ticker_labels")
+        sector_code, sector_labels = merge("sector_code", "sector_labels")
+        name_code, name_labels = merge("name_code", "name_labels")
+        term_names = [c for c in TERM_COLUMNS if any(c in f.terms for f in frames)]
+        terms = {
+            c: np.concatenate([f.terms.get(c, np.full(len(f), np.nan)) for f in frames])
+            for c in term_names
+        }
+        return cls(
+            asset_class=np.concatenate([f.asset_class for f in frames]) if frames else np.empty(0, dtype=np.int8),
+            rating=np.concatenate([f.rating for f in frames]) if frames else np.empty(0, dtype=np.int8),
+            ticker_code=ticker_code, ticker_labels=ticker_labels,
+            sector_code=sector_code, sector_labels=sector_labels,
+            name_code=name_code, name_labels=name_labels,
+            as_of_date=as_of_date,
+            terms=terms,
+            **{c: np.concatenate([getattr(f, c) for f in frames]) if frames else np.empty(0) for c in FLOAT_COLUMNS}
+        )
+
+    def positions_slice(self, start: int = 0, stop: Optional[int] = None) -> List[PortfolioPosition]:
+        """Positions start:stop as (unvalidated) Pydantic models."""
+        sl = slice(start, stop)
+        asset_classes = [ASSET_CLASSES[c] for c in self.asset_class[sl].tolist()]
+        ratings = [RATINGS[c] if c != NO_RATING_CODE else None for c in self.rating[sl].tolist()]
+        tickers = [self.ticker_labels[c] for c in self.ticker_code[sl].tolist()]
+        sectors = [self.sector_labels[c] for c in self.sector_code[sl].tolist()]
+        names = [self.name_labels[c] for c in self.name_code[sl].tolist()]
+        return [
+            PortfolioPosition.model_construct(
+                asset_class=ac, ticker=t, name=nm, quantity=q, market_price=p, market_value=mv,
+                sector=sec, duration=d, rating=r, liquidity_score=liq
+            )
+            for ac, t, nm, q, p, mv, sec, d, r, liq in zip(
+                asset_classes, tickers, names,
+                self.quantity[sl].tolist(), self.market_price[sl].tolist(), self.market_value[sl].tolist(),
+                sectors, self.duration[sl].tolist(), ratings, self.liquidity_score[sl].tolist()
+            )
+        ]
+
+    def to_portfolio(self) -> Portfolio:
+        """
+        Converts to the Pydantic model (cached). Only needed at the API
+        boundary; the engine works on the columns directly.
+        """
+        if "portfolio" not in self.derived:
+            self.derived["portfolio"] = Portfolio(
+                positions=self.positions_slice(),
+                total_value=self.total_value,
+                as_of_date=self.as_of_date
+            )
+        return self.derived["portfolio"]
+
+
+def as_frame(portfolio: Union[Portfolio, PortfolioFrame]) -> PortfolioFrame:
+    if isinstance(portfolio, PortfolioFrame):
+        return portfolio
+    return PortfolioFrame.from_portfolio(portfolio)
@@ -1,10 +1,320 @@
-import pandas as pd
+import numpy as np
 import io
-from typing import List, Dict
-from app.models import Portfolio, PortfolioPosition, AssetClass, Rating
+import os
+from typing import List, Iterator, Optional, Tuple, Union, BinaryIO
+from app.models import Portfolio, AssetClass, Rating
+from app.core.frame import PortfolioFrame
+from app.core.lazy import lazy_module
 from datetime import datetime
 
-def parse_portfolio_csv(file_content: bytes, filename: str) -> Portfolio:
+pd = lazy_module("pandas")
+
+# Simple mapping for common asset class terms
+AC_MAP = {
+    'Fixed Income': 'Debt',
+    'Bond': 'Debt',
+    'Corporate Bond': 'Debt',
+    'Government': 'Debt',
+    'Govt': 'Debt',
+    'Bill': 'Debt',
+    'Note': 'Debt',
+    'Stock': 'Equity',
+    'Share': 'Equity',
+    'Cash': 'Cash',
+    'Currency': 'Cash',
+    'wc': 'Cash', # User's sample included 'wc' which might be Working Capital / Cash
+    'Option': 'Derivative',
+    'Future': 'Derivative',
+    'Swap': 'Derivative'
+}
+
+ASSET_CLASS_VALUES = {e.value for e in AssetClass}
+RATING_VALUES = {e.value for e in Rating}
+
+REQUIRED_COLUMNS = ['ticker', 'name', 'quantity', 'market_price', 'market_value', 'sector', 'liquidity_score']
+TEXT_COLUMNS = ['ticker', 'name', 'sector']
+NON_NEGATIVE_COLUMNS = ['quantity', 'market_price', 'market_value']
+
+# Optional instrument terms for full revaluation (see frame.TERM_COLUMNS).
+# expiry is in years, or a date (converted to years from today, 0 once passed).
+TERM_ALIASES = {'underlying': 'underlying_price', 'volatility': 'vol', 'implied_vol': 'vol', 'maturity': 'expiry'}
+POSITIVE_TERM_COLUMNS = ['strike', 'vol', 'underlying_price']
+OPTION_TYPES = {'call': 1.0, 'c': 1.0, 'put': -1.0, 'p': -1.0}
+
+# Rows per chunk when streaming large files
+DEFAULT_CHUNKSIZE = 100_000
+
+# Cap on the number of row errors listed in the exception message
+MAX_REPORTED_ERRORS = 20
+
+# Columnar uploads are recognized by their leading bytes (or, for paths, the extension)
+PARQUET_MAGIC = b"PAR1"
+ARROW_FILE_MAGIC = b"ARROW1"
+ARROW_STREAM_MAGIC = b"\xff\xff\xff\xff" # IPC stream continuation marker
+COLUMNAR_EXTENSIONS = {".parquet": "parquet", ".pq": "parquet", ".arrow": "arrow", ".feather": "arrow", ".arrows": "arrow"}
+
+CsvSource = Union[bytes, str, os.PathLike, BinaryIO]
+
+
+class PortfolioValidationError(ValueError):
+    """
+    Raised when one or more rows fail validation. `errors` holds
+    (row_number, column, message) tuples; row numbers are 1-based data rows.
+    """
+
+    def __init__(self, errors: List[Tuple[int, str, str]]):
+        self.errors = errors
+        shown = "; ".join(f"row {r} ({c}): {m}" for r, c, m in errors[:MAX_REPORTED_ERRORS])
+        more = f" (+{len(errors) - MAX_REPORTED_ERRORS} more)" if len(errors) > MAX_REPORTED_ERRORS else ""
+        super().__init__(f"Invalid portfolio rows: {shown}{more}")
+
+
+def normalize_column_name(name: str) -> str:
+    # Normalizing headers to snake_case for easier mapping
+    return name.strip().lower().replace(' ', '_')
+
+
+def map_asset_class(raw_ac: str) -> str:
+    # partial match or direct lookup
+    asset_class_val = AC_MAP.get(raw_ac)
+    if asset_class_val:
+        return asset_class_val
+    # Fallback: check if it matches the Enum values directly
+    if raw_ac in ASSET_CLASS_VALUES:
+        return raw_ac
+    # Try to find substring, default to Equity if unknown
+    if 'Bond' in raw_ac or 'Fixed' in raw_ac:
+        return 'Debt'
+    return 'Equity'
+
+
+def _map_unique(series: "pd.Series", func) -> "pd.Series":
+    """
+    Applies `func` once per distinct value instead of once per row.
+    """
+    uniques = series.unique()
+    return series.map({u: func(u) for u in uniques})
+
+
+def normalize_chunk(df: "pd.DataFrame", row_offset: int = 0) -> "pd.DataFrame":
+    """
+    Normalizes and validates one chunk of raw CSV rows (all read as text)
+    with column-wide operations. Returns a frame with the PortfolioPosition
+    field names as columns, or raises PortfolioValidationError listing every
+    bad row in the chunk.
+    """
+    df.columns = [normalize_column_name(c) for c in df.columns]
+    # Term aliases, unless the canonical column is also present
+    df.columns = [
+        TERM_ALIASES[c] if c in TERM_ALIASES and TERM_ALIASES[c] not in df.columns else c
+        for c in df.columns
+    ]
+    missing = [c for c in REQUIRED_COLUMNS if c not in df.columns]
+    if missing:
+        raise ValueError(f"Missing required columns: {', '.join(missing)}")
+
+    n = len(df)
+    row_numbers = np.arange(row_offset + 1, row_offset + n + 1)
+    errors: List[Tuple[int, str, str]] = []
+
+    def flag(mask, column: str, message: str):
+        mask = np.asarray(mask, dtype=bool)
+        if mask.any():
+            errors.extend((int(r), column, message) for r in row_numbers[mask])
+
+    out = pd.DataFrame(index=df.index)
+
+    # Asset class: missing column means Equity, missing cell maps through 'nan' like str(nan)
+    if 'asset_class' in df.columns:
+        raw_ac = df['asset_class'].fillna('nan').astype(str).str.strip()
+        out['asset_class'] = _map_unique(raw_ac, map_asset_class)
+    else:
+        out['asset_class'] = AssetClass.EQUITY.value
+
+    for col in TEXT_COLUMNS:
+        values = df[col]
+        flag(values.isna(), col, "value is required")
+        out[col] = values.fillna('').astype(str)
+
+    for col in NON_NEGATIVE_COLUMNS + ['liquidity_score']:
+        raw = df[col]
+        values = pd.to_numeric(raw, errors='coerce')
+        flag(raw.isna(), col, "value is required")
+        flag(values.isna() & raw.notna(), col, "not a number")
+        out[col] = values.astype(np.float64)
+    for col in NON_NEGATIVE_COLUMNS:
+        flag(out[col] < 0, col, "must be >= 0")
+    liq = out['liquidity_score']
+    flag((liq < 0) | (liq > 100), 'liquidity_score', "must be between 0 and 100")
+
+    # Duration: default 0 if missing
+    if 'duration' in df.columns:
+        raw = df['duration']
+        values = pd.to_numeric(raw, errors='coerce')
+        flag(values.isna() & raw.notna(), 'duration', "not a number")
+        out['duration'] = values.fillna(0.0).astype(np.float64)
+    else:
+        out['duration'] = 0.0
+
+    # Rating: default NR if missing
+    if 'rating' in df.columns:
+        ratings = df['rating'].fillna(Rating.NR.value).astype(str)
+        flag(~ratings.isin(RATING_VALUES), 'rating', "unknown rating")
+        out['rating'] = ratings
+    else:
+        out['rating'] = Rating.NR.value
+
+    _normalize_terms(df, out, flag)
+
+    if errors:
+        errors.sort()
+        raise PortfolioValidationError(errors)
+    return out.reset_index(drop=True)
+
+
+def _normalize_terms(df: "pd.DataFrame", out: "pd.DataFrame", flag):
+    # Blank cells stay NaN: the position is then valued with the linear model
+    if 'option_type' in df.columns:
+        raw = df['option_type']
+        values = raw.astype(str).str.strip().str.lower().map(OPTION_TYPES)
+        flag(values.isna() & raw.notna(), 'option_type', "must be call or put")
+        out['option_type'] = values.astype(np.float64)
+
+    for col in ['convexity', 'strike', 'vol', 'underlying_price', 'beta']:
+        if col in df.columns:
+            raw = df[col]
+            values = pd.to_numeric(raw, errors='coerce')
+            flag(values.isna() & raw.notna(), col, "not a number")
+            out[col] = values.astype(np.float64)
+
+    if 'expiry' in df.columns:
+        raw = df['expiry']
+        values = pd.to_numeric(raw, errors='coerce')
+        as_dates = values.isna() & raw.notna()
+        if as_dates.any():
+            dates = pd.to_datetime(raw[as_dates], errors='coerce')
+            # Expired (or expiring today) options are valued at intrinsic value
+            values[as_dates] = ((dates - pd.Timestamp.now().normalize()).dt.days / 365.25).clip(lower=0.0)
+            flag(as_dates & values.isna(), 'expiry', "not a number of years or a date")
+        out['expiry'] = values.astype(np.float64)
+        # A number of years must still be positive
+        flag(~as_dates & (values <= 0), 'expiry', "must be > 0")
+
+    for col in POSITIVE_TERM_COLUMNS:
+        if col in out.columns:
+            flag(out[col] <= 0, col, "must be > 0")
+
+
+def _open_source(source: CsvSource):
+    if isinstance(source, (bytes, bytearray)):
+        return io.BytesIO(source)
+    return source
+
+
+def iter_portfolio_chunks(source: CsvSource, chunksize: int = DEFAULT_CHUNKSIZE) -> Iterator["pd.DataFrame"]:
+    """
+    Streams a portfolio CSV (bytes, path or binary file object) as
+    normalized, validated chunks of at most `chunksize` rows, so memory
+    stays flat regardless of file size.
+    """
+    try:
+        reader = pd.read_csv(_open_source(source), dtype=str, chunksize=chunksize)
+    except Exception as e:
+        raise ValueError(f"Failed to read CSV: {str(e)}")
+
+    row_offset = 0
+    while True:
+        try:
+            chunk = next(reader)
+        except StopIteration:
+            return
+        except Exception as e:
+            raise ValueError(f"Failed to read CSV: {str(e)}")
+        yield normalize_chunk(chunk, row_offset)
+        row_offset += len(chunk)
+
+
+def import_pyarrow():
+    """pyarrow is optional; only Parquet/Arrow uploads and results need it."""
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError:
+        raise ValueError("Parquet/Arrow support requires the 'pyarrow' package")
+    return pyarrow
+
+
+def detect_upload_format(source: CsvSource, filename: Optional[str] = None) -> str:
+    """Returns "csv", "parquet" or "arrow"."""
+    if isinstance(source, (bytes, bytearray)):
+        head = bytes(source[:6])
+        if head.startswith(PARQUET_MAGIC):
+            return "parquet"
+        if head.startswith(ARROW_FILE_MAGIC) or head.startswith(ARROW_STREAM_MAGIC):
+            return "arrow"
+        return "csv"
+    name = os.fspath(source) if isinstance(source, (str, os.PathLike)) else filename
+    return COLUMNAR_EXTENSIONS.get(os.path.splitext(name or "")[1].lower(), "csv")
+
+
+def _iter_record_batches(pa, source: CsvSource, fmt: str, chunksize: int):
+    # Bytes are wrapped without copying; Arrow reads straight from the upload buffer
+    src = pa.BufferReader(source) if isinstance(source, (bytes, bytearray)) else source
+    if fmt == "parquet":
+        yield from pa.parquet.ParquetFile(src).iter_batches(batch_size=chunksize)
+        return
+    try:
+        reader = pa.ipc.open_file(src)
+        batches = (reader.get_batch(i) for i in range(reader.num_record_batches))
+    except pa.ArrowInvalid:
+        if isinstance(src, pa.BufferReader):
+            src.seek(0)
+        batches = pa.ipc.open_stream(src)
+    for batch in batches:
+        for start in range(0, batch.num_rows, chunksize):
+            yield batch.slice(start, chunksize)
+
+
+def iter_columnar_chunks(source: CsvSource, fmt: str, chunksize: int = DEFAULT_CHUNKSIZE) -> Iterator["pd.DataFrame"]:
+    """
+    Streams a Parquet or Arrow IPC portfolio as normalized, validated chunks.
+    Column names follow the CSV headers; numeric columns keep their type, so
+    no text parsing is needed. Each batch is still copied into pandas and
+    normalized like a CSV chunk before it is packed into the frame.
+    """
+    pa = import_pyarrow()
+    row_offset = 0
+    batches = _iter_record_batches(pa, source, fmt, chunksize)
+    while True:
+        try:
+            batch = next(batches)
+        except StopIteration:
+            return
+        except Exception as e:
+            raise ValueError(f"Failed to read {fmt.capitalize()}: {str(e)}")
+        yield normalize_chunk(batch.to_pandas(), row_offset)
+        row_offset += batch.num_rows
+
+
+def parse_portfolio_frame(file_content: CsvSource, filename: str, chunksize: Optional[int] = None) -> PortfolioFrame:
+    """
+    Parses a portfolio CSV, Parquet or Arrow IPC file straight into a
+    columnar PortfolioFrame. Each chunk is packed as soon as it is
+    validated, so only compact columns are held while the file streams
+    through.
+    """
+    as_of_date = datetime.now().strftime("%Y-%m-%d")
+    fmt = detect_upload_format(file_content, filename)
+    if fmt == "csv":
+        chunks = iter_portfolio_chunks(file_content, chunksize or DEFAULT_CHUNKSIZE)
+    else:
+        chunks = iter_columnar_chunks(file_content, fmt, chunksize or DEFAULT_CHUNKSIZE)
+    frames = [PortfolioFrame.from_dataframe(chunk, as_of_date) for chunk in chunks]
+    return PortfolioFrame.concat(frames, as_of_date)
+
+
+def parse_portfolio_csv(file_content: CsvSource, filename: str, chunksize: Optional[int] = None) -> Portfolio:
     """
     Parses a CSV file content into a Portfolio object.
     Expected CSV columns:
@@ -19,86 +329,4 @@ def parse_portfolio_csv(file_content: bytes, filename: str) -> Portfolio:
     - Rating
     - Liquidity Score
     """
-    try:
-        df = pd.read_csv(io.BytesIO(file_content))
-    except Exception as e:
-        raise ValueError(f"Failed to read CSV: {str(e)}")
-
-    # Normalizing headers to snake_case for easier mapping
-    df.columns = [c.strip().lower().replace(' ', '_') for c in df.columns]
-
-    positions = []
-    
-    # Required columns mapping check could happen here, but Pydantic will catch missing fields
-    # We might need to map some columns if they don't match exactly. 
-    # For now, we assume the CSV is well-formed or we do minimal cleaning.
-
-    for _, row in df.iterrows():
-        # Handle Rating enum conversion safely
-        rating_val = row.get('rating', 'NR')
-        if pd.isna(rating_val):
-            rating_val = 'NR'
-        
-        # Handle Asset Class enum
-        raw_ac = str(row.get('asset_class', 'Equity')).strip()
-        # Simple mapping for common terms
-        ac_map = {
-            'Fixed Income': 'Debt',
-            'Bond': 'Debt',
-            'Corporate Bond': 'Debt',
-            'Government': 'Debt',
-            'Govt': 'Debt',
-            'Bill': 'Debt',
-            'Note': 'Debt',
-            'Stock': 'Equity',
-            'Share': 'Equity',
-            'Cash': 'Cash',
-            'Currency': 'Cash',
-            'wc': 'Cash', # User's sample included 'wc' which might be Working Capital / Cash
-            'Option': 'Derivative',
-            'Future': 'Derivative',
-            'Swap': 'Derivative'
-        }
-        # partial match or direct lookup
-        asset_class_val = ac_map.get(raw_ac)
-        
-        if not asset_class_val:
-            # Fallback: check if it matches the Enum values directly
-            if raw_ac in [e.value for e in AssetClass]:
-                asset_class_val = raw_ac
-            else:
-                # Default to Equity if unknown, or maybe Debt if it sounds like it?
-                # For safety/simplicity, let's default to Equity but log? 
-                # Or better, try to find substring
-                if 'Bond' in raw_ac or 'Fixed' in raw_ac:
-                     asset_class_val = 'Debt'
-                else:
-                     asset_class_val = 'Equity'
-        
-        # Handle Duration (default 0 if nan)
-        duration_val = row.get('duration', 0.0)
-        if pd.isna(duration_val):
-            duration_val = 0.0
-
-        pos = PortfolioPosition(
-            asset_class=asset_class_val,
-            ticker=row['ticker'],
-            name=row['name'],
-            quantity=float(row['quantity']),
-            market_price=float(row['market_price']),
-            market_value=float(row['market_value']),
-            sector=row['sector'],
-            duration=float(duration_val),
-            rating=rating_val,
-            liquidity_score=float(row['liquidity_score'])
-        )
-        positions.append(pos)
-
-    # Calculate total value
-    total_value = sum(p.market_value for p in positions)
-    
-    return Portfolio(
-        positions=positions,
-        total_value=total_value,
-        as_of_date=datetime.now().strftime("%Y-%m-%d")
-    )
+    return parse_portfolio_frame(file_content, filename, chunksize).to_portfolio()
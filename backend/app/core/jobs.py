@@ -0,0 +1,230 @@
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+from app.models import AnalysisResponse, JobStatus
+from app.core.config import settings
+from app.core.ingest import CsvSource, parse_portfolio_frame
+from app.core.audit import log_analysis_request
+from app.core.pipeline import analyze_frame
+
+# Terminal states are never left again
+FINISHED_STATES = {"succeeded", "failed", "cancelled"}
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class JobQueueFull(Exception):
+    """Raised by JobManager.submit when settings.JOB_MAX_QUEUED jobs are already waiting."""
+
+
+class JobStore:
+    """
+    SQLite-backed job table. Finished results are stored as JSON, so they
+    survive restarts; jobs still queued or running at startup are marked
+    failed because their input is not kept.
+    """
+
+    def __init__(self, db_path: str):
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "job_id TEXT PRIMARY KEY, status TEXT, stage TEXT, progress REAL, filename TEXT, "
+                "created_at REAL, updated_at REAL, error TEXT, result TEXT)"
+            )
+            self._db.execute(
+                "UPDATE jobs SET status = 'failed', error = 'Interrupted by server restart', updated_at = ? "
+                "WHERE status IN ('queued', 'running')",
+                (time.time(),)
+            )
+            self._db.commit()
+
+    def create(self, filename: str) -> JobStatus:
+        now = time.time()
+        job = JobStatus(job_id=uuid.uuid4().hex, status="queued", stage="queued", progress=0.0,
+                        filename=filename, created_at=now, updated_at=now)
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO jobs (job_id, status, stage, progress, filename, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job.job_id, job.status, job.stage, job.progress, job.filename, job.created_at, job.updated_at)
+            )
+            self._db.commit()
+        return job
+
+    def update(self, job_id: str, **fields):
+        fields["updated_at"] = time.time()
+        columns = ", ".join(f"{k} = ?" for k in fields)
+        with self._lock:
+            self._db.execute(f"UPDATE jobs SET {columns} WHERE job_id = ?", (*fields.values(), job_id))
+            self._db.commit()
+
+    def get(self, job_id: str) -> Optional[JobStatus]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT job_id, status, stage, progress, filename, created_at, updated_at, error "
+                "FROM jobs WHERE job_id = ?", (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        keys = ["job_id", "status", "stage", "progress", "filename", "created_at", "updated_at", "error"]
+        return JobStatus(**dict(zip(keys, row)))
+
+    def result_json(self, job_id: str) -> Optional[str]:
+        with self._lock:
+            row = self._db.execute("SELECT result FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return row[0] if row else None
+
+
+class JobManager:
+    """
+    Runs the ingest -> exposure -> scenarios -> simulation pipeline for
+    submitted uploads on a local worker pool, recording stage and progress
+    in the JobStore. Cancellation is cooperative: it takes effect at the next
+    stage or scenario boundary. At most max_queued jobs wait for a worker;
+    submit() raises JobQueueFull beyond that.
+    """
+
+    def __init__(self, db_path: str, workers: int, max_queued: Optional[int] = None):
+        self.store = JobStore(db_path)
+        self.max_queued = settings.JOB_MAX_QUEUED if max_queued is None else max_queued
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+        self._cancel: Dict[str, threading.Event] = {}
+        self._queued = 0 # Submitted jobs not yet picked up by a worker
+        self._spooled: Dict[str, str] = {} # Spool files of jobs not yet picked up, by job ID
+        self._results: "OrderedDict[str, AnalysisResponse]" = OrderedDict() # Recently read results
+        self._lock = threading.Lock()
+
+    def submit(self, source: CsvSource, filename: str, delete_after: bool = False) -> JobStatus:
+        """
+        Queues an analysis of `source` (bytes or a path). With delete_after,
+        `source` is a spooled file that the job removes once it has run, or
+        straight away if the queue is full.
+        """
+        with self._lock:
+            full = self._queued >= self.max_queued
+            if not full:
+                self._queued += 1
+        if full:
+            if delete_after:
+                os.remove(source)
+            raise JobQueueFull(f"{self.max_queued} jobs already queued")
+        job = None
+        try:
+            job = self.store.create(filename)
+            with self._lock:
+                self._cancel[job.job_id] = threading.Event()
+                if delete_after:
+                    self._spooled[job.job_id] = source
+            self._pool.submit(self._run, job.job_id, source, filename)
+        except BaseException:
+            with self._lock:
+                self._queued -= 1
+                if job is not None:
+                    self._cancel.pop(job.job_id, None)
+                    self._spooled.pop(job.job_id, None)
+            if delete_after:
+                os.remove(source)
+            raise
+        return job
+
+    def cancel(self, job_id: str) -> Optional[JobStatus]:
+        job = self.store.get(job_id)
+        if job is None or job.status in FINISHED_STATES:
+            return job
+        with self._lock:
+            event = self._cancel.get(job_id)
+        if event is not None:
+            event.set()
+        if job.status == "queued":
+            # Not picked up yet: the worker will skip it
+            self.store.update(job_id, status="cancelled", stage="cancelled")
+        return self.store.get(job_id)
+
+    def _run(self, job_id: str, source: CsvSource, filename: str):
+        with self._lock:
+            event = self._cancel[job_id]
+            self._queued -= 1
+            # From here on the spool file is this worker's to remove
+            spooled = self._spooled.pop(job_id, None)
+
+        def progress(stage: str, fraction: float):
+            if event.is_set():
+                raise JobCancelled()
+            self.store.update(job_id, stage=stage, progress=fraction)
+
+        try:
+            if event.is_set():
+                raise JobCancelled()
+            self.store.update(job_id, status="running", stage="ingest", progress=0.0)
+            frame = parse_portfolio_frame(source, filename)
+            response = analyze_frame(frame, progress)
+            progress("saving", 0.95)
+            outcome = dict(status="succeeded", stage="done", progress=1.0, result=response.model_dump_json())
+        except JobCancelled:
+            response, outcome = None, dict(status="cancelled", stage="cancelled")
+        except Exception as e:
+            response, outcome = None, dict(status="failed", stage="failed", error=str(e))
+        finally:
+            with self._lock:
+                self._cancel.pop(job_id, None)
+            if spooled is not None:
+                os.remove(spooled)
+        # Recorded last, so a finished job never leaves its upload behind
+        self.store.update(job_id, **outcome)
+        if response is not None:
+            log_analysis_request(filename, response)
+
+    def result(self, job_id: str) -> Optional[AnalysisResponse]:
+        with self._lock:
+            if job_id in self._results:
+                self._results.move_to_end(job_id)
+                return self._results[job_id]
+        payload = self.store.result_json(job_id)
+        if payload is None:
+            return None
+        response = AnalysisResponse.model_validate_json(payload)
+        with self._lock:
+            self._results[job_id] = response
+            while len(self._results) > settings.JOB_RESULT_CACHE_SIZE:
+                self._results.popitem(last=False)
+        return response
+
+    def shutdown(self):
+        """Drops queued jobs, removing their spool files; running jobs finish in the background."""
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        # Cancelled jobs never reach _run, so nothing else will remove their uploads
+        with self._lock:
+            orphaned = list(self._spooled.values())
+            self._spooled.clear()
+        for path in orphaned:
+            os.remove(path)
+
+
+_manager: Optional[JobManager] = None
+_manager_lock = threading.Lock()
+
+
+def get_job_manager() -> JobManager:
+    """Created on first use so the job database only exists when jobs are used."""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = JobManager(settings.JOBS_DB_PATH, settings.JOB_WORKERS)
+        return _manager
+
+
+def shutdown_job_manager():
+    global _manager
+    with _manager_lock:
+        if _manager is not None:
+            _manager.shutdown()
+            _manager = None
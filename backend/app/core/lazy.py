@@ -0,0 +1,37 @@
+"""
+Deferred imports for dependencies that are slow to load.
+
+pandas (and pyarrow, which pandas loads with it) take a few hundred
+milliseconds to import, and nothing needs them until the first portfolio is
+parsed. A module that writes `pd = lazy_module("pandas")` does the real
+import on first attribute access. The warm-up hook (app/core/warmup.py) can
+also load them before the pod is marked ready.
+"""
+import importlib
+import sys
+from types import ModuleType
+
+
+class LazyModule:
+    """Module proxy; imports `name` on first attribute access."""
+
+    def __init__(self, name: str):
+        self.__name = name
+
+    def load(self) -> ModuleType:
+        return importlib.import_module(self.__name)
+
+    def __getattr__(self, attr: str):
+        return getattr(self.load(), attr)
+
+    def __repr__(self) -> str:
+        state = "loaded" if self.__name in sys.modules else "not loaded"
+        return f"<lazy module {self.__name!r} ({state})>"
+
+
+def lazy_module(name: str) -> LazyModule:
+    return LazyModule(name)
+
+
+def is_loaded(name: str) -> bool:
+    return name in sys.modules
@@ -0,0 +1,182 @@
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+# Latency buckets in seconds (Prometheus "le" bounds)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+PROFILE_HEADER = "x-profile"
+
+# Stage timings of the current request, only set when it asked for a profile
+_profile: contextvars.ContextVar[Optional[List[Tuple[str, float]]]] = contextvars.ContextVar("profile", default=None)
+
+LabelValues = Tuple[str, ...]
+
+
+def _format_labels(names: Tuple[str, ...], values: LabelValues, extra: str = "") -> str:
+    parts = [f'{n}="{v}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.name, self.help, self.labels = name, help, labels
+        self._values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, *label_values: str):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def value(self, *label_values: str) -> float:
+        return self._values.get(label_values, 0.0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for values, v in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labels, values)} {v:g}")
+        return lines
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus exposition format."""
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (), buckets=DEFAULT_BUCKETS):
+        self.name, self.help, self.labels = name, help, labels
+        self.buckets = tuple(buckets)
+        # label values -> [per-bucket counts (+Inf last), sum, count]
+        self._series: Dict[LabelValues, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def count(self, *label_values: str) -> int:
+        series = self._series.get(label_values)
+        return series[2] if series else 0
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for values, (counts, total, n) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, c in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += c
+                    le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                    bucket_labels = _format_labels(self.labels, values, 'le="' + le + '"')
+                    lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labels, values)} {total:g}")
+                lines.append(f"{self.name}_count{_format_labels(self.labels, values)} {n}")
+        return lines
+
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "Request latency by endpoint", ("method", "route", "status")
+)
+STAGE_LATENCY = Histogram("pipeline_stage_seconds", "Time spent in each pipeline stage", ("stage",))
+POSITIONS_PROCESSED = Counter("positions_processed_total", "Positions run through the analysis pipeline")
+SCENARIOS_RUN = Counter("scenarios_run_total", "Stress scenarios simulated")
+
+METRICS = [REQUEST_LATENCY, STAGE_LATENCY, POSITIONS_PROCESSED, SCENARIOS_RUN]
+
+
+def render_metrics() -> str:
+    return "\n".join(line for metric in METRICS for line in metric.render()) + "\n"
+
+
+@contextmanager
+def stage(name: str):
+    """
+    Times a pipeline step into pipeline_stage_seconds and, when the current
+    request asked for a profile, into its stage breakdown.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_LATENCY.observe(elapsed, name)
+        profile = _profile.get()
+        if profile is not None:
+            profile.append((name, elapsed))
+
+
+def server_timing(profile: List[Tuple[str, float]]) -> str:
+    # Server-Timing header value: "ingest;dur=12.3, exposure;dur=0.8"
+    return ", ".join(f"{name};dur={seconds * 1000:.3f}" for name, seconds in profile)
+
+
+def route_label(scope) -> str:
+    """
+    Route template for the request (e.g. "/api/jobs/{job_id}"), so raw
+    paths do not blow up the label set. Routes of included routers only
+    know their own path, so the prefix is recovered from the request path.
+    """
+    route = scope.get("route")
+    template = getattr(route, "path", None)
+    if template is None:
+        return "unmatched"
+    path = scope["path"]
+    regex = getattr(route, "path_regex", None)
+    if regex is None or regex.match(path):
+        return template
+    for i, ch in enumerate(path):
+        if ch == "/" and i and regex.match(path[i:]):
+            return path[:i] + template
+    return template
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording per-endpoint latency. A request carrying an
+    `X-Profile: 1` header gets its stage breakdown back in a Server-Timing
+    response header (stages that run after the headers are sent, e.g. in a
+    streamed body, are not included).
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        profile = None
+        for key, value in scope["headers"]:
+            if key == PROFILE_HEADER.encode() and value.strip().lower() in (b"1", b"true", b"yes"):
+                profile = []
+                break
+        token = _profile.set(profile) if profile is not None else None
+
+        start = time.perf_counter()
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+                if profile is not None:
+                    total = time.perf_counter() - start
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", server_timing(profile + [("total", total)]).encode()))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            REQUEST_LATENCY.observe(time.perf_counter() - start, scope["method"], route_label(scope), str(status[0]))
+            if token is not None:
+                _profile.reset(token)
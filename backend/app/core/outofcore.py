@@ -0,0 +1,429 @@
+"""
+Out-of-core analysis for books larger than memory.
+
+    python -m app.core.outofcore book.parquet --top-k 50
+    python -m app.core.outofcore book.csv --store book_columns/   # keep the converted columns
+    python -m app.core.outofcore book_columns/ --rollup sector    # reuse them
+
+The input (CSV, Parquet read row group by row group, or Arrow IPC) is
+converted once into a directory of memory-mapped column files. The
+analysis then streams fixed-size blocks of positions through two passes:
+exposure aggregation, then scenario P&L. Only one block is held at a time,
+next to running sums and per-group accumulators, so memory depends on the
+block size and the number of distinct tickers, not on the number of
+positions. Scenario totals and attribution carry over from block to block
+in position order and equal the in-memory results exactly.
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import numpy as np
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+from app.models import ExposureReport, ImpactQuery, LargeBookAnalysis, StressScenario
+from app.core.config import settings
+from app.core.frame import PortfolioFrame, ordered_sum, FLOAT_COLUMNS
+from app.core.ingest import iter_portfolio_chunks, iter_columnar_chunks, detect_upload_format, DEFAULT_CHUNKSIZE
+from app.core.aggregation import DIMENSIONS, GroupedExposure, DEFAULT_CONCENTRATION_RULES, PORTFOLIO_METRICS
+from app.core.exposure import build_exposure_report, REPORT_GROUP_BYS
+from app.core.metrics import stage, POSITIONS_PROCESSED, SCENARIOS_RUN
+from app.core.pipeline import build_explanation
+from app.engine.scenarios import select_scenarios
+from app.engine.library import get_scenario_library
+from app.engine.matrix import evaluate_scenario_matrix, scenario_matrix, ScenarioMatrixResult, ATTRIBUTION_LABELS
+from app.engine.impacts import rank_impacts
+from app.engine.simulation import SimulationResult
+
+# Column files of a store and their dtypes; name labels are not kept
+STORE_COLUMNS = {
+    "asset_class": "i1",
+    "rating": "i1",
+    "ticker_code": "<i4",
+    "sector_code": "<i4",
+    **{c: "<f8" for c in FLOAT_COLUMNS},
+}
+META_FILE = "meta.json"
+
+
+def _column_path(directory: str, name: str) -> str:
+    return os.path.join(directory, f"{name}.bin")
+
+
+class ColumnStore:
+    """
+    A portfolio as one raw column file per field plus meta.json (row count,
+    as-of date, total value, ticker and sector labels). Ticker and sector
+    codes index the book-wide label lists, in first-appearance order.
+    """
+
+    def __init__(self, directory: str):
+        path = os.path.join(directory, META_FILE)
+        if not os.path.exists(path):
+            raise ValueError(f"Not a column store (no {META_FILE}): {directory}")
+        with open(path) as f:
+            meta = json.load(f)
+        self.directory = directory
+        self.rows: int = meta["rows"]
+        self.as_of_date: str = meta["as_of_date"]
+        self.total_value: float = meta["total_value"]
+        self.ticker_labels: List[str] = meta["tickers"]
+        self.sector_labels: List[str] = meta["sectors"]
+        self.terms: List[str] = meta["terms"]
+
+    def column(self, name: str) -> np.ndarray:
+        """Read-only memory map of a column (or term)."""
+        dtype = np.dtype(STORE_COLUMNS.get(name, "<f8"))
+        if self.rows == 0:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(_column_path(self.directory, name), dtype=dtype, mode="r", shape=(self.rows,))
+
+    def blocks(self, block_rows: int) -> Iterator[Tuple[int, PortfolioFrame]]:
+        """(first row, frame) per block; block frames are views over the mapped columns."""
+        columns = {c: self.column(c) for c in STORE_COLUMNS}
+        terms = {c: self.column(c) for c in self.terms}
+        no_codes = np.empty(0, dtype=np.int32)
+        for start in range(0, self.rows, block_rows):
+            sl = slice(start, min(start + block_rows, self.rows))
+            yield start, PortfolioFrame(
+                asset_class=columns["asset_class"][sl], rating=columns["rating"][sl],
+                ticker_code=columns["ticker_code"][sl], ticker_labels=self.ticker_labels,
+                sector_code=columns["sector_code"][sl], sector_labels=self.sector_labels,
+                name_code=no_codes, name_labels=[],
+                as_of_date=self.as_of_date, total_value=self.total_value,
+                terms={c: v[sl] for c, v in terms.items()},
+                **{c: columns[c][sl] for c in FLOAT_COLUMNS}
+            )
+
+    @classmethod
+    def convert(cls, source, filename: str, directory: str, chunksize: Optional[int] = None) -> "ColumnStore":
+        """
+        Streams a CSV, Parquet or Arrow file into a store in `directory`,
+        one validated chunk at a time. The columns are written to a
+        temporary sibling directory that replaces `directory` only once
+        complete, so a failed conversion leaves an existing store untouched.
+        """
+        as_of_date = datetime.now().strftime("%Y-%m-%d")
+        fmt = detect_upload_format(source, filename)
+        if fmt == "csv":
+            chunks = iter_portfolio_chunks(source, chunksize or DEFAULT_CHUNKSIZE)
+        else:
+            chunks = iter_columnar_chunks(source, fmt, chunksize or DEFAULT_CHUNKSIZE)
+
+        directory = os.path.abspath(directory)
+        os.makedirs(os.path.dirname(directory), exist_ok=True)
+        staging = tempfile.mkdtemp(prefix=".converting-", dir=os.path.dirname(directory))
+        try:
+            meta = cls._write_columns(chunks, staging, as_of_date)
+            with open(os.path.join(staging, META_FILE), "w") as f:
+                json.dump(meta, f)
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+
+        # Swap the finished store in; the old one is only removed afterwards
+        retired = None
+        if os.path.exists(directory):
+            retired = tempfile.mkdtemp(prefix=".retired-", dir=os.path.dirname(directory))
+            os.replace(directory, os.path.join(retired, "store"))
+        os.replace(staging, directory)
+        if retired is not None:
+            shutil.rmtree(retired, ignore_errors=True)
+        return cls(directory)
+
+    @staticmethod
+    def _write_columns(chunks, directory: str, as_of_date: str) -> dict:
+        """Writes the column files for `chunks` into `directory`; returns the store metadata."""
+        tickers: Dict[str, int] = {}
+        sectors: Dict[str, int] = {}
+        terms: Optional[List[str]] = None
+        files = {}
+        rows, total_value = 0, 0.0
+        try:
+            for chunk in chunks:
+                frame = PortfolioFrame.from_dataframe(chunk, as_of_date)
+                if terms is None:
+                    # Every chunk of a file has the same columns
+                    terms = list(frame.terms)
+                    for name in list(STORE_COLUMNS) + terms:
+                        files[name] = open(_column_path(directory, name), "wb")
+                values = {
+                    "asset_class": frame.asset_class,
+                    "rating": frame.rating,
+                    "ticker_code": _global_codes(frame.ticker_code, frame.ticker_labels, tickers),
+                    "sector_code": _global_codes(frame.sector_code, frame.sector_labels, sectors),
+                    **{c: getattr(frame, c) for c in FLOAT_COLUMNS},
+                    **{c: frame.term(c) for c in terms},
+                }
+                for name, f in files.items():
+                    np.ascontiguousarray(values[name], dtype=STORE_COLUMNS.get(name, "<f8")).tofile(f)
+                # Same running order as summing the whole book at once
+                total_value = float(ordered_sum(frame.market_value, initial=np.float64(total_value)))
+                rows += len(frame)
+        finally:
+            for f in files.values():
+                f.close()
+
+        return {
+            "rows": rows,
+            "as_of_date": as_of_date,
+            "total_value": total_value,
+            "tickers": list(tickers),
+            "sectors": list(sectors),
+            "terms": terms or [],
+        }
+
+
+def _global_codes(codes: np.ndarray, labels: List[str], index: Dict[str, int]) -> np.ndarray:
+    # Chunk-local label codes -> book-wide codes (new labels are appended)
+    remap = np.array([index.setdefault(label, len(index)) for label in labels], dtype=np.int32)
+    return remap[codes] if len(codes) else codes
+
+
+def _add_by_code(acc: np.ndarray, codes: np.ndarray, weights: Optional[np.ndarray] = None):
+    # bincount over the range of codes in the block only; codes interned in
+    # first-appearance order are mostly clustered, so this stays O(block)
+    if len(codes) == 0:
+        return
+    lo, hi = int(codes.min()), int(codes.max())
+    acc[lo:hi + 1] += np.bincount(codes - lo, weights=weights, minlength=hi - lo + 1)
+
+
+class _GroupTotals:
+    """Market value, weight and count per group of one group-by, over book-wide codes."""
+
+    def __init__(self, dimensions: Tuple[str, ...], sample: PortfolioFrame):
+        unknown = [d for d in dimensions if d not in DIMENSIONS]
+        if unknown:
+            raise ValueError(f"Unknown exposure dimension(s): {', '.join(unknown)}")
+        self.dimensions = dimensions
+        self.labels = [DIMENSIONS[d](sample)[1] for d in dimensions]
+        self.shape = tuple(max(len(labels), 1) for labels in self.labels)
+        size = int(np.prod(self.shape))
+        if size > settings.OUT_OF_CORE_MAX_GROUPS:
+            raise ValueError(f"Group-by {' x '.join(dimensions)} has {size} cells, the limit is "
+                             f"{settings.OUT_OF_CORE_MAX_GROUPS}")
+        self.market_value = np.zeros(size)
+        self.weight = np.zeros(size)
+        self.count = np.zeros(size, dtype=np.int64)
+        self.first = np.full(size, np.iinfo(np.int64).max)
+
+    def codes(self, frame: PortfolioFrame) -> np.ndarray:
+        combined = np.zeros(len(frame), dtype=np.int64)
+        for d, n in zip(self.dimensions, self.shape):
+            combined = combined * n + DIMENSIONS[d](frame)[0]
+        return combined
+
+    def add(self, frame: PortfolioFrame, offset: int, weight: np.ndarray):
+        codes = self.codes(frame)
+        _add_by_code(self.market_value, codes, frame.market_value)
+        _add_by_code(self.weight, codes, weight)
+        _add_by_code(self.count, codes)
+        present, first = np.unique(codes, return_index=True)
+        self.first[present] = np.minimum(self.first[present], first + offset)
+
+    def order(self) -> np.ndarray:
+        """Groups with positions, in first-appearance order."""
+        present = np.flatnonzero(self.count)
+        return present[np.argsort(self.first[present], kind="stable")]
+
+    def grouped(self) -> GroupedExposure:
+        order = self.order()
+        parts = np.unravel_index(order, self.shape)
+        columns = [[labels[c] for c in codes.tolist()] for codes, labels in zip(parts, self.labels)]
+        keys = list(zip(*columns)) if columns else [()] * len(order)
+        return GroupedExposure(self.dimensions, keys, self.market_value[order], self.weight[order],
+                               self.count[order])
+
+
+def _store_exposure(store: ColumnStore, group_bys: Sequence[Tuple[str, ...]], block_rows: int):
+    """Pass 1: grouped exposure and value-weighted metrics, block by block."""
+    if store.rows == 0 or store.total_value == 0:
+        return None, {}
+    totals: Dict[Tuple[str, ...], _GroupTotals] = {}
+    sums = {m: np.float64(0.0) for m in PORTFOLIO_METRICS}
+    columns = {"weighted_average_duration": "duration", "liquidity_profile": "liquidity_score"}
+
+    for offset, frame in store.blocks(block_rows):
+        if not totals:
+            totals = {dims: _GroupTotals(dims, frame) for dims in dict.fromkeys(group_bys)}
+        weight = frame.market_value / store.total_value
+        for group in totals.values():
+            group.add(frame, offset, weight)
+        for m, c in columns.items():
+            sums[m] = ordered_sum(getattr(frame, c) * weight, initial=sums[m])
+    return totals, {m: float(v) for m, v in sums.items()}
+
+
+def analyze_column_store(store: ColumnStore, impact_query: Optional[ImpactQuery] = None,
+                         scenario_set: Optional[str] = None, revaluation: str = "linear",
+                         block_rows: Optional[int] = None) -> LargeBookAnalysis:
+    """
+    Exposure -> scenario selection -> simulation -> explanation over a column
+    store, streaming blocks of block_rows positions (settings.OUT_OF_CORE_BLOCK_ROWS).
+    position_impacts follow impact_query; without top_k or threshold the
+    settings.OUT_OF_CORE_TOP_K largest absolute impacts are kept.
+    """
+    block_rows = block_rows or settings.OUT_OF_CORE_BLOCK_ROWS
+    query = impact_query or ImpactQuery()
+    if query.top_k is None and query.threshold is None:
+        query = query.model_copy(update={"top_k": settings.OUT_OF_CORE_TOP_K})
+    rules = DEFAULT_CONCENTRATION_RULES
+    rollups = [d for d in query.rollup if d != "issuer"]
+    group_bys = REPORT_GROUP_BYS + [tuple(r.dimensions) for r in rules if r.dimensions] + [(d,) for d in rollups]
+
+    # 1. Exposure (pass 1)
+    with stage("exposure"):
+        totals, metrics = _store_exposure(store, group_bys, block_rows)
+    if totals is None:
+        exposure = ExposureReport(by_asset_class={}, by_sector={}, by_rating={}, weighted_average_duration=0.0,
+                                  liquidity_profile=0.0, concentration_alerts=["Portfolio is empty"])
+    else:
+        exposure = build_exposure_report({d: g.grouped() for d, g in totals.items()}, metrics, rules)
+
+    # 2. Scenarios
+    with stage("scenarios"):
+        if scenario_set is None:
+            scenarios = select_scenarios(exposure)
+        else:
+            scenarios = get_scenario_library().resolve_set(scenario_set)
+
+    # 3. Simulation (pass 2)
+    with stage("simulation"):
+        results, n_blocks = _store_simulation(store, scenarios, query, rollups, totals, revaluation, block_rows)
+    POSITIONS_PROCESSED.inc(store.rows)
+    SCENARIOS_RUN.inc(len(scenarios))
+
+    explanation = build_explanation(exposure, scenarios, results)
+    return LargeBookAnalysis(
+        position_count=store.rows,
+        total_value=store.total_value,
+        as_of_date=store.as_of_date,
+        exposure_report=exposure,
+        selected_scenarios=scenarios,
+        simulation_results=[r.model_dump() for r in results],
+        risk_explanation=explanation,
+        block_rows=block_rows,
+        blocks=n_blocks
+    )
+
+
+def _store_simulation(store: ColumnStore, scenarios: List[StressScenario], query: ImpactQuery,
+                      rollups: List[str], totals, revaluation: str,
+                      block_rows: int) -> Tuple[List[SimulationResult], int]:
+    n = len(scenarios)
+    shocks = scenario_matrix(scenarios)
+    vol_shocks = np.array([s.vol_shock for s in scenarios])
+    carry = ScenarioMatrixResult(np.zeros(n), np.zeros((n, len(ATTRIBUTION_LABELS))))
+
+    # Scenarios x tickers P&L on disk next to the columns; only touched pages stay resident.
+    # Each run has its own scratch file, so analyses of the same store can run concurrently.
+    n_tickers = len(store.ticker_labels)
+    fd, impacts_path = tempfile.mkstemp(prefix="impacts-", suffix=".tmp", dir=store.directory)
+    os.close(fd)
+    by_ticker = np.memmap(impacts_path, dtype="<f8", mode="w+", shape=(max(n, 1), max(n_tickers, 1)))
+    by_group = {d: np.zeros((n, len(totals[(d,)].market_value))) for d in rollups} if totals else {}
+    n_blocks = 0
+    try:
+        for _, frame in store.blocks(block_rows):
+            batch = evaluate_scenario_matrix(frame, shocks, revaluation=revaluation, vol_shocks=vol_shocks,
+                                             carry=carry)
+            carry = ScenarioMatrixResult(batch.totals, batch.attribution)
+            for i in range(n):
+                _add_by_code(by_ticker[i], frame.ticker_code, batch.pnl[i])
+                for d, acc in by_group.items():
+                    _add_by_code(acc[i], totals[(d,)].codes(frame), batch.pnl[i])
+            n_blocks += 1
+
+        results = []
+        total_value = store.total_value
+        tickers = np.arange(n_tickers)
+        for i, s in enumerate(scenarios):
+            values = np.array(by_ticker[i, :n_tickers])
+            top = rank_impacts(values, tickers, query)
+            impact_rollups = None
+            if query.rollup:
+                impact_rollups = {}
+                for d in query.rollup:
+                    if d == "issuer":
+                        impact_rollups[d] = {store.ticker_labels[t]: round(v, 2) for t, v in enumerate(values.tolist())}
+                    elif totals is None:
+                        impact_rollups[d] = {}
+                    else:
+                        group = totals[(d,)]
+                        order = group.order()
+                        impact_rollups[d] = {
+                            group.labels[0][c]: round(v, 2) for c, v in zip(order.tolist(), by_group[d][i, order].tolist())
+                        }
+            total_pnl = float(carry.totals[i])
+            results.append(SimulationResult(
+                scenario_name=s.name,
+                scenario_description=s.description,
+                total_pnl=round(total_pnl, 2),
+                percentage_loss=round(total_pnl / total_value, 4) if total_value > 0 else 0.0,
+                position_impacts={store.ticker_labels[t]: round(v, 2) for t, v in zip(top.tolist(), values[top].tolist())},
+                shock_details={label: round(float(v), 2) for label, v in zip(ATTRIBUTION_LABELS, carry.attribution[i])},
+                impact_rollups=impact_rollups
+            ))
+    finally:
+        del by_ticker
+        os.remove(impacts_path)
+    return results, n_blocks
+
+
+def analyze_out_of_core(path: str, impact_query: Optional[ImpactQuery] = None, scenario_set: Optional[str] = None,
+                        revaluation: str = "linear", block_rows: Optional[int] = None,
+                        store_dir: Optional[str] = None) -> LargeBookAnalysis:
+    """
+    Analyzes a portfolio file (or an existing column store directory) out
+    of core. The file is converted into store_dir, or into a temporary
+    directory under settings.OUT_OF_CORE_DIR that is removed afterwards.
+    """
+    if os.path.isdir(path):
+        return analyze_column_store(ColumnStore(path), impact_query, scenario_set, revaluation, block_rows)
+    if store_dir is not None:
+        with stage("ingest"):
+            store = ColumnStore.convert(path, path, store_dir)
+        return analyze_column_store(store, impact_query, scenario_set, revaluation, block_rows)
+    with tempfile.TemporaryDirectory(prefix="book-", dir=settings.OUT_OF_CORE_DIR) as tmp:
+        with stage("ingest"):
+            store = ColumnStore.convert(path, path, tmp)
+        return analyze_column_store(store, impact_query, scenario_set, revaluation, block_rows)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Stress-test a portfolio larger than memory")
+    parser.add_argument("path", help="CSV, Parquet or Arrow file, or a column store directory")
+    parser.add_argument("-o", "--output", help="Write the JSON report here instead of stdout")
+    parser.add_argument("--store", help="Convert into this directory and keep it for later runs")
+    parser.add_argument("--block-rows", type=int, default=None)
+    parser.add_argument("--top-k", type=int, default=None)
+    parser.add_argument("--order", choices=["worst", "best", "largest"], default="largest")
+    parser.add_argument("--threshold", type=float, default=None)
+    parser.add_argument("--rollup", action="append", default=[], choices=["sector", "issuer", "asset_class", "rating"])
+    parser.add_argument("--revaluation", choices=["linear", "full"], default="linear")
+    parser.add_argument("--scenario-set", default=None)
+    args = parser.parse_args(argv)
+
+    try:
+        query = ImpactQuery(top_k=args.top_k, order=args.order, threshold=args.threshold, rollup=args.rollup)
+        report = analyze_out_of_core(args.path, query, args.scenario_set, args.revaluation, args.block_rows,
+                                     args.store)
+    except (ValueError, KeyError) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 2
+
+    body = report.model_dump_json(indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(body)
+    else:
+        print(body)
+    print(f"{report.position_count} positions in {report.blocks} blocks of {report.block_rows}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,125 @@
+from typing import Callable, List, Optional
+from app.models import AnalysisResponse, ExposureReport, StressScenario, ImpactQuery
+from app.core.frame import PortfolioFrame
+from app.core.ingest import parse_portfolio_frame
+from app.core.exposure import calculate_exposure
+from app.core.cache import result_cache, upload_key, portfolio_key
+from app.core.metrics import stage, POSITIONS_PROCESSED, SCENARIOS_RUN
+from app.engine.scenarios import select_scenarios
+from app.engine.library import get_scenario_library
+from app.engine.simulation import run_stress_test, SimulationResult
+
+
+def build_explanation(exposure: ExposureReport, scenarios: List[StressScenario],
+                      raw_results: List[SimulationResult]) -> str:
+    explanation = f"Analysis complete. Found {len(exposure.concentration_alerts)} concentration alerts. "
+    explanation += f"Selected {len(scenarios)} scenarios based on portfolio profile. "
+    worst_case = min(raw_results, key=lambda x: x.total_pnl) if raw_results else None
+    if worst_case:
+        explanation += f"Worst case scenario is '{worst_case.scenario_name}' with user estimated loss of {worst_case.percentage_loss:.1%}."
+    return explanation
+
+
+# Called as progress(stage, fraction_done); may raise to abort the run
+ProgressCallback = Callable[[str, float], None]
+
+
+def analyze_frame(frame: PortfolioFrame, progress: Optional[ProgressCallback] = None,
+                  revaluation: str = "linear", scenario_set: Optional[str] = None,
+                  impact_query: Optional[ImpactQuery] = None) -> AnalysisResponse:
+    """
+    Exposure -> scenario selection -> simulation -> explanation for an
+    already ingested portfolio. With a progress callback, scenarios are
+    simulated one at a time so progress (and cancellation) is per scenario.
+    revaluation="full" adds convexity and reprices options; a scenario_set
+    from the library replaces rule-based selection. An impact_query limits
+    each result's position_impacts and adds rollups.
+    """
+    report = progress or (lambda stage, fraction: None)
+
+    # 2. Exposure
+    report("exposure", 0.2)
+    with stage("exposure"):
+        exposure = calculate_exposure(frame)
+
+    # 3. Scenarios
+    report("scenarios", 0.3)
+    with stage("scenarios"):
+        if scenario_set is None:
+            scenarios = select_scenarios(exposure)
+        else:
+            scenarios = get_scenario_library().resolve_set(scenario_set)
+
+    # 4. Simulation
+    with stage("simulation"):
+        if progress is None:
+            raw_results = run_stress_test(frame, scenarios, revaluation, impact_query)
+        else:
+            raw_results = []
+            for i, s in enumerate(scenarios):
+                report("simulation", 0.3 + 0.6 * i / len(scenarios))
+                raw_results.extend(run_stress_test(frame, [s], revaluation, impact_query))
+    POSITIONS_PROCESSED.inc(len(frame))
+    SCENARIOS_RUN.inc(len(scenarios))
+
+    report("response", 0.9)
+    with stage("response"):
+        # Convert simulation results to dict for JSON response
+        results_dict = [r.model_dump() for r in raw_results]
+
+        # 5. Explanation Stub
+        explanation = build_explanation(exposure, scenarios, raw_results)
+
+        return AnalysisResponse(
+            portfolio_summary=frame.to_portfolio(),
+            exposure_report=exposure,
+            selected_scenarios=scenarios,
+            simulation_results=results_dict,
+            risk_explanation=explanation
+        )
+
+
+def _mode_key(key: str, revaluation: str, scenario_set: Optional[str] = None,
+              impact_query: Optional[ImpactQuery] = None) -> str:
+    # Linear, rule-selected keys keep their original form so existing cache entries stay valid
+    if revaluation != "linear":
+        key = f"{key}:{revaluation}"
+    if scenario_set is not None:
+        key = f"{key}:set={scenario_set}"
+    if impact_query is not None:
+        key = f"{key}:impacts={impact_query.model_dump_json()}"
+    return key
+
+
+def run_analysis(content: bytes, filename: str, revaluation: str = "linear",
+                 scenario_set: Optional[str] = None, impact_query: Optional[ImpactQuery] = None) -> AnalysisResponse:
+    """
+    Full ingest -> analysis pipeline with result caching. A byte-identical
+    re-upload is answered after hashing the upload; a reformatted file with
+    the same positions is answered after ingest.
+    """
+    with stage("cache_lookup"):
+        raw_key = _mode_key(upload_key(content), revaluation, scenario_set, impact_query)
+        # A miss here falls through to the portfolio key, which does the counting
+        cached = result_cache.get(raw_key, count_miss=False)
+    if cached is not None:
+        return cached
+
+    # 1. Ingest (columnar; the Pydantic Portfolio is only built for the response)
+    with stage("ingest"):
+        frame = parse_portfolio_frame(content, filename)
+    response = analyze_frame_cached(frame, revaluation, scenario_set, impact_query)
+    result_cache.put(raw_key, response)
+    return response
+
+
+def analyze_frame_cached(frame: PortfolioFrame, revaluation: str = "linear", scenario_set: Optional[str] = None,
+                         impact_query: Optional[ImpactQuery] = None) -> AnalysisResponse:
+    """analyze_frame, cached by normalized portfolio content."""
+    key = _mode_key(portfolio_key(frame), revaluation, scenario_set, impact_query)
+    response = result_cache.get(key)
+    if response is None:
+        response = analyze_frame(frame, revaluation=revaluation, scenario_set=scenario_set,
+                                 impact_query=impact_query)
+        result_cache.put(key, response)
+    return response
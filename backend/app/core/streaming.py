@@ -0,0 +1,63 @@
+import json
+from typing import Callable, Iterator, List, Optional
+from pydantic import TypeAdapter
+from app.models import ExposureReport, StressScenario, PortfolioPosition, ImpactQuery
+from app.core.frame import PortfolioFrame
+from app.core.pipeline import build_explanation
+from app.core.audit import make_audit_entry
+from app.engine.simulation import run_stress_test, SimulationResult
+
+POSITION_CHUNK = 1000 # Positions per "positions" line
+SCENARIO_CHUNK = 16 # Scenarios revalued per batched pass
+
+_positions_adapter = TypeAdapter(List[PortfolioPosition])
+
+
+def _line(kind: str, payload: dict) -> bytes:
+    return json.dumps({"type": kind, **payload}).encode() + b"\n"
+
+
+def stream_analysis(frame: PortfolioFrame, exposure: ExposureReport, scenarios: List[StressScenario],
+                    filename: str, include_positions: bool = True,
+                    impact_query: Optional[ImpactQuery] = None, revaluation: str = "linear",
+                    on_complete: Optional[Callable[[dict], None]] = None) -> Iterator[bytes]:
+    """
+    The analysis as NDJSON, one object per line, each tagged with "type":
+    summary, positions (in chunks, unless include_positions is off),
+    exposure, scenarios, one result per scenario, explanation. Scenarios are
+    revalued SCENARIO_CHUNK at a time in one batched pass, so only one
+    chunk's impacts are held at once; an impact_query sends only the tickers
+    it selects. on_complete receives the audit entry once the last line has
+    been produced.
+    """
+    yield _line("summary", {
+        "total_value": frame.total_value,
+        "as_of_date": frame.as_of_date,
+        "position_count": len(frame)
+    })
+    if include_positions:
+        for start in range(0, len(frame), POSITION_CHUNK):
+            chunk = frame.positions_slice(start, start + POSITION_CHUNK)
+            yield b'{"type": "positions", "positions": ' + _positions_adapter.dump_json(chunk) + b"}\n"
+
+    yield _line("exposure", exposure.model_dump())
+    yield _line("scenarios", {"selected_scenarios": [s.model_dump() for s in scenarios]})
+
+    worst: Optional[SimulationResult] = None
+    losses: List[float] = []
+    for start in range(0, len(scenarios), SCENARIO_CHUNK):
+        for raw in run_stress_test(frame, scenarios[start:start + SCENARIO_CHUNK], revaluation, impact_query):
+            if worst is None or raw.total_pnl < worst.total_pnl:
+                worst = raw
+            losses.append(raw.percentage_loss)
+            yield _line("result", raw.model_dump())
+
+    # Only the worst result is kept; the explanation needs nothing else
+    explanation = build_explanation(exposure, scenarios, [worst] if worst else [])
+    yield _line("explanation", {"risk_explanation": explanation})
+
+    if on_complete is not None:
+        on_complete(make_audit_entry(
+            filename, frame.total_value, exposure.concentration_alerts, len(scenarios),
+            min(losses, default=0.0)
+        ))
@@ -0,0 +1,232 @@
+"""
+Startup warm-up, readiness and the import-time profile.
+
+`import app.main` only loads what routing needs: pandas is imported on
+first use (app/core/lazy.py) and the scenario library is opened on first
+use. warm_up() pays those costs, plus the engine's first-call costs, ahead
+of traffic. The lifespan runs it as settings.WARMUP_MODE says. /health
+answers straight away, and /ready returns 503 until warm-up has finished.
+
+    python -m app.core.warmup                   # run the warm-up, print step timings
+    python -m app.core.warmup --profile         # import-time profile of app.main
+    python -m app.core.warmup --profile --max-ms 800   # exit 1 above the budget
+
+The profile runs `python -X importtime -c "import app.main"` in a fresh
+interpreter. It reports the slowest modules and the time to the first
+/health response.
+"""
+import argparse
+import importlib
+import logging
+import os
+import subprocess
+import sys
+import threading
+import time
+from typing import Dict, List, NamedTuple, Optional
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Imported by the warm-up rather than by app.main
+DEFERRED_MODULES = ["pandas"]
+
+# Small book that goes through ingest, exposure, selection and both revaluation modes
+SAMPLE_CSV = b"""Asset Class,Ticker,Name,Quantity,Market Price,Market Value,Sector,Duration,Rating,Liquidity Score,Option Type,Strike,Expiry,Vol,Underlying Price
+Equity,WARM,Warm-up Equity,10,100,1000,Technology,0,NR,90,,,,,
+Debt,WARMB,Warm-up Bond,10,100,1000,Government,8,AAA,100,,,,,
+Option,WARMO,Warm-up Put,1,5,5,Index,0,NR,80,put,100,0.5,0.2,100
+"""
+
+
+class Readiness:
+    """Warm-up state for /ready: cold -> warming -> ready (or failed)."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.state = "cold"
+        self.steps: Dict[str, float] = {} # step -> milliseconds
+        self.error: Optional[str] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.state == "ready" or settings.WARMUP_MODE == "off"
+
+    def snapshot(self) -> dict:
+        return {"status": "ready" if self.ready else self.state, "warmup": self.state,
+                "steps_ms": dict(self.steps), "error": self.error}
+
+
+readiness = Readiness()
+
+
+def _import_deferred():
+    for name in DEFERRED_MODULES:
+        importlib.import_module(name)
+    # pyarrow is optional; load it too when installed
+    from app.core.ingest import import_pyarrow
+    try:
+        import_pyarrow()
+    except ValueError:
+        pass
+
+
+def _open_library():
+    from app.engine.library import get_scenario_library
+    get_scenario_library()
+
+
+def _start_executor():
+    from app.core.executor import get_executor
+    get_executor()
+
+
+def _sample_run():
+    # First calls build NumPy ufunc loops, Pydantic validators and the library's scenario matrices
+    from app.core.ingest import parse_portfolio_frame
+    from app.core.exposure import calculate_exposure
+    from app.engine.scenarios import select_scenarios
+    from app.engine.simulation import run_stress_test
+    frame = parse_portfolio_frame(SAMPLE_CSV, "warmup.csv")
+    scenarios = select_scenarios(calculate_exposure(frame))
+    for revaluation in ("linear", "full"):
+        run_stress_test(frame, scenarios, revaluation)
+
+
+WARMUP_STEPS = [
+    ("imports", _import_deferred),
+    ("scenario_library", _open_library),
+    ("executor", _start_executor),
+    ("engine", _sample_run),
+]
+
+
+def warm_up() -> Dict[str, float]:
+    """
+    Runs every warm-up step once and returns their timings in milliseconds.
+    Concurrent callers wait for the first run; later calls return at once.
+    """
+    with readiness.lock:
+        if readiness.state != "ready":
+            readiness.state, readiness.error = "warming", None
+            for name, step in WARMUP_STEPS:
+                start = time.perf_counter()
+                try:
+                    step()
+                except Exception as e:
+                    readiness.state, readiness.error = "failed", f"{name}: {e}"
+                    raise
+                readiness.steps[name] = round((time.perf_counter() - start) * 1000, 1)
+            readiness.state = "ready"
+        return dict(readiness.steps)
+
+
+def _warm_up_logged():
+    try:
+        warm_up()
+    except Exception:
+        logger.exception("Warm-up failed; /ready stays unavailable")
+
+
+def start_warm_up() -> threading.Thread:
+    """Runs warm_up() on a background thread (join it before shutting the pools down)."""
+    thread = threading.Thread(target=_warm_up_logged, name="warmup", daemon=True)
+    thread.start()
+    return thread
+
+
+class ImportTiming(NamedTuple):
+    module: str
+    self_ms: float
+    cumulative_ms: float
+
+
+class ImportProfile(NamedTuple):
+    module: str
+    import_ms: float # Cumulative import time of `module`
+    first_request_ms: Optional[float] # import + first /health response, when measured
+    timings: List[ImportTiming] # Every imported module, slowest (cumulative) first
+    deferred: List[str] # DEFERRED_MODULES that the import did not load
+
+
+def parse_importtime(output: str) -> List[ImportTiming]:
+    """Parses `python -X importtime` stderr ("import time: self | cumulative | name" lines, in us)."""
+    timings = []
+    for line in output.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue # Header line
+        timings.append(ImportTiming(parts[2].strip(), int(parts[0]) / 1000, int(parts[1]) / 1000))
+    return sorted(timings, key=lambda t: t.cumulative_ms, reverse=True)
+
+
+_FIRST_REQUEST_SCRIPT = """
+import sys, time
+from fastapi.testclient import TestClient
+start = time.perf_counter()
+import {module} as target
+TestClient(target.app).get("/health")
+print((time.perf_counter() - start) * 1000)
+print(",".join(m for m in {deferred!r} if m not in sys.modules))
+"""
+
+
+def import_profile(module: str = "app.main", first_request: bool = True) -> ImportProfile:
+    """Measures importing `module` (and, for app.main, the first /health) in fresh interpreters."""
+    cwd = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    run = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                         cwd=cwd, capture_output=True, text=True, check=True)
+    timings = parse_importtime(run.stderr)
+    import_ms = next((t.cumulative_ms for t in timings if t.module == module), 0.0)
+
+    first_request_ms, deferred = None, []
+    if first_request:
+        script = _FIRST_REQUEST_SCRIPT.format(module=module, deferred=DEFERRED_MODULES)
+        out = subprocess.run([sys.executable, "-c", script], cwd=cwd, capture_output=True, text=True,
+                             check=True).stdout.splitlines()
+        first_request_ms = round(float(out[0]), 1)
+        deferred = [m for m in out[1].split(",") if m] if len(out) > 1 else []
+    return ImportProfile(module, round(import_ms, 1), first_request_ms, timings, deferred)
+
+
+def format_profile(profile: ImportProfile, top: int = 20) -> str:
+    lines = [f"import {profile.module}: {profile.import_ms:.1f} ms"]
+    if profile.first_request_ms is not None:
+        lines.append(f"import + first /health: {profile.first_request_ms:.1f} ms")
+        lines.append(f"deferred until warm-up: {', '.join(profile.deferred) or 'none'}")
+    lines.append(f"{'cumulative ms':>14} {'self ms':>9}  module")
+    for t in profile.timings[:top]:
+        lines.append(f"{t.cumulative_ms:>14.1f} {t.self_ms:>9.1f}  {t.module}")
+    return "\n".join(lines)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Warm the service up, or profile its import time")
+    parser.add_argument("--profile", action="store_true", help="Report import time instead of warming up")
+    parser.add_argument("--module", default="app.main")
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--max-ms", type=float, default=settings.STARTUP_BUDGET_MS,
+                        help="Fail if import + first request takes longer")
+    args = parser.parse_args(argv)
+
+    if not args.profile:
+        for name, ms in warm_up().items():
+            print(f"{name:>18}: {ms:.1f} ms")
+        return 0
+
+    profile = import_profile(args.module, first_request=args.module == "app.main")
+    print(format_profile(profile, args.top))
+    elapsed = profile.first_request_ms if profile.first_request_ms is not None else profile.import_ms
+    if args.max_ms is not None and elapsed > args.max_ms:
+        print(f"error: {elapsed:.1f} ms exceeds the {args.max_ms:.0f} ms budget", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,276 @@
+"""
+Historical scenario calibration: stress scenarios from the worst N-day
+moves in local factor history instead of hand-typed shocks.
+
+Factor history is a CSV, Parquet or Arrow file with one row per date:
+- date
+- equity: equity index level
+- rate: government yield, in percent (4.25 = 4.25%)
+- spread: credit spread, in bp
+- vol: implied volatility index, in vol points (VIX style, 20 = 20%)
+Any factor column may be missing; only date and the anchor factor are
+required.
+"""
+import hashlib
+import io
+import json
+import os
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+from app.models import LibraryScenario
+from app.core.config import settings
+from app.core.ingest import normalize_column_name, detect_upload_format, import_pyarrow
+from app.core.lazy import lazy_module
+
+pd = lazy_module("pandas")
+
+FACTORS = ["equity", "rate", "spread", "vol"]
+
+COLUMN_ALIASES = {
+    "date": ["date", "as_of_date", "timestamp"],
+    "equity": ["equity", "equity_index", "index_level", "index"],
+    "rate": ["rate", "yield", "rate_pct", "yield_pct"],
+    "spread": ["spread", "credit_spread", "spread_bp", "oas"],
+    "vol": ["vol", "volatility", "vix", "implied_vol"],
+}
+
+# Direction of a stressful move when the factor is the anchor (-1: a fall hurts)
+SEVERITY_DIRECTION = {"equity": -1.0, "rate": 1.0, "spread": 1.0, "vol": 1.0}
+
+# Bump when the move definitions change so cached moves are recomputed
+CALIBRATION_VERSION = "1"
+
+
+class FactorHistory:
+    """Daily factor levels sorted by date; missing observations forward-filled."""
+
+    def __init__(self, dates: np.ndarray, factors: Dict[str, np.ndarray]):
+        self.dates = dates
+        self.factors = factors
+
+    def __len__(self) -> int:
+        return len(self.dates)
+
+    def data_hash(self, rows: Optional[int] = None) -> str:
+        """Hash of the first `rows` rows (all by default)."""
+        rows = len(self) if rows is None else rows
+        h = hashlib.sha256(self.dates[:rows].tobytes())
+        for name in sorted(self.factors):
+            h.update(name.encode())
+            h.update(self.factors[name][:rows].tobytes())
+        return h.hexdigest()
+
+
+def load_factor_history(content: bytes, filename: str) -> FactorHistory:
+    fmt = detect_upload_format(content, filename)
+    if fmt == "csv":
+        try:
+            df = pd.read_csv(io.BytesIO(content))
+        except Exception as e:
+            raise ValueError(f"Failed to read CSV: {str(e)}")
+    else:
+        pa = import_pyarrow()
+        try:
+            if fmt == "parquet":
+                table = pa.parquet.read_table(pa.BufferReader(content))
+            else:
+                table = pa.ipc.open_file(pa.BufferReader(content)).read_all()
+        except Exception as e:
+            raise ValueError(f"Failed to read {fmt.capitalize()}: {str(e)}")
+        df = table.to_pandas()
+
+    df.columns = [normalize_column_name(str(c)) for c in df.columns]
+    columns = {}
+    for key, aliases in COLUMN_ALIASES.items():
+        found = next((a for a in aliases if a in df.columns), None)
+        if found is not None:
+            columns[key] = found
+    if "date" not in columns:
+        raise ValueError("Factor history needs a date column")
+    factors = [f for f in FACTORS if f in columns]
+    if not factors:
+        raise ValueError(f"Factor history needs at least one of: {', '.join(FACTORS)}")
+
+    dates = pd.to_datetime(df[columns["date"]], errors="coerce")
+    if dates.isna().any():
+        raise ValueError(f"Unparseable dates in rows: {(np.flatnonzero(dates.isna()) + 1)[:10].tolist()}")
+    order = np.argsort(dates.values, kind="stable")
+    dates = dates.values[order].astype("datetime64[D]")
+    if len(dates) > 1 and np.any(dates[1:] == dates[:-1]):
+        raise ValueError("Factor history has duplicate dates")
+
+    values = {}
+    for f in factors:
+        # Holidays / missing prints carry the last observation forward
+        series = pd.to_numeric(df[columns[f]], errors="coerce").iloc[order].ffill()
+        values[f] = series.to_numpy(dtype=np.float64)
+    return FactorHistory(dates, values)
+
+
+def _moves(factor: str, start: np.ndarray, end: np.ndarray) -> np.ndarray:
+    # N-day moves in StressScenario units
+    if factor == "equity":
+        return end / start - 1.0
+    if factor == "rate":
+        return (end - start) * 100.0 # percent -> bp
+    if factor == "vol":
+        return (end - start) / 100.0 # vol points -> fraction
+    return end - start
+
+
+class CalibrationCache:
+    """
+    N-day factor moves on disk, one .npz per (factor set, window, data hash).
+    A history that extends a cached one (same rows, more dates appended)
+    only needs moves for the new dates. A small manifest per (factor set,
+    window) names the latest stored history, the only prefix candidate, so
+    a run hashes at most one prefix and an extended history replaces the
+    file it extends.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _prefix(self, factors: List[str], window: int) -> str:
+        key = hashlib.sha256(f"{CALIBRATION_VERSION}|{','.join(sorted(factors))}|{window}".encode()).hexdigest()[:16]
+        return os.path.join(self.directory, f"{key}-")
+
+    def _manifest(self, factors: List[str], window: int) -> Optional[dict]:
+        try:
+            with open(self._prefix(factors, window) + "latest.json") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def load(self, factors: List[str], window: int, data_hash: str) -> Optional[Dict[str, np.ndarray]]:
+        path = self._prefix(factors, window) + data_hash + ".npz"
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as data:
+            return {f: data[f] for f in factors}
+
+    def find_prefix(self, history: FactorHistory,
+                    window: int) -> Tuple[int, Optional[Dict[str, np.ndarray]], Optional[str]]:
+        """The latest cached history, if it is a prefix of this one: (rows, moves, its data hash)."""
+        factors = list(history.factors)
+        latest = self._manifest(factors, window)
+        if latest is None or not 0 < latest["rows"] <= len(history):
+            return 0, None, None
+        if history.data_hash(latest["rows"]) != latest["data_hash"]:
+            return 0, None, None
+        moves = self.load(factors, window, latest["data_hash"])
+        if moves is None:
+            return 0, None, None
+        return latest["rows"], moves, latest["data_hash"]
+
+    def store(self, history: FactorHistory, window: int, data_hash: str, moves: Dict[str, np.ndarray],
+              superseded: Optional[str] = None):
+        """Writes the moves and makes them the latest; `superseded` (the prefix they extend) is removed."""
+        prefix = self._prefix(list(history.factors), window)
+        path = prefix + data_hash + ".npz"
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            np.savez(f, rows=len(history), data_hash=data_hash, **moves)
+        os.replace(tmp, path)
+        tmp = prefix + "latest.json.tmp"
+        with open(tmp, "w") as f:
+            json.dump({"rows": len(history), "data_hash": data_hash}, f)
+        os.replace(tmp, prefix + "latest.json")
+        if superseded is not None and superseded != data_hash:
+            try:
+                os.remove(prefix + superseded + ".npz")
+            except FileNotFoundError:
+                pass
+
+
+def rolling_moves(history: FactorHistory, window: int,
+                  cache: Optional[CalibrationCache] = None) -> Tuple[Dict[str, np.ndarray], int]:
+    """
+    N-day move of every factor for each window start (array index i covers
+    dates[i] -> dates[i + window]), vectorized over the whole history.
+    Returns (moves, rows processed); with a cache, a repeat run processes no
+    rows and an appended history only its new dates.
+    """
+    if window < 1:
+        raise ValueError("Window must be at least 1 day")
+    n = len(history)
+    data_hash = history.data_hash()
+    if cache is not None:
+        cached = cache.load(list(history.factors), window, data_hash)
+        if cached is not None:
+            return cached, 0
+        done, previous, previous_hash = cache.find_prefix(history, window)
+    else:
+        done, previous, previous_hash = 0, None, None
+
+    # Window ends already covered by the cached prefix are skipped
+    first_end = max(done, window)
+    moves = {}
+    for f, levels in history.factors.items():
+        new = _moves(f, levels[first_end - window:n - window], levels[first_end:n])
+        moves[f] = np.concatenate([previous[f], new]) if previous is not None else new
+
+    if cache is not None:
+        cache.store(history, window, data_hash, moves, previous_hash)
+    return moves, n - done
+
+
+def worst_windows(moves: np.ndarray, window: int, top_n: int, direction: float) -> List[int]:
+    """
+    Start indices of the top_n most severe, non-overlapping windows: one
+    sort, then a greedy pass that blocks the neighbourhood of each pick.
+    """
+    severity = direction * moves
+    valid = np.flatnonzero(~np.isnan(severity))
+    order = valid[np.argsort(-severity[valid], kind="stable")]
+    blocked = np.zeros(len(moves), dtype=bool)
+    picks = []
+    for i in order:
+        if blocked[i]:
+            continue
+        picks.append(int(i))
+        if len(picks) == top_n:
+            break
+        blocked[max(0, i - window + 1):i + window] = True
+    return picks
+
+
+def calibrate_scenarios(history: FactorHistory, windows: List[int], anchor: str = "equity", top_n: int = 3,
+                        liquidity_shock: float = 0.0, cache: Optional[CalibrationCache] = None) -> List[LibraryScenario]:
+    """
+    For each window length, the top_n worst non-overlapping moves of the
+    anchor factor become scenarios; the other factors take their moves over
+    the same dates, so each scenario is a co-move that actually happened.
+    Liquidity is not observable in market levels and is set by the caller.
+    """
+    if anchor not in history.factors:
+        raise ValueError(f"Anchor factor '{anchor}' is not in the factor history")
+
+    scenarios = []
+    for window in windows:
+        if window >= len(history):
+            raise ValueError(f"Window of {window} days needs more than {len(history)} dates of history")
+        moves, _ = rolling_moves(history, window, cache)
+        for rank, i in enumerate(worst_windows(moves[anchor], window, top_n, SEVERITY_DIRECTION[anchor]), 1):
+            start, end = str(history.dates[i]), str(history.dates[i + window])
+            shock = {f: float(moves[f][i]) if f in moves and not np.isnan(moves[f][i]) else 0.0 for f in FACTORS}
+            scenarios.append(LibraryScenario(
+                name=f"Historical {window}d {anchor} #{rank} ({start} to {end})",
+                description=f"Worst {window}-day {anchor} move #{rank} in the factor history, {start} to {end}.",
+                equity_shock=round(shock["equity"], 4),
+                rate_shock=round(shock["rate"], 1),
+                credit_spread_shock=round(shock["spread"], 1),
+                liquidity_shock=liquidity_shock,
+                vol_shock=round(shock["vol"], 4),
+                tags=["historical", "calibrated"],
+                metadata={
+                    "window_days": str(window), "anchor": anchor, "start": start, "end": end,
+                    "data_hash": history.data_hash()[:16]
+                }
+            ))
+    return scenarios
+
+
+def get_calibration_cache() -> Optional[CalibrationCache]:
+    return CalibrationCache(settings.CALIBRATION_CACHE_DIR) if settings.CALIBRATION_CACHE_DIR else None
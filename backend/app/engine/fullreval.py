@@ -0,0 +1,194 @@
+import numpy as np
+from app.core.config import settings
+from app.core.frame import PortfolioFrame
+from app.engine.vectorized import leg_masks, DEBT_CODE, DERIVATIVE_CODE
+
+SQRT2 = np.sqrt(2.0)
+
+
+def _erfc(z: np.ndarray) -> np.ndarray:
+    # Chebyshev fit (Numerical Recipes erfcc), fractional error < 1.2e-7
+    a = np.abs(z)
+    t = 1.0 / (1.0 + 0.5 * a)
+    poly = -a * a - 1.26551223 + t * (1.00002368 + t * (0.37409196 + t * (0.09678418 + t * (
+        -0.18628806 + t * (0.27886807 + t * (-1.13520398 + t * (1.48851587 + t * (
+            -0.82215223 + t * 0.17087277))))))))
+    ans = t * np.exp(poly)
+    return np.where(z >= 0, ans, 2.0 - ans)
+
+
+def norm_cdf(x: np.ndarray) -> np.ndarray:
+    return 0.5 * _erfc(-x / SQRT2)
+
+
+def black_scholes(spot, strike, expiry, rate, vol, option_type) -> np.ndarray:
+    """
+    Vectorized Black-Scholes price (no dividends). option_type is +1 for
+    calls and -1 for puts; all inputs broadcast. Options at or past expiry
+    are worth their intrinsic value.
+    """
+    live = expiry > 0
+    t = np.where(live, expiry, 1.0)
+    sqrt_t = np.sqrt(t)
+    vol_sqrt_t = vol * sqrt_t
+    d1 = (np.log(spot / strike) + (rate + 0.5 * vol * vol) * t) / vol_sqrt_t
+    d2 = d1 - vol_sqrt_t
+    discount = np.exp(-rate * t)
+    price = option_type * (spot * norm_cdf(option_type * d1) - strike * discount * norm_cdf(option_type * d2))
+    return np.where(live, price, np.maximum(option_type * (spot - strike), 0.0))
+
+
+def black_scholes_greeks(spot, strike, expiry, rate, vol, option_type):
+    """
+    Closed-form (delta, rho) of black_scholes: the price change per unit of
+    spot and per unit of rate. Inputs broadcast as in black_scholes.
+    """
+    live = expiry > 0
+    t = np.where(live, expiry, 1.0)
+    sqrt_t = np.sqrt(t)
+    vol_sqrt_t = vol * sqrt_t
+    d1 = (np.log(spot / strike) + (rate + 0.5 * vol * vol) * t) / vol_sqrt_t
+    d2 = d1 - vol_sqrt_t
+    delta = option_type * norm_cdf(option_type * d1)
+    rho = option_type * strike * t * np.exp(-rate * t) * norm_cdf(option_type * d2)
+    # Intrinsic value: a step in spot, flat in rates
+    expired_delta = np.where(option_type * (spot - strike) > 0, option_type, 0.0)
+    return np.where(live, delta, expired_delta), np.where(live, rho, 0.0)
+
+
+class RevaluationTerms:
+    """
+    Per-position inputs for full revaluation, built once per frame.
+    Options are derivatives with a complete set of terms (option type,
+    strike, expiry, vol, underlying price); any other position keeps the
+    linear treatment for its equity leg, scaled by beta.
+    """
+
+    def __init__(self, frame: PortfolioFrame):
+        beta = frame.term("beta")
+        self.beta = np.where(np.isnan(beta), 1.0, beta)
+
+        # Convexity: given, else the zero-coupon estimate for debt, else none
+        duration = frame.duration
+        y = settings.DEFAULT_BOND_YIELD
+        estimate = np.where(frame.asset_class == DEBT_CODE, duration * (duration + 1) / (1 + y) ** 2, 0.0)
+        convexity = frame.term("convexity")
+        self.convexity = np.where(np.isnan(convexity), estimate, convexity)
+
+        option_type = frame.term("option_type")
+        strike, expiry = frame.term("strike"), frame.term("expiry")
+        vol, spot = frame.term("vol"), frame.term("underlying_price")
+        complete = ~(np.isnan(option_type) | np.isnan(strike) | np.isnan(expiry) | np.isnan(vol) | np.isnan(spot))
+        self.option_rows = np.flatnonzero((frame.asset_class == DERIVATIVE_CODE) & complete)
+        rows = self.option_rows
+        self.option_type, self.strike, self.expiry = option_type[rows], strike[rows], expiry[rows]
+        self.vol, self.spot = vol[rows], spot[rows]
+        self.option_beta = self.beta[rows]
+        self.base_price = black_scholes(
+            self.spot, self.strike, self.expiry, settings.RISK_FREE_RATE, self.vol, self.option_type
+        )
+
+
+def revaluation_terms(frame: PortfolioFrame) -> RevaluationTerms:
+    if "revaluation_terms" not in frame.derived:
+        frame.derived["revaluation_terms"] = RevaluationTerms(frame)
+    return frame.derived["revaluation_terms"]
+
+
+def compute_full_reval_legs(frame: PortfolioFrame, equity_shock, rate_shock, credit_spread_shock,
+                            liquidity_shock, vol_shock=0.0):
+    """
+    Full-revaluation counterpart of compute_leg_matrix (same shapes: scalar
+    shocks or (N, 1) columns). Differences from the linear model:
+    - equity leg is scaled by beta;
+    - rate and spread legs add convexity, -D*dy + C/2*dy^2, with the
+      spread leg taking the cross term so the two add up to the combined
+      yield move;
+    - options are repriced with Black-Scholes at the shocked spot, rate
+      and vol; their whole change in value goes to the equity leg.
+    The liquidity leg is unchanged.
+    """
+    val = frame.market_value
+    masks = leg_masks(frame)
+    terms = revaluation_terms(frame)
+    is_option = np.zeros(len(frame), dtype=bool)
+    is_option[terms.option_rows] = True
+
+    # 1. Equity (beta-scaled; options repriced below)
+    eq = np.where(masks.equity & ~is_option, val * terms.beta * equity_shock, 0.0)
+
+    # 2./3. Rates and spreads with convexity
+    dy = rate_shock / 10000.0
+    ds = credit_spread_shock / 10000.0
+    duration, convexity = frame.duration, terms.convexity
+    rate = np.where(masks.rate & ~is_option, val * (-duration * dy + 0.5 * convexity * dy * dy), 0.0)
+    cross = (dy + ds) * (dy + ds) - dy * dy
+    spread = np.where(masks.spread, val * (-duration * ds + 0.5 * convexity * cross), 0.0)
+
+    # 4. Liquidity (as in the linear model)
+    liq = np.where(
+        masks.liquidity,
+        val * -1 * (liquidity_shock * (1 - frame.liquidity_score / 100)),
+        0.0
+    )
+
+    rows = terms.option_rows
+    if len(rows):
+        eq_shock = np.asarray(equity_shock, dtype=np.float64)
+        shocked_spot = np.maximum(terms.spot * (1 + terms.option_beta * eq_shock), 1e-12)
+        shocked_vol = np.maximum(terms.vol + vol_shock, settings.MIN_VOL)
+        shocked_rate = settings.RISK_FREE_RATE + dy
+        price = black_scholes(shocked_spot, terms.strike, terms.expiry, shocked_rate, shocked_vol, terms.option_type)
+        # Scale model prices to the booked market value; worthless options fall back to quantity
+        base = terms.base_price
+        units = np.where(base > 1e-12, val[rows] / np.where(base > 1e-12, base, 1.0), frame.quantity[rows])
+        option_pnl = units * (price - base)
+        eq = np.array(np.broadcast_to(eq, option_pnl.shape[:-1] + (len(frame),)))
+        eq[..., rows] = option_pnl
+
+    return eq, rate, spread, liq
+
+
+def full_reval_gradient(frame: PortfolioFrame, equity_shock: float, rate_shock: float,
+                        credit_spread_shock: float, liquidity_shock: float, vol_shock: float = 0.0) -> np.ndarray:
+    """
+    Analytic gradient of the full-revaluation portfolio P&L with respect to
+    (equity, rate, spread, liquidity) shocks at one scenario, in the same
+    units as the shocks (rates and spreads per bp). Leg by leg it is the
+    derivative of compute_full_reval_legs: beta for equity, -D + C*dy for
+    rates and spreads (plus the spread leg's cross term in the rate), and
+    Black-Scholes delta and rho for options. The liquidity leg is linear.
+    """
+    val = frame.market_value
+    masks = leg_masks(frame)
+    terms = revaluation_terms(frame)
+    is_option = np.zeros(len(frame), dtype=bool)
+    is_option[terms.option_rows] = True
+
+    dy = rate_shock / 10000.0
+    ds = credit_spread_shock / 10000.0
+    duration, convexity = frame.duration, terms.convexity
+    rate_mask, spread_mask = masks.rate & ~is_option, masks.spread
+
+    d_equity = float(np.sum(np.where(masks.equity & ~is_option, val * terms.beta, 0.0)))
+    d_rate = float(np.sum(np.where(rate_mask, val * (-duration + convexity * dy), 0.0))
+                   + np.sum(np.where(spread_mask, val * convexity * ds, 0.0))) / 10000.0
+    d_spread = float(np.sum(np.where(spread_mask, val * (-duration + convexity * (dy + ds)), 0.0))) / 10000.0
+    d_liquidity = float(np.sum(np.where(masks.liquidity, -val * (1 - frame.liquidity_score / 100), 0.0)))
+
+    rows = terms.option_rows
+    if len(rows):
+        raw_spot = terms.spot * (1 + terms.option_beta * equity_shock)
+        shocked_spot = np.maximum(raw_spot, 1e-12)
+        shocked_vol = np.maximum(terms.vol + vol_shock, settings.MIN_VOL)
+        shocked_rate = settings.RISK_FREE_RATE + dy
+        delta, rho = black_scholes_greeks(shocked_spot, terms.strike, terms.expiry, shocked_rate, shocked_vol,
+                                          terms.option_type)
+        base = terms.base_price
+        units = np.where(base > 1e-12, val[rows] / np.where(base > 1e-12, base, 1.0), frame.quantity[rows])
+        # The spot floor has no slope
+        d_spot = np.where(raw_spot > 1e-12, terms.spot * terms.option_beta, 0.0)
+        d_equity += float(np.sum(units * delta * d_spot))
+        d_rate += float(np.sum(units * rho)) / 10000.0
+
+    return np.array([d_equity, d_rate, d_spread, d_liquidity])
@@ -0,0 +1,87 @@
+import numpy as np
+from typing import Dict, Optional, Tuple
+from app.models import ImpactQuery
+from app.core.frame import PortfolioFrame
+from app.core.aggregation import DIMENSIONS
+
+
+def group_index(frame: PortfolioFrame, dimension: str) -> Tuple[np.ndarray, np.ndarray, list]:
+    """
+    (codes, order, labels) for a group-by, cached with the frame: the code
+    of every position and the codes present, in first-appearance order.
+    """
+    key = f"group_index:{dimension}"
+    if key not in frame.derived:
+        codes, labels = DIMENSIONS[dimension](frame)
+        codes = np.asarray(codes, dtype=np.int64)
+        _, first = np.unique(codes, return_index=True)
+        frame.derived[key] = (codes, codes[np.sort(first)], labels)
+    return frame.derived[key]
+
+
+def rank_impacts(values: np.ndarray, idx: np.ndarray, query: ImpactQuery) -> np.ndarray:
+    """
+    The entries of idx selected by the query, ranked by query.order ("worst":
+    most negative first, "best": most positive, "largest": largest absolute),
+    keeping those at least query.threshold away from zero in that direction,
+    at most query.top_k. values holds the P&L of every index.
+    """
+    if query.order == "worst":
+        score = values[idx]
+    elif query.order == "best":
+        score = -values[idx]
+    else:
+        score = -np.abs(values[idx])
+    if query.threshold is not None:
+        keep = score <= -query.threshold
+        idx, score = idx[keep], score[keep]
+
+    k = len(idx) if query.top_k is None else min(query.top_k, len(idx))
+    if k < len(idx):
+        part = np.argpartition(score, k - 1)[:k] if k else np.empty(0, dtype=np.int64)
+        idx, score = idx[part], score[part]
+    return idx[np.argsort(score, kind="stable")]
+
+
+class PositionImpacts:
+    """
+    One scenario's P&L per ticker, kept as arrays. Lines with the same
+    ticker are added up (in position order, like the reference loop).
+    Top-k and threshold queries partially sort the array, so only the
+    tickers returned are turned into Python objects.
+    """
+
+    def __init__(self, frame: PortfolioFrame, pnl: np.ndarray):
+        self.frame = frame
+        self.pnl = pnl
+        codes, self.order, self.labels = group_index(frame, "ticker")
+        self.values = np.bincount(codes, weights=pnl, minlength=len(self.labels))
+
+    def _as_dict(self, idx: np.ndarray) -> Dict[str, float]:
+        # Python's round() is used (not np.round) to keep cent rounding identical
+        labels = self.labels
+        return {labels[i]: round(v, 2) for i, v in zip(idx.tolist(), self.values[idx].tolist())}
+
+    def to_dict(self) -> Dict[str, float]:
+        """Every ticker, in first-appearance order."""
+        return self._as_dict(self.order)
+
+    def query(self, query: ImpactQuery) -> Dict[str, float]:
+        """Tickers selected and ranked by the query (see rank_impacts)."""
+        return self._as_dict(rank_impacts(self.values, self.order, query))
+
+    def rollup(self, dimension: str) -> Dict[str, float]:
+        """P&L summed by a group-by (sector, issuer, ...), in first-appearance order."""
+        if dimension in ("ticker", "issuer"):
+            return self.to_dict()
+        codes, order, labels = group_index(self.frame, dimension)
+        sums = np.bincount(codes, weights=self.pnl, minlength=len(labels))
+        return {labels[i]: round(v, 2) for i, v in zip(order.tolist(), sums[order].tolist())}
+
+    def report(self, query: Optional[ImpactQuery]) -> Tuple[Dict[str, float], Optional[Dict[str, Dict[str, float]]]]:
+        """(position_impacts, rollups) as asked for by the query; the full dict without one."""
+        if query is None:
+            return self.to_dict(), None
+        impacts = self.to_dict() if query.top_k is None and query.threshold is None else self.query(query)
+        rollups = {d: self.rollup(d) for d in query.rollup} if query.rollup else None
+        return impacts, rollups
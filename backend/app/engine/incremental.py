@@ -0,0 +1,332 @@
+import threading
+import uuid
+import numpy as np
+from collections import Counter, OrderedDict
+from typing import Dict, List, Tuple
+from app.models import (
+    Portfolio, PortfolioPosition, PortfolioDelta, DeltaAnalysisResponse, ExposureReport, AssetClass, Rating,
+    PortfolioSensitivities, WhatIfRequest, WhatIfResult, PositionUpdate
+)
+from app.core.config import settings
+from app.core.frame import PortfolioFrame
+from app.core.aggregation import aggregate_exposure, evaluate_rules, GroupedExposure, DEFAULT_CONCENTRATION_RULES
+from app.core.pipeline import build_explanation
+from app.engine.scenarios import select_scenarios
+from app.engine.library import get_scenario_library
+from app.engine.matrix import evaluate_scenario_matrix, scenario_matrix, SCENARIO_FACTORS, ATTRIBUTION_LABELS
+from app.engine.sensitivity import position_sensitivities, SENSITIVITY_LABELS
+from app.engine.simulation import SimulationResult
+
+# Small dimensions kept as ordered label -> [market value, position count]
+GROUP_DIMENSIONS = ["asset_class", "sector", "rating"]
+
+
+def _group_label(pos: PortfolioPosition, dimension: str) -> str:
+    if dimension == "asset_class":
+        return AssetClass(pos.asset_class).value
+    if dimension == "rating":
+        return Rating(pos.rating).value if pos.rating is not None else Rating.NR.value
+    return pos.sector
+
+
+class IncrementalAnalysis:
+    """
+    Running state of an analyzed portfolio. Exposure aggregates are kept as
+    unnormalized market-value sums and P&L as per-scenario totals, legs and
+    per-ticker impacts for every candidate scenario in the library, plus
+    per-ticker factor sensitivities for ad-hoc what-if shocks. The stress
+    model is linear in position value, so a delta only needs the changed
+    positions revalued: O(changed positions x scenarios).
+    """
+
+    def __init__(self, portfolio_id: str, frame: PortfolioFrame):
+        self.portfolio_id = portfolio_id
+        self.lock = threading.Lock()
+        self.as_of_date = frame.as_of_date
+        self.candidates = get_scenario_library().scenarios()
+        self.shocks = scenario_matrix(self.candidates)
+
+        # Positions by ticker (a ticker may hold several lines)
+        self.positions: Dict[str, List[PortfolioPosition]] = {}
+        for pos in frame.to_portfolio().positions:
+            self.positions.setdefault(pos.ticker, []).append(pos)
+        self.position_count = len(frame)
+        self.total_value = frame.total_value
+        self.sum_mv_duration = float(np.dot(frame.market_value, frame.duration))
+        self.sum_mv_liquidity = float(np.dot(frame.market_value, frame.liquidity_score))
+
+        groups = aggregate_exposure(frame, [(d,) for d in GROUP_DIMENSIONS] + [("issuer",)])
+        self.groups: Dict[str, "OrderedDict[str, List[float]]"] = {}
+        for d in GROUP_DIMENSIONS:
+            g = groups[(d,)]
+            self.groups[d] = OrderedDict(
+                (k[0], [mv, c]) for k, mv, c in zip(g.keys, g.market_value.tolist(), g.count.tolist())
+            )
+
+        # Issuer-level arrays are indexed by ticker index (grown on demand)
+        issuer = groups[("issuer",)]
+        self.ticker_index = {k[0]: i for i, k in enumerate(issuer.keys)}
+        self.ticker_keys: List[Tuple[str]] = list(issuer.keys)
+        self.issuer_mv = issuer.market_value.copy()
+        self.issuer_count = issuer.count.astype(np.int64)
+
+        batch = evaluate_scenario_matrix(frame, self.shocks)
+        self.totals = batch.totals.copy()
+        self.attribution = batch.attribution.copy()
+        # Scenarios x tickers impacts; duplicate tickers accumulate
+        remap = np.array([self.ticker_index[t] for t in frame.ticker_labels], dtype=np.int64)
+        rows = remap[frame.ticker_code] if len(frame) else np.empty(0, dtype=np.int64)
+        self.impacts = np.zeros((len(self.candidates), len(self.ticker_keys)))
+        for s in range(len(self.candidates)):
+            self.impacts[s] = np.bincount(rows, weights=batch.pnl[s], minlength=len(self.ticker_keys))
+
+        # Tickers x factors sensitivities and their portfolio totals
+        sens = position_sensitivities(frame)
+        self.sensitivities = np.zeros((len(self.ticker_keys), len(SENSITIVITY_LABELS)))
+        for j in range(len(SENSITIVITY_LABELS)):
+            self.sensitivities[:, j] = np.bincount(rows, weights=sens[:, j], minlength=len(self.ticker_keys))
+        self.sensitivity_totals = self.sensitivities.sum(axis=0)
+
+        self.selected_names = [s.name for s in select_scenarios(self.exposure_report())]
+
+    def _ticker_slot(self, ticker: str) -> int:
+        idx = self.ticker_index.get(ticker)
+        if idx is None:
+            idx = len(self.ticker_keys)
+            self.ticker_index[ticker] = idx
+            self.ticker_keys.append((ticker,))
+            if idx >= len(self.issuer_mv):
+                grow = max(16, len(self.issuer_mv))
+                self.issuer_mv = np.concatenate([self.issuer_mv, np.zeros(grow)])
+                self.issuer_count = np.concatenate([self.issuer_count, np.zeros(grow, dtype=np.int64)])
+                self.impacts = np.concatenate([self.impacts, np.zeros((len(self.candidates), grow))], axis=1)
+                self.sensitivities = np.concatenate([self.sensitivities, np.zeros((grow, len(SENSITIVITY_LABELS)))])
+        return idx
+
+    def _apply_positions(self, positions: List[PortfolioPosition], sign: int):
+        if not positions:
+            return
+        mini = PortfolioFrame.from_portfolio(Portfolio(
+            positions=positions,
+            total_value=sum(p.market_value for p in positions),
+            as_of_date=self.as_of_date
+        ))
+        batch = evaluate_scenario_matrix(mini, self.shocks)
+        self.totals += sign * batch.totals
+        self.attribution += sign * batch.attribution
+        sens = position_sensitivities(mini)
+        self.sensitivity_totals += sign * sens.sum(axis=0)
+
+        for j, pos in enumerate(positions):
+            val = pos.market_value
+            idx = self._ticker_slot(pos.ticker)
+            self.impacts[:, idx] += sign * batch.pnl[:, j]
+            self.sensitivities[idx] += sign * sens[j]
+            self.issuer_mv[idx] += sign * val
+            self.issuer_count[idx] += sign
+            for d in GROUP_DIMENSIONS:
+                entry = self.groups[d].setdefault(_group_label(pos, d), [0.0, 0])
+                entry[0] += sign * val
+                entry[1] += sign
+            self.sum_mv_duration += sign * val * (pos.duration or 0.0)
+            self.sum_mv_liquidity += sign * val * pos.liquidity_score
+            self.total_value += sign * val
+            self.position_count += sign
+
+    def _updated_rows(self, update: PositionUpdate) -> List[PortfolioPosition]:
+        """
+        The ticker's lines after an update. A new quantity is the ticker's
+        total holding, split across its lines pro rata; a new price applies
+        to every line. Booked market values are rescaled by the quantity and
+        price ratios rather than recomputed, so books whose market value is
+        not quantity x price (e.g. bonds quoted per 100) stay consistent.
+        """
+        rows = self.positions[update.ticker]
+        scale_q = 1.0
+        if update.quantity is not None:
+            held = sum(pos.quantity for pos in rows)
+            if held <= 0:
+                raise ValueError(f"Cannot rescale {update.ticker}: it holds no quantity")
+            scale_q = update.quantity / held
+        updated = []
+        for pos in rows:
+            scale = scale_q
+            price = pos.market_price
+            if update.market_price is not None:
+                if pos.market_price <= 0:
+                    raise ValueError(f"Cannot reprice {update.ticker}: its current price is zero")
+                scale *= update.market_price / pos.market_price
+                price = update.market_price
+            updated.append(pos.model_copy(update={
+                "quantity": pos.quantity * scale_q, "market_price": price, "market_value": pos.market_value * scale
+            }))
+        return updated
+
+    def apply(self, delta: PortfolioDelta) -> DeltaAnalysisResponse:
+        with self.lock:
+            for ticker in delta.remove + [u.ticker for u in delta.update]:
+                if ticker not in self.positions:
+                    raise ValueError(f"Unknown ticker in delta: {ticker}")
+            repeated = [t for t, n in Counter(delta.remove).items() if n > 1]
+            if repeated:
+                raise ValueError(f"Tickers removed more than once: {', '.join(sorted(repeated))}")
+            repeated = [t for t, n in Counter(u.ticker for u in delta.update).items() if n > 1]
+            if repeated:
+                raise ValueError(f"Tickers updated more than once: {', '.join(sorted(repeated))}")
+            removed_twice = set(delta.remove) & {u.ticker for u in delta.update}
+            if removed_twice:
+                raise ValueError(f"Tickers both removed and updated: {', '.join(sorted(removed_twice))}")
+            updates = {u.ticker: self._updated_rows(u) for u in delta.update}
+
+            old: List[PortfolioPosition] = []
+            new: List[PortfolioPosition] = []
+            for ticker in delta.remove:
+                old.extend(self.positions.pop(ticker))
+            for ticker, updated in updates.items():
+                old.extend(self.positions[ticker])
+                new.extend(updated)
+                self.positions[ticker] = updated
+            for pos in delta.add:
+                self.positions.setdefault(pos.ticker, []).append(pos)
+                new.append(pos)
+
+            self._apply_positions(old, -1)
+            self._apply_positions(new, +1)
+
+            touched = list(dict.fromkeys([p.ticker for p in old] + [p.ticker for p in new]))
+            return self._response(touched)
+
+    def sensitivity_report(self) -> PortfolioSensitivities:
+        with self.lock:
+            n = len(self.ticker_keys)
+            live = np.flatnonzero(self.issuer_count[:n] > 0)
+            return PortfolioSensitivities(
+                portfolio_id=self.portfolio_id,
+                total_value=round(self.total_value, 2),
+                totals=dict(zip(SENSITIVITY_LABELS, self.sensitivity_totals.tolist())),
+                by_ticker={self.ticker_keys[i][0]: self.sensitivities[i].tolist() for i in live}
+            )
+
+    def what_if(self, request: WhatIfRequest) -> WhatIfResult:
+        """
+        Linear P&L of an ad-hoc shock from the cached sensitivities: a dot
+        product with the portfolio totals, and with the ticker matrix only
+        when the worst-hit tickers are requested.
+        """
+        shock = np.array([getattr(request, f) for f in SCENARIO_FACTORS])
+        with self.lock:
+            legs = self.sensitivity_totals * shock
+            total_pnl = float(legs.sum())
+            impacts = {}
+            if request.top_positions:
+                n = len(self.ticker_keys)
+                pnl = np.where(self.issuer_count[:n] > 0, self.sensitivities[:n] @ shock, np.inf)
+                k = min(request.top_positions, int(np.isfinite(pnl).sum()))
+                worst = np.argpartition(pnl, k - 1)[:k] if 0 < k < n else np.flatnonzero(np.isfinite(pnl))
+                worst = worst[np.argsort(pnl[worst], kind="stable")]
+                impacts = {self.ticker_keys[i][0]: round(float(pnl[i]), 2) for i in worst}
+            return WhatIfResult(
+                portfolio_id=self.portfolio_id,
+                total_pnl=round(total_pnl, 2),
+                percentage_loss=round(total_pnl / self.total_value, 4) if self.total_value > 0 else 0.0,
+                shock_details={label: round(float(v), 2) for label, v in zip(ATTRIBUTION_LABELS, legs)},
+                position_impacts=impacts
+            )
+
+    def exposure_report(self) -> ExposureReport:
+        total_val = self.total_value
+        if self.position_count == 0 or total_val == 0:
+            return ExposureReport(
+                by_asset_class={}, by_sector={}, by_rating={},
+                weighted_average_duration=0.0, liquidity_profile=0.0,
+                concentration_alerts=["Portfolio is empty"]
+            )
+
+        groups = {}
+        for d in GROUP_DIMENSIONS:
+            live = [(k, mv) for k, (mv, c) in self.groups[d].items() if c > 0]
+            mv = np.array([v for _, v in live])
+            groups[(d,)] = GroupedExposure((d,), [(k,) for k, _ in live], mv, mv / total_val)
+        n = len(self.ticker_keys)
+        # Tickers with no positions left get NaN weight so no rule can fire on them
+        issuer_weight = np.where(self.issuer_count[:n] > 0, self.issuer_mv[:n] / total_val, np.nan)
+        issuer = GroupedExposure(("issuer",), self.ticker_keys, self.issuer_mv[:n], issuer_weight)
+        groups[("issuer",)] = groups[("ticker",)] = issuer
+
+        metrics = {
+            "weighted_average_duration": self.sum_mv_duration / total_val,
+            "liquidity_profile": self.sum_mv_liquidity / total_val,
+        }
+        return ExposureReport(
+            by_asset_class={k: round(v, 4) for k, v in groups[("asset_class",)].weights_by_label().items()},
+            by_sector={k: round(v, 4) for k, v in groups[("sector",)].weights_by_label().items()},
+            by_rating={k: round(v, 4) for k, v in groups[("rating",)].weights_by_label().items()},
+            weighted_average_duration=round(metrics["weighted_average_duration"], 2),
+            liquidity_profile=round(metrics["liquidity_profile"], 2),
+            concentration_alerts=evaluate_rules(DEFAULT_CONCENTRATION_RULES, groups, metrics)
+        )
+
+    def _response(self, touched: List[str]) -> DeltaAnalysisResponse:
+        exposure = self.exposure_report()
+        # Selection only changes when one of its thresholds is crossed
+        index = {s.name: i for i, s in enumerate(self.candidates)}
+        # Scenarios added to the library after this state was built are not tracked
+        scenarios = [s for s in select_scenarios(exposure) if s.name in index]
+        names = [s.name for s in scenarios]
+        reselected = names != self.selected_names
+        self.selected_names = names
+
+        results = []
+        for s in scenarios:
+            i = index[s.name]
+            total_pnl = float(self.totals[i])
+            results.append(SimulationResult(
+                scenario_name=s.name,
+                scenario_description=s.description,
+                total_pnl=round(total_pnl, 2),
+                percentage_loss=round(total_pnl / self.total_value, 4) if self.total_value > 0 else 0.0,
+                position_impacts={
+                    t: round(float(self.impacts[i, self.ticker_index[t]]), 2)
+                    for t in touched if t in self.positions
+                },
+                shock_details={
+                    label: round(float(v), 2) for label, v in zip(ATTRIBUTION_LABELS, self.attribution[i])
+                },
+            ))
+
+        return DeltaAnalysisResponse(
+            portfolio_id=self.portfolio_id,
+            total_value=round(self.total_value, 2),
+            position_count=self.position_count,
+            exposure_report=exposure,
+            selected_scenarios=scenarios,
+            scenarios_reselected=reselected,
+            simulation_results=[r.model_dump(exclude={"impact_rollups"}) for r in results],
+            risk_explanation=build_explanation(exposure, scenarios, results)
+        )
+
+
+class AnalysisStore:
+    """In-memory LRU of tracked portfolios, keyed by portfolio ID."""
+
+    def __init__(self, max_portfolios: int):
+        self.max_portfolios = max_portfolios
+        self._states: "OrderedDict[str, IncrementalAnalysis]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def register(self, frame: PortfolioFrame) -> IncrementalAnalysis:
+        state = IncrementalAnalysis(uuid.uuid4().hex, frame)
+        with self._lock:
+            self._states[state.portfolio_id] = state
+            while len(self._states) > self.max_portfolios:
+                self._states.popitem(last=False)
+        return state
+
+    def get(self, portfolio_id: str) -> IncrementalAnalysis:
+        with self._lock:
+            state = self._states[portfolio_id] # KeyError if unknown or evicted
+            self._states.move_to_end(portfolio_id)
+            return state
+
+
+analysis_store = AnalysisStore(settings.INCREMENTAL_MAX_PORTFOLIOS)
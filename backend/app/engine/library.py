@@ -0,0 +1,314 @@
+import bisect
+import hashlib
+import sqlite3
+import threading
+import uuid
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+from app.models import ExposureReport, LibraryScenario, ScenarioSet, SelectionRule, StressScenario
+from app.core.config import settings
+from app.engine import scenarios as builtin  # built-in lists are only built when a library is seeded
+from app.engine.matrix import build_scenario_matrix
+
+
+class ScenarioInUse(ValueError):
+    """Raised when deleting a scenario that a set or selection rule still references."""
+
+
+def _metric_value(exposure: ExposureReport, metric: str, keys: Tuple[str, ...]) -> float:
+    if metric == "weighted_average_duration":
+        return exposure.weighted_average_duration
+    if metric == "liquidity_profile":
+        return exposure.liquidity_profile
+    weights = {
+        "sector_weight": exposure.by_sector,
+        "rating_weight": exposure.by_rating,
+        "asset_class_weight": exposure.by_asset_class,
+    }[metric]
+    # Summed in the report's order
+    total = 0.0
+    for k, w in weights.items():
+        if k in keys:
+            total += w
+    return total
+
+
+class _RuleGroup:
+    """Rules on one (metric, keys) pair, sorted by threshold per operator."""
+
+    def __init__(self, rules: List[Tuple[int, SelectionRule]]):
+        above = sorted((r.threshold, i) for i, r in rules if r.operator == ">")
+        below = sorted((r.threshold, i) for i, r in rules if r.operator == "<")
+        self.above_thresholds = [t for t, _ in above]
+        self.above_ids = [i for _, i in above]
+        self.below_thresholds = [t for t, _ in below]
+        self.below_ids = [i for _, i in below]
+
+    def fired(self, value: float) -> List[int]:
+        # ">" rules fire for thresholds below the value, "<" rules for those above it
+        return (self.above_ids[:bisect.bisect_left(self.above_thresholds, value)]
+                + self.below_ids[bisect.bisect_right(self.below_thresholds, value):])
+
+
+class LibrarySnapshot:
+    """
+    Immutable in-memory index of one library version. Can be rebuilt from
+    its entries and rules elsewhere (e.g. in a worker process), optionally
+    around a shock matrix that was already built.
+    """
+
+    def __init__(self, entries: List[LibraryScenario], sets: List[ScenarioSet], rules: List[SelectionRule],
+                 matrix: Optional[np.ndarray] = None):
+        self.entries = entries
+        # What the engine sees: plain scenarios without library metadata
+        self.scenarios = [StressScenario(**e.model_dump(exclude={"tags", "metadata"})) for e in entries]
+        self.row = {s.name: i for i, s in enumerate(entries)}
+        self.by_tag: Dict[str, List[int]] = {}
+        for i, s in enumerate(entries):
+            for tag in s.tags:
+                self.by_tag.setdefault(tag, []).append(i)
+        self.sets = {s.name: s for s in sets}
+
+        # Rules in evaluation order; "always" rules skip the metric lookup
+        self.rules = sorted(rules, key=lambda r: r.priority)
+        self.always = [i for i, r in enumerate(self.rules) if r.metric == "always"]
+        grouped: Dict[Tuple[str, Tuple[str, ...]], List[Tuple[int, SelectionRule]]] = {}
+        for i, r in enumerate(self.rules):
+            if r.metric != "always":
+                grouped.setdefault((r.metric, tuple(r.keys)), []).append((i, r))
+        self.groups = {key: _RuleGroup(rules) for key, rules in grouped.items()}
+
+        # Shock vectors, ready for the engine
+        if matrix is None:
+            matrix = build_scenario_matrix(self.scenarios)
+            matrix.flags.writeable = False
+        self.matrix = matrix
+        self.vol_shocks = np.array([s.vol_shock for s in self.scenarios], dtype=np.float64)
+
+    def select(self, exposure: ExposureReport) -> List[StressScenario]:
+        fired = list(self.always)
+        for (metric, keys), group in self.groups.items():
+            fired.extend(group.fired(_metric_value(exposure, metric, keys)))
+
+        selected: Dict[str, StressScenario] = {}
+        for i in sorted(fired):
+            for name in self.rules[i].scenarios:
+                row = self.row.get(name)
+                if row is not None:
+                    selected[name] = self.scenarios[row]
+        return list(selected.values())
+
+
+class ScenarioLibrary:
+    """
+    Persistent scenario library (SQLite) with tags, named scenario sets and
+    selection rules. Everything is loaded into an immutable in-memory index;
+    writes go to the database and swap in a rebuilt index, bumping the
+    library version that result-cache keys are derived from.
+    """
+
+    def __init__(self, db_path: str):
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._db.executescript(
+                "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);"
+                "CREATE TABLE IF NOT EXISTS scenarios (name TEXT PRIMARY KEY, position INTEGER, payload TEXT);"
+                "CREATE TABLE IF NOT EXISTS scenario_sets (name TEXT PRIMARY KEY, payload TEXT);"
+                "CREATE TABLE IF NOT EXISTS selection_rules (name TEXT PRIMARY KEY, payload TEXT);"
+                "CREATE INDEX IF NOT EXISTS scenarios_position ON scenarios (position);"
+            )
+            if self._meta("library_id") is None:
+                self._seed()
+            self._load()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def _meta(self, key: str) -> Optional[str]:
+        row = self._db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _seed(self):
+        self._db.execute("INSERT INTO meta VALUES ('library_id', ?)", (uuid.uuid4().hex,))
+        self._db.execute("INSERT INTO meta VALUES ('version', '0')")
+        self._db.executemany(
+            "INSERT INTO scenarios VALUES (?, ?, ?)",
+            [(s.name, i, s.model_dump_json()) for i, s in enumerate(builtin.SCENARIOS_DB)]
+        )
+        self._db.executemany(
+            "INSERT INTO selection_rules VALUES (?, ?)",
+            [(r.name, r.model_dump_json()) for r in builtin.DEFAULT_SELECTION_RULES]
+        )
+        historical = ScenarioSet(name="historical", tags=["historical"])
+        self._db.execute("INSERT INTO scenario_sets VALUES (?, ?)", (historical.name, historical.model_dump_json()))
+        self._db.commit()
+
+    def _load(self):
+        scenarios = [LibraryScenario.model_validate_json(p) for (p,) in
+                     self._db.execute("SELECT payload FROM scenarios ORDER BY position")]
+        sets = [ScenarioSet.model_validate_json(p) for (p,) in
+                self._db.execute("SELECT payload FROM scenario_sets ORDER BY name")]
+        rules = [SelectionRule.model_validate_json(p) for (p,) in
+                 self._db.execute("SELECT payload FROM selection_rules ORDER BY name")]
+        self.version = int(self._meta("version"))
+        self.library_id = self._meta("library_id")
+        self._snapshot = LibrarySnapshot(scenarios, sets, rules)
+
+    def _commit(self):
+        # Caller holds the lock and has written its change
+        self._db.execute("UPDATE meta SET value = CAST(value AS INTEGER) + 1 WHERE key = 'version'")
+        self._db.commit()
+        self._load()
+
+    @property
+    def snapshot(self) -> LibrarySnapshot:
+        return self._snapshot
+
+    @property
+    def fingerprint(self) -> str:
+        return hashlib.sha256(f"{self.library_id}|{self.version}".encode()).hexdigest()
+
+    # Scenarios
+
+    def entries(self, tag: Optional[str] = None) -> List[LibraryScenario]:
+        snap = self._snapshot
+        if tag is None:
+            return list(snap.entries)
+        return [snap.entries[i] for i in snap.by_tag.get(tag, [])]
+
+    def get(self, name: str) -> LibraryScenario:
+        snap = self._snapshot
+        return snap.entries[snap.row[name]] # KeyError if unknown
+
+    def scenarios(self) -> List[StressScenario]:
+        """Every scenario, as the engine runs it."""
+        return list(self._snapshot.scenarios)
+
+    def put_scenario(self, scenario: LibraryScenario):
+        self.put_scenarios([scenario])
+
+    def put_scenarios(self, scenarios: List[LibraryScenario]):
+        """Creates or replaces scenarios in one version bump; new names are appended."""
+        with self._lock:
+            for scenario in scenarios:
+                row = self._db.execute("SELECT position FROM scenarios WHERE name = ?", (scenario.name,)).fetchone()
+                if row is None:
+                    (last,) = self._db.execute("SELECT COALESCE(MAX(position), -1) FROM scenarios").fetchone()
+                    position = last + 1
+                else:
+                    position = row[0]
+                self._db.execute("REPLACE INTO scenarios VALUES (?, ?, ?)", (scenario.name, position, scenario.model_dump_json()))
+            self._commit()
+
+    def delete_scenario(self, name: str):
+        with self._lock:
+            self.get(name)
+            snap = self._snapshot
+            users = [f"set '{s.name}'" for s in snap.sets.values() if name in s.scenarios]
+            users += [f"rule '{r.name}'" for r in snap.rules if name in r.scenarios]
+            if users:
+                raise ScenarioInUse(f"Scenario '{name}' is used by {', '.join(users)}")
+            self._db.execute("DELETE FROM scenarios WHERE name = ?", (name,))
+            self._commit()
+
+    # Scenario sets
+
+    def sets(self) -> List[ScenarioSet]:
+        return list(self._snapshot.sets.values())
+
+    def get_set(self, name: str) -> ScenarioSet:
+        return self._snapshot.sets[name] # KeyError if unknown
+
+    def resolve_set(self, name: str) -> List[StressScenario]:
+        """Scenarios of a set: its named scenarios in order, then any tagged ones not yet included."""
+        snap = self._snapshot
+        scenario_set = snap.sets[name]
+        rows = [snap.row[n] for n in scenario_set.scenarios if n in snap.row]
+        for tag in scenario_set.tags:
+            rows.extend(snap.by_tag.get(tag, []))
+        return [snap.scenarios[i] for i in dict.fromkeys(rows)]
+
+    def put_set(self, scenario_set: ScenarioSet):
+        self._check_names(scenario_set.scenarios)
+        with self._lock:
+            self._db.execute("REPLACE INTO scenario_sets VALUES (?, ?)", (scenario_set.name, scenario_set.model_dump_json()))
+            self._commit()
+
+    def delete_set(self, name: str):
+        with self._lock:
+            self.get_set(name)
+            self._db.execute("DELETE FROM scenario_sets WHERE name = ?", (name,))
+            self._commit()
+
+    # Selection rules
+
+    def rules(self) -> List[SelectionRule]:
+        return list(self._snapshot.rules)
+
+    def put_rule(self, rule: SelectionRule):
+        self._check_names(rule.scenarios)
+        with self._lock:
+            self._db.execute("REPLACE INTO selection_rules VALUES (?, ?)", (rule.name, rule.model_dump_json()))
+            self._commit()
+
+    def delete_rule(self, name: str):
+        with self._lock:
+            if not any(r.name == name for r in self._snapshot.rules):
+                raise KeyError(name)
+            self._db.execute("DELETE FROM selection_rules WHERE name = ?", (name,))
+            self._commit()
+
+    def _check_names(self, names: List[str]):
+        unknown = [n for n in names if n not in self._snapshot.row]
+        if unknown:
+            raise ValueError(f"Unknown scenarios: {', '.join(unknown)}")
+
+    # Engine access
+
+    def select(self, exposure: ExposureReport) -> List[StressScenario]:
+        """
+        Evaluates the selection rules against the exposure report: one metric
+        lookup per (metric, keys) group plus a binary search over its sorted
+        thresholds, instead of testing every rule.
+        """
+        return self._snapshot.select(exposure)
+
+    def shock_matrix(self, scenarios: List[StressScenario]) -> Optional[np.ndarray]:
+        """Rows of the cached shock matrix, if every scenario is a current library entry."""
+        snap = self._snapshot
+        rows = []
+        for s in scenarios:
+            row = snap.row.get(s.name)
+            if row is None or snap.scenarios[row] is not s:
+                return None
+            rows.append(row)
+        return snap.matrix[rows]
+
+
+_library: Optional[ScenarioLibrary] = None
+_library_lock = threading.Lock()
+
+
+def get_scenario_library() -> ScenarioLibrary:
+    """Opened (and seeded, the first time) on first use; main.py opens it at startup."""
+    global _library
+    with _library_lock:
+        if _library is None:
+            _library = ScenarioLibrary(settings.SCENARIO_DB_PATH)
+        return _library
+
+
+def cached_shock_matrix(scenarios: List[StressScenario]) -> Optional[np.ndarray]:
+    # Never opens the library just for a lookup
+    library = _library
+    return library.shock_matrix(scenarios) if library is not None else None
+
+
+def close_scenario_library():
+    global _library
+    with _library_lock:
+        if _library is not None:
+            _library.close()
+            _library = None
@@ -0,0 +1,128 @@
+import numpy as np
+from typing import List, Optional, Union
+from app.models import Portfolio, StressScenario
+from app.core.config import settings
+from app.core.frame import PortfolioFrame, as_frame, ordered_sum
+from app.engine.vectorized import compute_leg_matrix
+from app.engine.fullreval import compute_full_reval_legs
+
+# "linear": first-order sensitivities (the original model); "full": convexity and option repricing
+REVALUATION_MODES = ("linear", "full")
+
+# Column order of a scenario matrix
+SCENARIO_FACTORS = ["equity_shock", "rate_shock", "credit_spread_shock", "liquidity_shock"]
+
+# Column order of the attribution matrix (matches SimulationResult.shock_details)
+ATTRIBUTION_LABELS = ["Equity Risk", "Interest Rate Risk", "Credit Spread Risk", "Liquidity Risk"]
+
+
+class ScenarioMatrixResult:
+    """
+    Output of a batched run.
+    - pnl: scenarios x positions P&L matrix (None if keep_positions=False)
+    - totals: total P&L per scenario
+    - attribution: scenarios x 4 matrix of leg totals (ATTRIBUTION_LABELS order)
+    """
+
+    def __init__(self, totals: np.ndarray, attribution: np.ndarray, pnl: Optional[np.ndarray] = None):
+        self.totals = totals
+        self.attribution = attribution
+        self.pnl = pnl
+
+    def __len__(self) -> int:
+        return len(self.totals)
+
+
+def scenario_matrix(scenarios: List[StressScenario]) -> np.ndarray:
+    """
+    N x 4 shock matrix with SCENARIO_FACTORS as columns. Scenarios straight
+    from the scenario library reuse its prebuilt rows.
+    """
+    # Imported here: the library builds its matrix with this module
+    from app.engine.library import cached_shock_matrix
+    cached = cached_shock_matrix(scenarios)
+    if cached is not None:
+        return cached
+    return build_scenario_matrix(scenarios)
+
+
+def build_scenario_matrix(scenarios: List[StressScenario]) -> np.ndarray:
+    """
+    Stacks scenarios into an N x 4 matrix with SCENARIO_FACTORS as columns.
+    """
+    shocks = np.empty((len(scenarios), len(SCENARIO_FACTORS)), dtype=np.float64)
+    for i, s in enumerate(scenarios):
+        shocks[i] = [getattr(s, f) for f in SCENARIO_FACTORS]
+    return shocks
+
+
+def evaluate_scenario_matrix(
+    portfolio: Union[Portfolio, PortfolioFrame],
+    shocks: np.ndarray,
+    keep_positions: bool = True,
+    chunk_size: Optional[int] = None,
+    revaluation: str = "linear",
+    vol_shocks: Optional[np.ndarray] = None,
+    carry: Optional[ScenarioMatrixResult] = None
+) -> ScenarioMatrixResult:
+    """
+    Evaluates N scenarios against M positions with one set of broadcast
+    matrix operations per chunk of scenarios. Intermediate leg matrices are
+    bounded by chunk_size x M cells (settings.MATRIX_CHUNK_ELEMENTS by
+    default); with keep_positions=False the full N x M matrix is never held.
+    With revaluation="full", vol_shocks (length N) feeds option repricing.
+    `carry` holds the totals and attribution of the positions before this
+    block of a larger book; the sums continue from them in position order.
+    """
+    frame = as_frame(portfolio)
+    shocks = np.asarray(shocks, dtype=np.float64)
+    if shocks.ndim != 2 or shocks.shape[1] != len(SCENARIO_FACTORS):
+        raise ValueError(f"Scenario matrix must have shape (N, {len(SCENARIO_FACTORS)}), got {shocks.shape}")
+
+    if revaluation not in REVALUATION_MODES:
+        raise ValueError(f"Unknown revaluation mode: {revaluation}")
+
+    n_scenarios = shocks.shape[0]
+    n_positions = len(frame)
+    if vol_shocks is None:
+        vol_shocks = np.zeros(n_scenarios)
+    vol_shocks = np.asarray(vol_shocks, dtype=np.float64).reshape(-1, 1)
+    if chunk_size is None:
+        chunk_size = max(1, settings.MATRIX_CHUNK_ELEMENTS // max(n_positions, 1))
+
+    totals = np.zeros(n_scenarios, dtype=np.float64)
+    attribution = np.zeros((n_scenarios, len(ATTRIBUTION_LABELS)), dtype=np.float64)
+    pnl_matrix = np.empty((n_scenarios, n_positions), dtype=np.float64) if keep_positions else None
+
+    for start in range(0, n_scenarios, chunk_size):
+        stop = min(start + chunk_size, n_scenarios)
+        block = shocks[start:stop]
+        if revaluation == "full":
+            legs = compute_full_reval_legs(
+                frame,
+                block[:, 0:1],
+                block[:, 1:2],
+                block[:, 2:3],
+                block[:, 3:4],
+                vol_shocks[start:stop]
+            )
+        else:
+            legs = compute_leg_matrix(
+                frame,
+                block[:, 0:1],
+                block[:, 1:2],
+                block[:, 2:3],
+                block[:, 3:4]
+            )
+        eq, rate, spread, liq = [np.broadcast_to(leg, (stop - start, n_positions)) for leg in legs]
+        pnl = eq + rate + spread + liq
+
+        initial = carry.totals[start:stop] if carry is not None else None
+        totals[start:stop] = ordered_sum(pnl, axis=1, initial=initial)
+        for j, leg in enumerate((eq, rate, spread, liq)):
+            initial = carry.attribution[start:stop, j] if carry is not None else None
+            attribution[start:stop, j] = ordered_sum(leg, axis=1, initial=initial)
+        if keep_positions:
+            pnl_matrix[start:stop] = pnl
+
+    return ScenarioMatrixResult(totals=totals, attribution=attribution, pnl=pnl_matrix)
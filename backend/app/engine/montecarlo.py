@@ -0,0 +1,193 @@
+import math
+import threading
+import time
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from typing import Union, List, Optional, Tuple
+from app.models import Portfolio, MonteCarloConfig, MonteCarloResult
+from app.core.config import settings
+from app.core.frame import PortfolioFrame, as_frame
+from app.engine.matrix import evaluate_scenario_matrix, SCENARIO_FACTORS, ATTRIBUTION_LABELS
+from app.engine.parallel import SharedFrame, FrameSpec, attach_frame
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _cholesky(covariance: List[List[float]]) -> np.ndarray:
+    cov = np.asarray(covariance, dtype=np.float64)
+    k = len(SCENARIO_FACTORS)
+    if cov.shape != (k, k):
+        raise ValueError(f"Covariance must be {k}x{k}, got {cov.shape}")
+    if not np.allclose(cov, cov.T):
+        raise ValueError("Covariance must be symmetric")
+    # Clip tiny negative eigenvalues so singular (but valid) matrices still factor
+    eigvals, eigvecs = np.linalg.eigh(cov)
+    if eigvals.min() < -1e-10 * max(1.0, abs(eigvals.max())):
+        raise ValueError("Covariance must be positive semi-definite")
+    return eigvecs * np.sqrt(np.clip(eigvals, 0.0, None))
+
+
+def sample_shocks(config: MonteCarloConfig, factor: np.ndarray, size: int,
+                  seed_seq: np.random.SeedSequence) -> np.ndarray:
+    """
+    Draws `size` correlated shock vectors (size x 4). Each batch gets its own
+    child SeedSequence, so results do not depend on how batches are split
+    across workers.
+    """
+    rng = np.random.default_rng(seed_seq)
+    z = rng.standard_normal((size, factor.shape[0]))
+    if config.distribution == "student_t":
+        dof = config.degrees_of_freedom
+        # Scale so the sample covariance matches the requested one
+        w = np.sqrt((dof - 2) / rng.chisquare(dof, size))
+        z *= w[:, None]
+    return z @ factor.T + np.asarray(config.mean, dtype=np.float64)
+
+
+def _run_batch(frame: PortfolioFrame, config: MonteCarloConfig, factor: np.ndarray,
+               size: int, seed_seq: np.random.SeedSequence,
+               deadline: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray]:
+    shocks = sample_shocks(config, factor, size, seed_seq)
+    if deadline is None:
+        return shocks, evaluate_scenario_matrix(frame, shocks, keep_positions=False).totals
+    # Revalue chunk by chunk so a deadline cuts the batch short instead of waiting for all of it
+    chunk = max(1, settings.MATRIX_CHUNK_ELEMENTS // max(len(frame), 1))
+    totals = []
+    for start in range(0, size, chunk):
+        if time.monotonic() > deadline:
+            break
+        totals.append(evaluate_scenario_matrix(frame, shocks[start:start + chunk], keep_positions=False).totals)
+    done = sum(len(t) for t in totals)
+    return shocks[:done], np.concatenate(totals) if totals else np.empty(0)
+
+
+def _run_batch_in_worker(frame_spec: FrameSpec, config: MonteCarloConfig, factor: np.ndarray, size: int,
+                         seed_seq: np.random.SeedSequence) -> Tuple[np.ndarray, np.ndarray]:
+    frame, blocks = attach_frame(frame_spec)
+    try:
+        return _run_batch(frame, config, factor, size, seed_seq)
+    finally:
+        frame.derived.clear()
+        del frame
+        for b in blocks:
+            b.close()
+
+
+def get_monte_carlo_pool() -> ProcessPoolExecutor:
+    """
+    Long-lived pool for Monte Carlo batches with settings.MC_MAX_WORKERS
+    processes, started on demand. A request keeps at most its own `workers`
+    batches in flight, so that is how many processes it runs on.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=max(settings.MC_MAX_WORKERS, 1))
+        return _pool
+
+
+def shutdown_monte_carlo_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True)
+            _pool = None
+
+
+def run_monte_carlo(portfolio: Union[Portfolio, PortfolioFrame], config: MonteCarloConfig) -> MonteCarloResult:
+    """
+    Samples correlated factor shocks, revalues the book with the linear
+    stress model and reports VaR, expected shortfall and tail contributions.
+    Draws are split into fixed batches; with more than one worker they run
+    on the Monte Carlo pool against a shared-memory copy of the portfolio.
+    With a deadline the call returns once it passes (run serially, a batch
+    is cut short between matrix chunks); draws not evaluated by then are
+    dropped and the result is marked truncated.
+    """
+    if config.n_draws > settings.MC_MAX_DRAWS:
+        raise ValueError(f"n_draws exceeds the limit of {settings.MC_MAX_DRAWS}")
+    frame = as_frame(portfolio)
+    factor = _cholesky(config.covariance)
+    if len(config.mean) != len(SCENARIO_FACTORS):
+        raise ValueError(f"Mean must have {len(SCENARIO_FACTORS)} entries")
+
+    batch_size = settings.MC_BATCH_SIZE
+    sizes = [min(batch_size, config.n_draws - start) for start in range(0, config.n_draws, batch_size)]
+    seeds = np.random.SeedSequence(config.seed).spawn(len(sizes))
+    deadline = time.monotonic() + config.deadline_seconds if config.deadline_seconds else None
+    workers = min(config.workers, settings.MC_MAX_WORKERS, len(sizes))
+
+    completed = {}
+    if workers <= 1:
+        for i, size in enumerate(sizes):
+            if deadline is not None and time.monotonic() > deadline:
+                break
+            shocks, totals = _run_batch(frame, config, factor, size, seeds[i], deadline)
+            if len(totals):
+                completed[i] = shocks, totals
+    else:
+        # At most `workers` batches in flight, so a request runs on that many
+        # processes and a deadline leaves no more than that many behind it
+        pool = get_monte_carlo_pool()
+        with SharedFrame(frame) as shared:
+            queue = iter(enumerate(sizes))
+            running = {}
+
+            def _refill():
+                for i, size in queue:
+                    running[pool.submit(_run_batch_in_worker, shared.spec, config, factor, size, seeds[i])] = i
+                    if len(running) >= workers:
+                        break
+
+            _refill()
+            while running:
+                timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+                done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+                for f in done:
+                    completed[running.pop(f)] = f.result()
+                if deadline is not None and time.monotonic() > deadline:
+                    # Late batches finish (or fail to attach) in the background; their results are discarded
+                    for f in running:
+                        f.cancel()
+                    break
+                _refill()
+
+    # Reassemble in batch order so results are independent of completion order
+    order = sorted(completed)
+    if not order:
+        raise ValueError("Deadline expired before any Monte Carlo draws completed")
+    shocks = np.concatenate([completed[i][0] for i in order])
+    totals = np.concatenate([completed[i][1] for i in order])
+    n = len(totals)
+
+    # Tail = the k worst draws; VaR is the best of them, ES their average
+    k = max(1, math.ceil((1 - config.confidence) * n))
+    tail_idx = np.argpartition(totals, k - 1)[:k]
+    tail_totals = totals[tail_idx]
+    value_at_risk = float(-tail_totals.max())
+    expected_shortfall = float(-tail_totals.mean())
+
+    # Per-position contributions. The model is linear in the shocks, so the
+    # average tail P&L of each position equals its P&L at the mean tail shock
+    # and needs one O(M) revaluation instead of a k x M matrix.
+    tail = evaluate_scenario_matrix(frame, shocks[tail_idx].mean(axis=0, keepdims=True))
+    contributions = {}
+    for ticker, value in zip(frame.tickers, tail.pnl[0].tolist()):
+        contributions[ticker] = contributions.get(ticker, 0.0) + value
+    tail_contributions = {t: round(v, 2) for t, v in contributions.items()}
+    leg_mean = tail.attribution[0]
+
+    total_value = frame.total_value
+    return MonteCarloResult(
+        n_draws=n,
+        truncated=n < config.n_draws,
+        confidence=config.confidence,
+        value_at_risk=round(value_at_risk, 2),
+        expected_shortfall=round(expected_shortfall, 2),
+        var_pct=round(value_at_risk / total_value, 4) if total_value > 0 else 0.0,
+        es_pct=round(expected_shortfall / total_value, 4) if total_value > 0 else 0.0,
+        mean_pnl=round(float(totals.mean()), 2),
+        tail_contributions=tail_contributions,
+        tail_attribution={label: round(float(v), 2) for label, v in zip(ATTRIBUTION_LABELS, leg_mean)}
+    )
@@ -0,0 +1,175 @@
+"""
+Scenario sharding across a process pool.
+
+The portfolio columns are copied once into shared memory; every task only
+carries the block names and its slice of the shock matrix, and writes its
+rows of the P&L matrix into a shared output block. A scenario is always
+evaluated whole by one worker, with the same operations as the serial
+path, so totals and attribution match it bit for bit and do not depend on
+the worker count or on which worker finishes first.
+"""
+import threading
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from app.core.config import settings
+from app.core.frame import PortfolioFrame, FLOAT_COLUMNS
+from app.engine.matrix import (
+    evaluate_scenario_matrix, ScenarioMatrixResult, SCENARIO_FACTORS, ATTRIBUTION_LABELS, REVALUATION_MODES
+)
+from app.engine.shared import SharedArray, SharedSpec
+
+# Columns the stress models read; labels are not needed to evaluate
+SHARED_COLUMNS = ["asset_class", "rating"] + FLOAT_COLUMNS
+
+# Everything a worker needs to map a frame: column -> spec, term -> spec, as_of_date, total_value
+FrameSpec = Tuple[Dict[str, SharedSpec], Dict[str, SharedSpec], str, float]
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+class SharedFrame:
+    """A PortfolioFrame's evaluation columns in shared memory, owned by the caller."""
+
+    def __init__(self, frame: PortfolioFrame):
+        self.blocks: List[SharedArray] = []
+        try:
+            columns = {c: self._share(getattr(frame, c)) for c in SHARED_COLUMNS}
+            terms = {c: self._share(v) for c, v in frame.terms.items()}
+        except BaseException:
+            self.close()
+            raise
+        self.spec: FrameSpec = (columns, terms, frame.as_of_date, frame.total_value)
+
+    def _share(self, values: np.ndarray) -> SharedSpec:
+        block = SharedArray.create(values)
+        self.blocks.append(block)
+        return block.spec
+
+    def close(self):
+        for block in self.blocks:
+            block.close()
+        self.blocks = []
+
+    def __enter__(self) -> "SharedFrame":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def attach_frame(spec: FrameSpec) -> Tuple[PortfolioFrame, List[SharedArray]]:
+    """
+    Evaluation-only frame over the shared columns (ticker, sector and name
+    codes are left empty). Close the returned blocks when done.
+    """
+    columns, terms, as_of_date, total_value = spec
+    blocks = {c: SharedArray.attach(s) for c, s in columns.items()}
+    term_blocks = {c: SharedArray.attach(s) for c, s in terms.items()}
+    no_codes = np.empty(0, dtype=np.int32)
+    frame = PortfolioFrame(
+        ticker_code=no_codes, ticker_labels=[],
+        sector_code=no_codes, sector_labels=[],
+        name_code=no_codes, name_labels=[],
+        as_of_date=as_of_date, total_value=total_value,
+        terms={c: b.array for c, b in term_blocks.items()},
+        **{c: b.array for c, b in blocks.items()}
+    )
+    return frame, list(blocks.values()) + list(term_blocks.values())
+
+
+def _evaluate_shard(frame_spec: FrameSpec, shocks: np.ndarray, vol_shocks: np.ndarray, revaluation: str,
+                    out_spec: Optional[SharedSpec], start: int) -> Tuple[np.ndarray, np.ndarray]:
+    frame, blocks = attach_frame(frame_spec)
+    out = SharedArray.attach(out_spec, writable=True) if out_spec is not None else None
+    batch = None
+    try:
+        batch = evaluate_scenario_matrix(frame, shocks, keep_positions=out is not None,
+                                         revaluation=revaluation, vol_shocks=vol_shocks)
+        if out is not None:
+            out.array[start:start + len(shocks)] = batch.pnl
+        return batch.totals, batch.attribution
+    finally:
+        # Drop every view of the blocks (including cached derived data) before unmapping them
+        frame.derived.clear()
+        del frame, batch
+        if out is not None:
+            out.close()
+        for b in blocks:
+            b.close()
+
+
+def get_simulation_pool() -> ProcessPoolExecutor:
+    """
+    Long-lived pool for sharded runs with settings.SIMULATION_WORKERS
+    processes. It is created on first use and only shut down at app
+    shutdown, never from a request.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=max(settings.SIMULATION_WORKERS, 1))
+        return _pool
+
+
+def shutdown_simulation_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True)
+            _pool = None
+
+
+def shard_bounds(n_scenarios: int, shards: int) -> List[Tuple[int, int]]:
+    """Contiguous, near-equal scenario ranges; fixed for a given (n, shards)."""
+    edges = np.linspace(0, n_scenarios, min(shards, n_scenarios) + 1).round().astype(int)
+    return [(int(a), int(b)) for a, b in zip(edges[:-1], edges[1:]) if b > a]
+
+
+def evaluate_scenario_matrix_parallel(
+    frame: PortfolioFrame,
+    shocks: np.ndarray,
+    workers: int,
+    keep_positions: bool = True,
+    revaluation: str = "linear",
+    vol_shocks: Optional[np.ndarray] = None
+) -> ScenarioMatrixResult:
+    """
+    evaluate_scenario_matrix with the scenarios split into contiguous shards
+    (settings.PARALLEL_SHARDS_PER_WORKER per worker) run on the simulation
+    pool. `workers` only sets the number of shards; the pool keeps its own
+    size. Partial results are placed by scenario index, so the reduction is
+    deterministic and identical to the serial run.
+    """
+    shocks = np.ascontiguousarray(shocks, dtype=np.float64)
+    if shocks.ndim != 2 or shocks.shape[1] != len(SCENARIO_FACTORS):
+        raise ValueError(f"Scenario matrix must have shape (N, {len(SCENARIO_FACTORS)}), got {shocks.shape}")
+    if revaluation not in REVALUATION_MODES:
+        raise ValueError(f"Unknown revaluation mode: {revaluation}")
+    n_scenarios, n_positions = len(shocks), len(frame)
+    if vol_shocks is None:
+        vol_shocks = np.zeros(n_scenarios)
+    vol_shocks = np.asarray(vol_shocks, dtype=np.float64)
+    bounds = shard_bounds(n_scenarios, workers * settings.PARALLEL_SHARDS_PER_WORKER)
+
+    totals = np.zeros(n_scenarios, dtype=np.float64)
+    attribution = np.zeros((n_scenarios, len(ATTRIBUTION_LABELS)), dtype=np.float64)
+    pnl = None
+    pool = get_simulation_pool()
+    with SharedFrame(frame) as shared:
+        out = SharedArray.empty((n_scenarios, n_positions)) if keep_positions else None
+        try:
+            futures = [
+                pool.submit(_evaluate_shard, shared.spec, shocks[a:b], vol_shocks[a:b], revaluation,
+                            out.spec if out is not None else None, a)
+                for a, b in bounds
+            ]
+            for (a, b), f in zip(bounds, futures):
+                totals[a:b], attribution[a:b] = f.result()
+            if out is not None:
+                pnl = np.array(out.array)
+        finally:
+            if out is not None:
+                out.close()
+    return ScenarioMatrixResult(totals=totals, attribution=attribution, pnl=pnl)
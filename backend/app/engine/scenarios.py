@@ -1,85 +1,92 @@
-from app.models import ExposureReport, StressScenario
+from app.models import ExposureReport, StressScenario, LibraryScenario, SelectionRule
 from typing import List
 
-# Predefined Scenarios Database
-SCENARIOS_DB = [
-    StressScenario(
-        name="Global Financial Crisis (2008)",
-        description="Severe global recession with liquidity freeze.",
-        equity_shock=-0.50,
-        rate_shock=-100, # Rates cut
-        credit_spread_shock=400,
-        liquidity_shock=0.5
-    ),
-    StressScenario(
-        name="Dotcom Bubble Burst (2000)",
-        description="Tech sector crash.",
-        equity_shock=-0.40, # General market
-        rate_shock=0,
-        credit_spread_shock=100, 
-        liquidity_shock=0.8
-    ),
-    StressScenario(
-        name="Inflation Shock (1970s style)",
-        description="High inflation leading to rate hikes.",
-        equity_shock=-0.20,
-        rate_shock=300, # +3%
-        credit_spread_shock=50,
-        liquidity_shock=0.9
-    ),
-    StressScenario(
-        name="Covid-19 Crash (2020)",
-        description="Sharp, short-term market drop.",
-        equity_shock=-0.30,
-        rate_shock=-50,
-        credit_spread_shock=200,
-        liquidity_shock=0.6
-    ),
-    StressScenario(
-        name="Tech Wreck",
-        description="Targeted crash in technology sector.",
-        equity_shock=-0.25, # Broader market impact
-        rate_shock=20,
-        credit_spread_shock=50,
-        liquidity_shock=0.9
-    )
-]
+# Built-in scenarios and selection rules, used to seed a new scenario
+# library (see app/engine/library.py). Together the rules reproduce the
+# original selection logic. Both lists are built on first access of
+# SCENARIOS_DB / DEFAULT_SELECTION_RULES, not at import.
+def _builtin_scenarios() -> List[LibraryScenario]:
+    return [
+        LibraryScenario(
+            name="Global Financial Crisis (2008)",
+            description="Severe global recession with liquidity freeze.",
+            equity_shock=-0.50,
+            rate_shock=-100, # Rates cut
+            credit_spread_shock=400,
+            liquidity_shock=0.5,
+            tags=["historical", "crisis", "credit"]
+        ),
+        LibraryScenario(
+            name="Dotcom Bubble Burst (2000)",
+            description="Tech sector crash.",
+            equity_shock=-0.40, # General market
+            rate_shock=0,
+            credit_spread_shock=100, 
+            liquidity_shock=0.8,
+            tags=["historical", "equity", "technology"]
+        ),
+        LibraryScenario(
+            name="Inflation Shock (1970s style)",
+            description="High inflation leading to rate hikes.",
+            equity_shock=-0.20,
+            rate_shock=300, # +3%
+            credit_spread_shock=50,
+            liquidity_shock=0.9,
+            tags=["historical", "rates"]
+        ),
+        LibraryScenario(
+            name="Covid-19 Crash (2020)",
+            description="Sharp, short-term market drop.",
+            equity_shock=-0.30,
+            rate_shock=-50,
+            credit_spread_shock=200,
+            liquidity_shock=0.6,
+            tags=["historical", "crisis", "credit"]
+        ),
+        LibraryScenario(
+            name="Tech Wreck",
+            description="Targeted crash in technology sector.",
+            equity_shock=-0.25, # Broader market impact
+            rate_shock=20,
+            credit_spread_shock=50,
+            liquidity_shock=0.9,
+            tags=["hypothetical", "technology"]
+        )
+    ]
 
-def select_scenarios(exposure: ExposureReport) -> List[StressScenario]:
-    """
-    Agentic logic to select relevant scenarios based on portfolio exposure.
-    """
-    selected = []
-    
-    # 1. Always include a broad market crash
-    selected.append(SCENARIOS_DB[0]) # GFC 2008
 
-    # 2. Check Sector Concentration
-    # If Tech > 20%, include Dotcom or Tech Wreck
-    tech_exposure = exposure.by_sector.get('Technology', 0.0) + exposure.by_sector.get('Tech', 0.0)
-    if tech_exposure > 0.20:
-        selected.append(SCENARIOS_DB[4]) # Tech Wreck (or DB[1])
+def _default_selection_rules() -> List[SelectionRule]:
+    return [
+        # 1. Always include a broad market crash
+        SelectionRule(name="broad_market_crash", metric="always", scenarios=["Global Financial Crisis (2008)"], priority=0),
+        # 2. Sector concentration: Tech > 20%
+        SelectionRule(name="tech_concentration", metric="sector_weight", keys=["Technology", "Tech"],
+                      operator=">", threshold=0.20, scenarios=["Tech Wreck"], priority=1),
+        # 3. Duration / rate sensitivity: high duration is sensitive to rate hikes
+        SelectionRule(name="rate_sensitivity", metric="weighted_average_duration",
+                      operator=">", threshold=5.0, scenarios=["Inflation Shock (1970s style)"], priority=2),
+        # 4. Credit quality: below BBB > 30% (Covid as a proxy for spread widening)
+        SelectionRule(name="high_yield", metric="rating_weight", keys=["BB", "B", "CCC", "NR"],
+                      operator=">", threshold=0.30, scenarios=["Covid-19 Crash (2020)"], priority=3),
+    ]
+
 
-    # 3. Check Duration / Rate Sensitivity
-    if exposure.weighted_average_duration > 5.0:
-        # High duration -> Sensitive to rate hikes
-        selected.append(SCENARIOS_DB[2]) # Inflation Shock
+_LAZY_ATTRIBUTES = {"SCENARIOS_DB": _builtin_scenarios, "DEFAULT_SELECTION_RULES": _default_selection_rules}
 
-    # 4. Check Credit Rating / Quality
-    # If High High Yield (below BBB) > 30%
-    junk_exposure = 0.0
-    for r, w in exposure.by_rating.items():
-        if r in ['BB', 'B', 'CCC', 'NR']:
-             junk_exposure += w
-    
-    if junk_exposure > 0.30:
-        # Credit crunch scenario (using Covid as proxy for spread widening)
-        selected.append(SCENARIOS_DB[3])
 
-    # Deduplicate by name if needed, but here we just append
-    # To be safe, unique by name
-    unique_scenarios = {}
-    for s in selected:
-        unique_scenarios[s.name] = s
-    
-    return list(unique_scenarios.values())
+def __getattr__(name: str):
+    # Module-level attribute hook (PEP 562); the value is cached as a global
+    if name in _LAZY_ATTRIBUTES:
+        value = _LAZY_ATTRIBUTES[name]()
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def select_scenarios(exposure: ExposureReport) -> List[StressScenario]:
+    """
+    Agentic logic to select relevant scenarios based on portfolio exposure:
+    evaluates the scenario library's selection rules.
+    """
+    # Imported here: the library seeds itself from this module
+    from app.engine.library import get_scenario_library
+    return get_scenario_library().select(exposure)
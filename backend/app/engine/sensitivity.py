@@ -0,0 +1,39 @@
+import numpy as np
+from typing import Union
+from app.models import Portfolio
+from app.core.frame import PortfolioFrame, as_frame, ordered_sum
+from app.engine.vectorized import leg_masks
+
+# Column order of a sensitivity matrix; column j is the P&L per unit of SCENARIO_FACTORS[j]
+SENSITIVITY_LABELS = ["equity_delta", "dv01", "spread_dv01", "liquidity_sensitivity"]
+
+
+def position_sensitivities(portfolio: Union[Portfolio, PortfolioFrame]) -> np.ndarray:
+    """
+    Positions x 4 matrix of first-order sensitivities, in SENSITIVITY_LABELS
+    order:
+    - equity_delta: P&L per 1.0 (100%) equity shock
+    - dv01: P&L per 1bp rate shock
+    - spread_dv01: P&L per 1bp credit spread shock
+    - liquidity_sensitivity: P&L per 1.0 liquidity shock
+    The linear model is linear in every factor, so the P&L of any shock
+    vector x is S @ x. Built once per frame and cached with it.
+    """
+    frame = as_frame(portfolio)
+    if "sensitivities" not in frame.derived:
+        val = frame.market_value
+        masks = leg_masks(frame)
+        sens = np.column_stack([
+            np.where(masks.equity, val, 0.0),
+            np.where(masks.rate, -frame.duration * val / 10000.0, 0.0),
+            np.where(masks.spread, -frame.duration * val / 10000.0, 0.0),
+            np.where(masks.liquidity, -val * (1 - frame.liquidity_score / 100), 0.0),
+        ]) if len(frame) else np.zeros((0, len(SENSITIVITY_LABELS)))
+        sens.flags.writeable = False
+        frame.derived["sensitivities"] = sens
+    return frame.derived["sensitivities"]
+
+
+def portfolio_sensitivities(portfolio: Union[Portfolio, PortfolioFrame]) -> np.ndarray:
+    """Portfolio-level sensitivities: the column sums of position_sensitivities."""
+    return ordered_sum(position_sensitivities(portfolio), axis=0)
@@ -0,0 +1,61 @@
+import numpy as np
+from multiprocessing import shared_memory
+from typing import Tuple
+
+# (block name, shape, dtype): all a worker needs to attach
+SharedSpec = Tuple[str, Tuple[int, ...], str]
+
+
+class SharedArray:
+    """
+    A NumPy array in a named shared-memory block, read-only unless asked
+    otherwise. The creating process owns the block and unlinks it; worker
+    processes attach by spec and map the same pages instead of receiving a
+    pickled copy.
+    """
+
+    def __init__(self, shm: shared_memory.SharedMemory, shape: Tuple[int, ...], dtype: np.dtype, owner: bool,
+                 writable: bool = False):
+        self._shm = shm
+        self.owner = owner
+        self.array = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+        self.array.flags.writeable = writable
+
+    @classmethod
+    def create(cls, array: np.ndarray) -> "SharedArray":
+        array = np.ascontiguousarray(array)
+        # Zero-size blocks are not allowed
+        shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)[...] = array
+        return cls(shm, array.shape, array.dtype, owner=True)
+
+    @classmethod
+    def empty(cls, shape: Tuple[int, ...], dtype=np.float64) -> "SharedArray":
+        """An uninitialized block for workers to write their results into."""
+        dtype = np.dtype(dtype)
+        size = int(np.prod(shape)) * dtype.itemsize
+        shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        return cls(shm, tuple(shape), dtype, owner=True)
+
+    @classmethod
+    def attach(cls, spec: SharedSpec, writable: bool = False) -> "SharedArray":
+        name, shape, dtype = spec
+        return cls(shared_memory.SharedMemory(name=name), tuple(shape), np.dtype(dtype), owner=False,
+                   writable=writable)
+
+    @property
+    def spec(self) -> SharedSpec:
+        return self._shm.name, self.array.shape, self.array.dtype.str
+
+    def close(self):
+        # Views must go before the mapping can be released
+        self.array = None
+        self._shm.close()
+        if self.owner:
+            self._shm.unlink()
+
+    def __enter__(self) -> "SharedArray":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
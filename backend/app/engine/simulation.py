@@ -1,5 +1,11 @@
-from app.models import Portfolio, StressScenario, PortfolioPosition
-from typing import List, Dict
+import numpy as np
+from app.models import Portfolio, StressScenario, PortfolioPosition, ImpactQuery
+from app.core.config import settings
+from app.core.frame import PortfolioFrame, as_frame
+from app.engine.matrix import evaluate_scenario_matrix, scenario_matrix, ATTRIBUTION_LABELS
+from app.engine.impacts import PositionImpacts
+from app.engine.parallel import evaluate_scenario_matrix_parallel
+from typing import List, Dict, Optional, Union
 from pydantic import BaseModel
 
 class SimulationResult(BaseModel):
@@ -7,10 +13,15 @@ class SimulationResult(BaseModel):
     scenario_description: str
     total_pnl: float
     percentage_loss: float
-    position_impacts: Dict[str, float] # Ticker -> P&L
+    position_impacts: Dict[str, float] # Ticker -> P&L (lines with the same ticker added up)
     shock_details: Dict[str, float] # e.g. "Rate Impact", "Equity Impact"
+    impact_rollups: Optional[Dict[str, Dict[str, float]]] = None # Dimension -> label -> P&L, when asked for
 
-def simulate_scenario(portfolio: Portfolio, scenario: StressScenario) -> SimulationResult:
+def simulate_scenario_reference(portfolio: Portfolio, scenario: StressScenario) -> SimulationResult:
+    """
+    Per-position reference implementation. Kept as the source of truth for
+    parity tests against the vectorized engine in simulate_scenario.
+    """
     total_pnl = 0.0
     position_impacts = {}
     
@@ -60,7 +71,7 @@ def simulate_scenario(portfolio: Portfolio, scenario: StressScenario) -> Simulat
             pnl += liq_loss
             total_liquidity_impact += liq_loss
 
-        position_impacts[pos.ticker] = round(pnl, 2)
+        position_impacts[pos.ticker] = position_impacts.get(pos.ticker, 0.0) + pnl
         total_pnl += pnl
 
     total_start_val = portfolio.total_value
@@ -71,7 +82,7 @@ def simulate_scenario(portfolio: Portfolio, scenario: StressScenario) -> Simulat
         scenario_description=scenario.description,
         total_pnl=round(total_pnl, 2),
         percentage_loss=round(pct_loss, 4),
-        position_impacts=position_impacts,
+        position_impacts={ticker: round(v, 2) for ticker, v in position_impacts.items()},
         shock_details={
             "Equity Risk": round(total_equity_impact, 2),
             "Interest Rate Risk": round(total_rate_impact, 2),
@@ -80,8 +91,58 @@ def simulate_scenario(portfolio: Portfolio, scenario: StressScenario) -> Simulat
         }
     )
 
-def run_stress_test(portfolio: Portfolio, scenarios: List[StressScenario]) -> List[SimulationResult]:
-    results = []
-    for s in scenarios:
-        results.append(simulate_scenario(portfolio, s))
-    return results
+def simulate_scenario(portfolio: Union[Portfolio, PortfolioFrame], scenario: StressScenario) -> SimulationResult:
+    """
+    Vectorized stress simulation. Accepts either a Portfolio or a
+    PortfolioFrame (preferred, avoids packing the positions again).
+    """
+    return run_stress_test(portfolio, [scenario])[0]
+
+def build_simulation_result(frame: PortfolioFrame, scenario: StressScenario, pnl: Optional[np.ndarray],
+                            total_pnl: float, attribution: np.ndarray,
+                            impact_query: Optional[ImpactQuery] = None) -> SimulationResult:
+    """
+    pnl is the scenario's P&L per position (None leaves position_impacts
+    empty); impact_query restricts the impacts and adds rollups.
+    """
+    total_start_val = frame.total_value
+    pct_loss = (total_pnl / total_start_val) if total_start_val > 0 else 0.0
+
+    if pnl is None:
+        position_impacts, rollups = {}, None
+    else:
+        position_impacts, rollups = PositionImpacts(frame, pnl).report(impact_query)
+
+    return SimulationResult(
+        scenario_name=scenario.name,
+        scenario_description=scenario.description,
+        total_pnl=round(total_pnl, 2),
+        percentage_loss=round(pct_loss, 4),
+        position_impacts=position_impacts,
+        shock_details={label: round(float(v), 2) for label, v in zip(ATTRIBUTION_LABELS, attribution)},
+        impact_rollups=rollups
+    )
+
+def run_stress_test(portfolio: Union[Portfolio, PortfolioFrame], scenarios: List[StressScenario],
+                    revaluation: str = "linear", impact_query: Optional[ImpactQuery] = None,
+                    workers: Optional[int] = None) -> List[SimulationResult]:
+    """
+    Packs the portfolio once and evaluates every scenario in one batched
+    pass. With more than one worker (settings.SIMULATION_WORKERS by
+    default) and at least settings.PARALLEL_MIN_CELLS scenario x position
+    cells, scenarios are sharded across a process pool; results are
+    identical either way.
+    """
+    frame = as_frame(portfolio)
+    shocks = scenario_matrix(scenarios)
+    vol_shocks = np.array([s.vol_shock for s in scenarios])
+    workers = min(workers or settings.SIMULATION_WORKERS, len(scenarios))
+    if workers > 1 and len(scenarios) * len(frame) >= settings.PARALLEL_MIN_CELLS:
+        batch = evaluate_scenario_matrix_parallel(frame, shocks, workers, revaluation=revaluation,
+                                                  vol_shocks=vol_shocks)
+    else:
+        batch = evaluate_scenario_matrix(frame, shocks, revaluation=revaluation, vol_shocks=vol_shocks)
+    return [
+        build_simulation_result(frame, s, batch.pnl[i], float(batch.totals[i]), batch.attribution[i], impact_query)
+        for i, s in enumerate(scenarios)
+    ]
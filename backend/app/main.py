@@ -1,8 +1,40 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse, JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from app.api import endpoints
+from app.core.audit import audit_queue
+from app.core.executor import shutdown_executor, run_in_thread
+from app.core.jobs import shutdown_job_manager
+from app.core.metrics import MetricsMiddleware, render_metrics
+from app.core.config import settings
+from app.core.warmup import readiness, warm_up, start_warm_up
+from app.engine.library import close_scenario_library
+from app.engine.parallel import shutdown_simulation_pool
+from app.engine.montecarlo import shutdown_monte_carlo_pool
 
-app = FastAPI(title="Portfolio Stress-Testing Agent")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await audit_queue.start()
+    # Load deferred imports, the scenario library index and engine state before (or while) taking traffic
+    warmup = None
+    if settings.WARMUP_MODE == "blocking":
+        await run_in_thread(warm_up)
+    elif settings.WARMUP_MODE == "background":
+        warmup = start_warm_up()
+    yield
+    if warmup is not None:
+        # The warm-up may still be opening the pools closed below
+        await run_in_thread(warmup.join)
+    # Flush pending audit entries before the pipeline pool goes away
+    await audit_queue.stop()
+    shutdown_executor()
+    shutdown_job_manager()
+    shutdown_simulation_pool()
+    shutdown_monte_carlo_pool()
+    close_scenario_library()
+
+app = FastAPI(title="Portfolio Stress-Testing Agent", lifespan=lifespan)
 
 # Configure CORS
 app.add_middleware(
@@ -13,8 +45,24 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Per-endpoint latency and the optional X-Profile stage breakdown
+app.add_middleware(MetricsMiddleware)
+
 app.include_router(endpoints.router, prefix="/api")
 
 @app.get("/health")
 def health_check():
     return {"status": "ok", "service": "Portfolio Stress-Testing Agent"}
+
+
+@app.get("/ready")
+def readiness_check():
+    """Readiness probe: 503 until the warm-up (app/core/warmup.py) has finished."""
+    status = readiness.snapshot()
+    return JSONResponse(status, status_code=200 if readiness.ready else 503)
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Prometheus text exposition of request/stage latencies and pipeline counters."""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
@@ -1,5 +1,5 @@
-from pydantic import BaseModel, Field, field_validator
-from typing import Optional, List, Dict
+from pydantic import BaseModel, Field, field_validator, model_validator
+from typing import Optional, List, Dict, Literal
 from enum import Enum
 
 class AssetClass(str, Enum):
@@ -49,6 +49,34 @@ class StressScenario(BaseModel):
     rate_shock: float = 0.0 # Basis points increase, e.g., 100 for +1%
     credit_spread_shock: float = 0.0 # Basis points increase
     liquidity_shock: float = 0.0 # Multiplier for liquidity cost or simple haircut
+    vol_shock: float = 0.0 # Implied volatility change in vol points, e.g. 0.15 for +15 vols (full revaluation only)
+
+class LibraryScenario(StressScenario):
+    tags: List[str] = Field(default_factory=list, description="e.g. historical, regulatory, rates")
+    metadata: Dict[str, str] = Field(default_factory=dict, description="Factor notes: source, calibration window, units")
+
+class ScenarioSet(BaseModel):
+    name: str
+    scenarios: List[str] = Field(default_factory=list, description="Scenario names, in order")
+    tags: List[str] = Field(default_factory=list, description="Also include every scenario with any of these tags")
+
+class SelectionRule(BaseModel):
+    # Includes `scenarios` when the exposure metric crosses the threshold
+    name: str
+    metric: Literal["always", "sector_weight", "rating_weight", "asset_class_weight",
+                    "weighted_average_duration", "liquidity_profile"]
+    keys: List[str] = Field(default_factory=list, description="Sectors / ratings / asset classes summed for *_weight metrics")
+    operator: Literal[">", "<"] = ">"
+    threshold: float = 0.0
+    scenarios: List[str]
+    priority: int = 0 # Order of the selected scenarios (lower first)
+
+class CalibrationConfig(BaseModel):
+    windows: List[int] = Field(default=[5, 20, 60], description="Move horizons in days (rows of history)")
+    anchor: Literal["equity", "rate", "spread", "vol"] = "equity"
+    top_n: int = Field(default=3, ge=1, le=50, description="Worst non-overlapping windows kept per horizon")
+    liquidity_shock: float = Field(default=0.0, ge=0, le=1, description="Not observable in the factor history")
+    save: bool = False # Add the calibrated scenarios to the scenario library
 
 class ExposureMetrics(BaseModel):
     total_exposure: float
@@ -62,11 +90,224 @@ class ExposureReport(BaseModel):
     liquidity_profile: float # Weighted average liquidity score
     concentration_alerts: List[str] = []
 
+class ExposureCell(BaseModel):
+    keys: List[str] # One label per dimension
+    market_value: float
+    weight: float
+
+class ExposureCube(BaseModel):
+    dimensions: List[str]
+    cells: List[ExposureCell]
+
+class ConcentrationRule(BaseModel):
+    # Empty dimensions = portfolio-level metric (e.g. liquidity_profile)
+    dimensions: List[str] = []
+    metric: Literal["weight", "weighted_average_duration", "liquidity_profile"] = "weight"
+    operator: Literal[">", "<"] = ">"
+    threshold: float
+    message: str = "High concentration in {label}: {value:.1%}" # Formatted with label and value
+
+    @field_validator('message')
+    def message_uses_label_and_value(cls, v):
+        # Rules come from clients; a bad template would otherwise fail while the rules are evaluated
+        try:
+            v.format(label="label", value=0.0)
+        except (KeyError, IndexError, ValueError, TypeError, AttributeError) as e:
+            raise ValueError(f"message may only use the {{label}} and {{value}} fields: {e!r}")
+        return v
+
+    @model_validator(mode='after')
+    def metric_matches_dimensions(self):
+        if self.dimensions and self.metric != "weight":
+            raise ValueError(f"Rule on {self.dimensions} must use the 'weight' metric")
+        if not self.dimensions and self.metric == "weight":
+            raise ValueError("A 'weight' rule needs at least one dimension")
+        return self
+
+class ExposureCubeResponse(BaseModel):
+    cubes: List[ExposureCube]
+    concentration_alerts: List[str] = []
+
+class CacheStats(BaseModel):
+    entries: int
+    max_entries: int
+    ttl_seconds: float
+    disk_enabled: bool
+    hits: int
+    disk_hits: int
+    misses: int
+    evictions: int
+    expirations: int
+    hit_rate: float
+
+class ImpactQuery(BaseModel):
+    top_k: Optional[int] = Field(default=None, ge=1, description="Keep at most k tickers per scenario")
+    order: Literal["worst", "best", "largest"] = "largest" # Ranking: most negative, most positive, largest absolute
+    threshold: Optional[float] = Field(default=None, ge=0, description="Keep tickers at least this far from zero in the order's direction")
+    rollup: List[Literal["sector", "issuer", "asset_class", "rating"]] = [] # Per-scenario P&L sums by these dimensions
+
 class AnalysisResponse(BaseModel):
     portfolio_summary: Portfolio
     exposure_report: ExposureReport
     selected_scenarios: List[StressScenario]
     simulation_results: List[Dict] # Using Dict to avoid circular imports or complex referencing if SimulationResult isn't in models
     risk_explanation: str
+    portfolio_id: Optional[str] = None # Set when the analysis is tracked for incremental updates
+
+class LargeBookAnalysis(BaseModel):
+    # Out-of-core analysis: the portfolio itself is not echoed back
+    position_count: int
+    total_value: float
+    as_of_date: str
+    exposure_report: ExposureReport
+    selected_scenarios: List[StressScenario]
+    simulation_results: List[Dict] # position_impacts hold the selected tickers only (top-K by default)
+    risk_explanation: str
+    block_rows: int
+    blocks: int
+
+class BatchPortfolioResult(BaseModel):
+    filename: str
+    status: Literal["succeeded", "failed"]
+    error: Optional[str] = None
+    total_value: float = 0.0
+    position_count: int = 0
+    exposure_report: Optional[ExposureReport] = None
+    selected_scenarios: List[str] = []
+    simulation_results: List[Dict] = [] # position_impacts are only filled with include_positions
+    worst_case_loss_pct: Optional[float] = None
+
+class FirmScenarioResult(BaseModel):
+    # One library scenario applied to every portfolio in the batch
+    scenario_name: str
+    total_pnl: float
+    percentage_loss: float
+    shock_details: Dict[str, float]
+    worst_portfolio: str
+    worst_portfolio_pnl: float
+
+class BatchReport(BaseModel):
+    portfolio_count: int
+    failed_count: int
+    total_value: float
+    firm_exposure: ExposureReport
+    firm_stress: List[FirmScenarioResult] # Worst first
+    portfolios: List[BatchPortfolioResult]
+    revaluation: str
+    workers: int
+    elapsed_seconds: float
+
+class PositionUpdate(BaseModel):
+    ticker: str
+    quantity: Optional[float] = Field(default=None, ge=0)
+    market_price: Optional[float] = Field(default=None, ge=0)
+
+class PortfolioDelta(BaseModel):
+    add: List[PortfolioPosition] = []
+    remove: List[str] = [] # Tickers; every position with the ticker is removed
+    update: List[PositionUpdate] = [] # Quantity is the ticker's total (split pro rata); price applies to every line
+
+class DeltaAnalysisResponse(BaseModel):
+    portfolio_id: str
+    total_value: float
+    position_count: int
+    exposure_report: ExposureReport
+    selected_scenarios: List[StressScenario]
+    scenarios_reselected: bool
+    simulation_results: List[Dict] # position_impacts only lists tickers touched by the delta
+    risk_explanation: str
+
+class PortfolioSensitivities(BaseModel):
+    portfolio_id: str
+    total_value: float
+    totals: Dict[str, float] # Sensitivity label -> P&L per unit of its factor
+    by_ticker: Dict[str, List[float]] # Ticker -> sensitivities in SENSITIVITY_LABELS order
+
+class WhatIfRequest(BaseModel):
+    # Units as in StressScenario: equity / liquidity as fractions, rate / spread in bps
+    equity_shock: float = 0.0
+    rate_shock: float = 0.0
+    credit_spread_shock: float = 0.0
+    liquidity_shock: float = 0.0
+    top_positions: int = Field(default=0, ge=0, description="Return the impacts of the N worst-hit tickers")
+
+class WhatIfResult(BaseModel):
+    portfolio_id: str
+    total_pnl: float
+    percentage_loss: float
+    shock_details: Dict[str, float]
+    position_impacts: Dict[str, float] # Worst-hit tickers first
+
+class AuditRecord(BaseModel):
+    timestamp: str
+    input_file: str
+    portfolio_value: float
+    worst_case_loss_pct: float
+    alerts_triggered: int
+    scenarios_run: int
+    segment: str # Log file holding the full entry (rotated segments are gzipped)
+    offset: int # Byte offset of the entry in the uncompressed segment
+
+class JobStatus(BaseModel):
+    job_id: str
+    status: Literal["queued", "running", "succeeded", "failed", "cancelled"]
+    stage: str
+    progress: float # 0.0 - 1.0
+    filename: str
+    created_at: float
+    updated_at: float
+    error: Optional[str] = None
+
+class JobResult(BaseModel):
+    job_id: str
+    offset: int
+    limit: int
+    total_positions: int
+    result: AnalysisResponse # Positions and position_impacts restricted to the requested page
+
+class MonteCarloConfig(BaseModel):
+    # Factor order: equity_shock, rate_shock (bps), credit_spread_shock (bps), liquidity_shock
+    covariance: List[List[float]] = Field(..., description="4x4 covariance of the shock factors")
+    mean: List[float] = Field(default=[0.0, 0.0, 0.0, 0.0], description="Mean shock vector")
+    distribution: Literal["gaussian", "student_t"] = "gaussian"
+    degrees_of_freedom: float = Field(default=5.0, gt=2, description="Student-t degrees of freedom")
+    n_draws: int = Field(default=10000, gt=0, description="Number of shock vectors to sample")
+    confidence: float = Field(default=0.99, gt=0, lt=1)
+    seed: int = 42
+    workers: int = Field(default=1, ge=1, description="Worker processes splitting the draws (capped at MC_MAX_WORKERS)")
+    deadline_seconds: Optional[float] = Field(default=None, gt=0, description="Stop sampling after this many seconds")
+
+class ReverseStressConfig(BaseModel):
+    # Factor order: equity_shock, rate_shock (bps), credit_spread_shock (bps), liquidity_shock
+    target_loss_pct: float = Field(..., gt=0, description="Loss to solve for, as a fraction of portfolio value")
+    covariance: Optional[List[List[float]]] = Field(
+        default=None, description="4x4 factor covariance; defaults to independent factors at typical stress scales"
+    )
+    mean: List[float] = Field(default=[0.0, 0.0, 0.0, 0.0], description="Mean shock vector")
+    revaluation: Literal["linear", "full"] = "linear"
+    max_iterations: int = Field(default=50, ge=1, le=500)
+    tolerance: float = Field(default=1e-6, gt=0, description="Allowed miss on the target loss, relative to it")
 
+class ReverseStressResult(BaseModel):
+    target_loss: float # Positive loss amount
+    target_loss_pct: float
+    scenario: StressScenario # The most likely breaching shock
+    achieved_pnl: float
+    attribution: Dict[str, float] # Factor leg -> P&L under the breaching shock
+    sensitivities: Dict[str, float] # P&L per unit of each factor at the solution
+    mahalanobis_distance: float # Distance of the shock from the mean, in standard deviations
+    exceedance_probability: float # Gaussian probability of a move at least this far along the loss direction
+    iterations: int
+    converged: bool
 
+class MonteCarloResult(BaseModel):
+    n_draws: int # Draws actually evaluated (may be below the request if the deadline hit)
+    truncated: bool
+    confidence: float
+    value_at_risk: float # Reported as a positive loss amount
+    expected_shortfall: float
+    var_pct: float
+    es_pct: float
+    mean_pnl: float
+    tail_contributions: Dict[str, float] # Ticker -> average P&L across tail draws
+    tail_attribution: Dict[str, float] # Factor leg -> average P&L across tail draws
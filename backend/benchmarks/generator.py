@@ -0,0 +1,89 @@
+import numpy as np
+import pandas as pd
+
+SECTORS = [
+    "Technology", "Financials", "Healthcare", "Energy", "Industrials", "Consumer Discretionary",
+    "Consumer Staples", "Utilities", "Materials", "Real Estate", "Communication Services", "Government"
+]
+
+# Asset class mix (share of positions) and the raw labels used for each, so
+# the ingest alias mapping is exercised too
+ASSET_CLASS_MIX = [("Equity", 0.50), ("Debt", 0.35), ("Cash", 0.05), ("Derivative", 0.10)]
+RAW_LABELS = {
+    "Equity": ["Equity", "Stock", "Share"],
+    "Debt": ["Debt", "Bond", "Corporate Bond", "Fixed Income"],
+    "Cash": ["Cash", "Currency"],
+    "Derivative": ["Derivative", "Option", "Future", "Swap"],
+}
+
+# Rating distribution for debt, from investment grade down to distressed
+DEBT_RATINGS = ["AAA", "AA", "A", "BBB", "BB", "B", "CCC", "NR"]
+DEBT_RATING_WEIGHTS = [0.10, 0.12, 0.20, 0.25, 0.14, 0.11, 0.06, 0.02]
+
+COLUMNS = [
+    "Asset Class", "Ticker", "Name", "Quantity", "Market Price", "Market Value",
+    "Sector", "Duration", "Rating", "Liquidity Score"
+]
+
+
+def generate_portfolio(n_positions: int, seed: int = 0) -> pd.DataFrame:
+    """
+    Synthetic book with the shape of a real one: a mix of asset classes,
+    heavy-tailed (lognormal) position sizes, several bond lines per issuer,
+    rating-dependent durations and liquidity. Same (n_positions, seed) gives
+    the same rows.
+    """
+    rng = np.random.default_rng(seed)
+    n = n_positions
+
+    classes = np.array([c for c, _ in ASSET_CLASS_MIX])
+    asset_class = classes[rng.choice(len(classes), size=n, p=[w for _, w in ASSET_CLASS_MIX])]
+    raw_label = np.empty(n, dtype=object)
+    for ac, labels in RAW_LABELS.items():
+        rows = np.flatnonzero(asset_class == ac)
+        raw_label[rows] = np.array(labels, dtype=object)[rng.integers(0, len(labels), size=len(rows))]
+    is_debt = asset_class == "Debt"
+    is_cash = asset_class == "Cash"
+
+    # Issuers: roughly one per 3 debt lines, so tickers repeat for debt
+    n_issuers = max(1, n // 3)
+    issuer = rng.integers(0, n_issuers, size=n)
+    ticker = np.where(is_debt, np.char.add("ISS", issuer.astype(str)), np.char.add("TKR", np.arange(n).astype(str)))
+    ticker = np.where(is_cash, np.char.add("CASH", (np.arange(n) % 5).astype(str)), ticker)
+    sector = np.array(SECTORS, dtype=object)[rng.integers(0, len(SECTORS), size=n)]
+
+    rating = np.full(n, "NR", dtype=object)
+    rating[is_debt] = rng.choice(DEBT_RATINGS, size=int(is_debt.sum()), p=DEBT_RATING_WEIGHTS)
+    rating[is_cash] = "AAA"
+
+    price = np.where(is_debt, rng.normal(98, 6, size=n).clip(20, 130), rng.lognormal(4, 1, size=n))
+    price = np.where(is_cash, 1.0, price)
+    market_value = rng.lognormal(11, 1.5, size=n)
+    quantity = market_value / price
+
+    # Longer durations for better-rated debt; derivatives carry a small duration
+    rating_rank = np.zeros(n)
+    for rank, r in enumerate(DEBT_RATINGS):
+        rating_rank[rating == r] = rank
+    duration = np.where(is_debt, rng.gamma(2.0, 4.0 - 0.3 * rating_rank, size=n).clip(0.1, 30), 0.0)
+    duration = np.where(asset_class == "Derivative", rng.uniform(0, 2, size=n), duration)
+
+    liquidity = np.where(is_debt, 85 - 9 * rating_rank + rng.normal(0, 8, size=n), rng.normal(80, 12, size=n))
+    liquidity = np.where(is_cash, 100.0, liquidity).clip(0, 100)
+
+    return pd.DataFrame({
+        "Asset Class": raw_label,
+        "Ticker": ticker,
+        "Name": np.char.add("Position ", np.arange(n).astype(str)),
+        "Quantity": quantity.round(4),
+        "Market Price": price.round(4),
+        "Market Value": market_value.round(2),
+        "Sector": np.where(is_debt & (rating == "AAA"), "Government", sector),
+        "Duration": duration.round(2),
+        "Rating": rating,
+        "Liquidity Score": liquidity.round(1),
+    }, columns=COLUMNS)
+
+
+def generate_portfolio_csv(n_positions: int, seed: int = 0) -> bytes:
+    return generate_portfolio(n_positions, seed).to_csv(index=False).encode()
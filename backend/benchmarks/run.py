@@ -0,0 +1,167 @@
+"""
+Stress-engine benchmarks.
+
+    python -m benchmarks.run                       # compare against baseline.json
+    python -m benchmarks.run --sizes 1000,1000000  # any sizes
+    python -m benchmarks.run --update-baseline     # record a new baseline
+
+Each pipeline stage is timed (best of --repeat runs) and, in a separate
+pass, memory-profiled with tracemalloc (peak bytes allocated during the
+stage). A stage regresses when its time or peak memory exceeds the
+baseline by more than --threshold; the exit code is 1 if anything
+regressed. Baselines are only
+comparable on the same machine.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, List
+from fastapi.testclient import TestClient
+from app.main import app
+from app.core.cache import result_cache
+from app.core.ingest import parse_portfolio_frame
+from app.core.exposure import calculate_exposure
+from app.engine.scenarios import select_scenarios
+from app.engine.simulation import run_stress_test
+from app.core.pipeline import analyze_frame
+from app.engine.incremental import IncrementalAnalysis
+from app.models import WhatIfRequest
+import app.core.audit as audit
+from benchmarks.generator import generate_portfolio_csv
+
+BASELINE_FILE = os.path.join(os.path.dirname(__file__), "baseline.json")
+DEFAULT_SIZES = [1_000, 10_000, 100_000]
+DEFAULT_THRESHOLD = 0.25 # 25% slower than baseline counts as a regression
+# Stages shorter / smaller than this are too noisy to gate on
+MIN_GATED_SECONDS = 0.005
+MIN_GATED_BYTES = 1_000_000
+
+
+def _stages(csv: bytes, client: TestClient) -> Dict[str, Callable[[], object]]:
+    # Inputs for each stage are prepared once, outside the measurement
+    frame = parse_portfolio_frame(csv, "bench.csv")
+    exposure = calculate_exposure(frame)
+    scenarios = select_scenarios(exposure)
+    tracked = IncrementalAnalysis("bench", frame)
+    what_if = WhatIfRequest(equity_shock=-0.1, rate_shock=50)
+
+    def api_round_trip():
+        result_cache.invalidate()
+        response = client.post("/api/analyze", files={"file": ("bench.csv", csv, "text/csv")})
+        response.raise_for_status()
+        return response.content
+
+    return {
+        "parse_portfolio_frame": lambda: parse_portfolio_frame(csv, "bench.csv"),
+        "calculate_exposure": lambda: calculate_exposure(frame),
+        "select_scenarios": lambda: select_scenarios(exposure),
+        "run_stress_test": lambda: run_stress_test(frame, scenarios),
+        "analyze_frame": lambda: analyze_frame(parse_portfolio_frame(csv, "bench.csv")),
+        "what_if": lambda: tracked.what_if(what_if),
+        "api_analyze": api_round_trip,
+    }
+
+
+def _time(func: Callable[[], object], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _peak_memory(func: Callable[[], object]) -> int:
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run_benchmarks(sizes: List[int], repeat: int = 3, seed: int = 0) -> Dict[str, Dict[str, dict]]:
+    """Returns {size: {stage: {"seconds": ..., "peak_bytes": ...}}}."""
+    results = {}
+    with TestClient(app) as client:
+        for n in sizes:
+            csv = generate_portfolio_csv(n, seed)
+            stages = _stages(csv, client)
+            results[str(n)] = {
+                name: {"seconds": _time(func, repeat), "peak_bytes": _peak_memory(func)}
+                for name, func in stages.items()
+            }
+            result_cache.invalidate()
+    return results
+
+
+def find_regressions(results: dict, baseline: dict, threshold: float) -> List[str]:
+    regressions = []
+    for size, stages in results.items():
+        for stage, current in stages.items():
+            base = baseline.get(size, {}).get(stage)
+            if base is None:
+                continue
+            if base["seconds"] >= MIN_GATED_SECONDS and current["seconds"] > base["seconds"] * (1 + threshold):
+                regressions.append(
+                    f"{stage} @ {size}: {current['seconds']:.4f}s vs baseline {base['seconds']:.4f}s "
+                    f"({current['seconds'] / base['seconds'] - 1:+.0%})"
+                )
+            if base["peak_bytes"] >= MIN_GATED_BYTES and current["peak_bytes"] > base["peak_bytes"] * (1 + threshold):
+                regressions.append(
+                    f"{stage} @ {size}: peak {current['peak_bytes'] / 1e6:.1f} MB vs baseline "
+                    f"{base['peak_bytes'] / 1e6:.1f} MB ({current['peak_bytes'] / base['peak_bytes'] - 1:+.0%})"
+                )
+    return regressions
+
+
+def _print_table(results: dict, baseline: dict):
+    print(f"{'size':>9}  {'stage':<22} {'seconds':>10} {'vs base':>8} {'peak MB':>9}")
+    for size, stages in results.items():
+        for stage, r in stages.items():
+            base = baseline.get(size, {}).get(stage)
+            change = f"{r['seconds'] / base['seconds'] - 1:+.0%}" if base and base["seconds"] > 0 else "-"
+            print(f"{size:>9}  {stage:<22} {r['seconds']:>10.4f} {change:>8} {r['peak_bytes'] / 1e6:>9.1f}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Stress-engine benchmarks")
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)), help="Comma separated position counts")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args(argv)
+
+    # Keep benchmark runs out of the real audit log
+    audit.AUDIT_FILE = os.path.join(tempfile.mkdtemp(prefix="bench-audit-"), "audit_log.jsonl")
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    results = run_benchmarks(sizes, args.repeat, args.seed)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f).get("results", {})
+    _print_table(results, baseline)
+
+    if args.update_baseline:
+        baseline.update(results)
+        with open(args.baseline, "w") as f:
+            json.dump({"machine": platform.platform(), "python": platform.python_version(), "results": baseline}, f, indent=2)
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    regressions = find_regressions(results, baseline, args.threshold)
+    for r in regressions:
+        print(f"REGRESSION {r}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
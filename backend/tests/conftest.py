@@ -0,0 +1,24 @@
+import pytest
+from app.core import audit
+from app.core.config import settings
+from app.core.jobs import shutdown_job_manager
+from app.engine.library import close_scenario_library
+
+
+@pytest.fixture(autouse=True, scope="session")
+def isolated_state(tmp_path_factory):
+    """
+    Keeps the suite off the working tree: the audit log (and its index),
+    the job store, the scenario library and the calibration cache live in
+    a temporary directory for the whole session.
+    """
+    root = tmp_path_factory.mktemp("state")
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(audit, "AUDIT_FILE", str(root / "audit_log.jsonl"))
+        mp.setattr(settings, "JOBS_DB_PATH", str(root / "jobs.sqlite3"))
+        mp.setattr(settings, "SCENARIO_DB_PATH", str(root / "scenario_library.sqlite3"))
+        mp.setattr(settings, "CALIBRATION_CACHE_DIR", str(root / "calibration_cache"))
+        yield root
+        audit.audit_writer.close()
+        shutdown_job_manager()
+        close_scenario_library()
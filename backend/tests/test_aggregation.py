@@ -0,0 +1,86 @@
+import json
+import pytest
+from pydantic import ValidationError
+from fastapi.testclient import TestClient
+from app.main import app
+from app.models import Portfolio, PortfolioPosition, ConcentrationRule
+from app.core.aggregation import aggregate_exposure, evaluate_rules, portfolio_metrics
+from app.core.exposure import calculate_exposure
+
+client = TestClient(app)
+
+def _portfolio():
+    # Total Value = 100 + 100 + 200 = 400
+    return Portfolio(
+        positions=[
+            PortfolioPosition(
+                asset_class="Equity", ticker="A", name="A", quantity=10, market_price=10,
+                market_value=100, sector="Tech", duration=0, rating="NR", liquidity_score=100
+            ),
+            PortfolioPosition(
+                asset_class="Debt", ticker="B", name="B", quantity=10, market_price=10,
+                market_value=100, sector="Tech", duration=4, rating="BB", liquidity_score=60
+            ),
+            PortfolioPosition(
+                asset_class="Debt", ticker="C", name="C", quantity=20, market_price=10,
+                market_value=200, sector="Gov", duration=10, rating="AAA", liquidity_score=80
+            ),
+        ],
+        total_value=400,
+        as_of_date="2024-01-01"
+    )
+
+def test_multi_dimension_cube():
+    groups = aggregate_exposure(_portfolio(), [["sector", "asset_class"], ["rating"]])
+
+    cube = groups[("sector", "asset_class")]
+    assert cube.keys == [("Tech", "Equity"), ("Tech", "Debt"), ("Gov", "Debt")]
+    assert cube.weight.tolist() == [0.25, 0.25, 0.5]
+    assert cube.market_value.tolist() == [100, 100, 200]
+    assert groups[("rating",)].weights_by_label() == {"NR": 0.25, "BB": 0.25, "AAA": 0.5}
+
+def test_custom_rules():
+    p = _portfolio()
+    rules = [
+        ConcentrationRule(dimensions=["sector", "asset_class"], threshold=0.4, message="{label} at {value:.0%}"),
+        ConcentrationRule(metric="weighted_average_duration", operator=">", threshold=5,
+                          message="Duration {value:.1f}"),
+    ]
+    report = calculate_exposure(p, rules=rules)
+    assert report.concentration_alerts == ["Gov / Debt at 50%", "Duration 6.0"]
+
+    groups = aggregate_exposure(p, [["issuer"]])
+    issuer_rule = [ConcentrationRule(dimensions=["issuer"], operator="<", threshold=0.3, message="{label}")]
+    assert evaluate_rules(issuer_rule, groups, portfolio_metrics(p)) == ["A", "B"]
+
+def test_exposure_cube_endpoint():
+    csv_content = b"""Asset Class,Ticker,Name,Quantity,Market Price,Market Value,Sector,Duration,Rating,Liquidity Score
+Equity,AAPL,Apple Inc,100,150,15000,Technology,0,NR,95
+Debt,US10Y,US Treasury 10Y,10,100,1000,Government,10,AAA,100
+"""
+    files = {'file': ('portfolio.csv', csv_content, 'text/csv')}
+    response = client.post("/api/exposure_cube", files=files,
+                           data={"dimensions": "sector*rating,asset_class",
+                                 "rules": json.dumps([{"dimensions": ["asset_class"], "threshold": 0.9}])})
+    assert response.status_code == 200
+    data = response.json()
+    assert [c["dimensions"] for c in data["cubes"]] == [["sector", "rating"], ["asset_class"]]
+    assert data["cubes"][0]["cells"][0] == {"keys": ["Technology", "NR"], "market_value": 15000.0, "weight": 0.9375}
+    assert data["concentration_alerts"] == ["High concentration in Equity: 93.8%"]
+
+    response = client.post("/api/exposure_cube", files=files, data={"dimensions": "colour"})
+    assert response.status_code == 400
+
+def test_invalid_rules_are_rejected():
+    with pytest.raises(ValidationError):
+        ConcentrationRule(dimensions=["sector"], threshold=0.1, message="{sector} at {value}")
+    with pytest.raises(ValidationError):
+        ConcentrationRule(threshold=0.1)
+    with pytest.raises(ValidationError):
+        ConcentrationRule(dimensions=["sector"], metric="liquidity_profile", threshold=50)
+
+    files = {'file': ('portfolio.csv', b"Ticker\nX\n", 'text/csv')}
+    for rule in ({"dimensions": ["sector"], "threshold": 0.1, "message": "{sector} at {value}"},
+                 {"threshold": 0.1}):
+        response = client.post("/api/exposure_cube", files=files, data={"rules": json.dumps([rule])})
+        assert response.status_code == 422
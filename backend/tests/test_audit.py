@@ -0,0 +1,115 @@
+import gzip
+import json
+from datetime import datetime, timedelta
+from fastapi.testclient import TestClient
+from app.main import app
+import app.core.audit as audit
+from app.core.audit import AuditWriter
+from app.core.config import settings
+
+client = TestClient(app)
+
+def _entry(filename, loss, when=None):
+    return {
+        "timestamp": (when or datetime.now()).isoformat(),
+        "event_type": "PORTFOLIO_ANALYSIS",
+        "input_file": filename,
+        "portfolio_value": 1000.0,
+        "alerts_triggered": 0,
+        "scenarios_run": 2,
+        "worst_case_loss_pct": loss,
+        "raw_alerts": []
+    }
+
+def test_batch_written_and_indexed(tmp_path):
+    log = tmp_path / "audit.jsonl"
+    writer = AuditWriter(str(log))
+    may = datetime(2024, 5, 10)
+    writer.write([_entry("a.csv", -0.1, may), _entry("b.csv", -0.3, may), _entry("a.csv", -0.2, may + timedelta(days=40))])
+    writer.write([_entry("a.csv", -0.25, may + timedelta(days=1))])
+
+    lines = log.read_bytes().splitlines(keepends=True)
+    assert [json.loads(line)["input_file"] for line in lines] == ["a.csv", "b.csv", "a.csv", "a.csv"]
+
+    worst = writer.query(input_file="a.csv", since="2024-05-01", until="2024-06-01", order_by="worst_case_loss_pct")
+    assert [r.worst_case_loss_pct for r in worst] == [-0.25, -0.1]
+    # Offsets point at the full entry
+    raw = log.read_bytes()[worst[0].offset:].split(b"\n", 1)[0]
+    assert json.loads(raw)["worst_case_loss_pct"] == -0.25
+    writer.close()
+
+def test_size_rotation_compresses_and_keeps_index(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "AUDIT_MAX_BYTES", 1)
+    log = tmp_path / "audit.jsonl"
+    writer = AuditWriter(str(log))
+    writer.write([_entry("a.csv", -0.1)])
+    writer.write([_entry("b.csv", -0.2)])
+
+    rotated = list(tmp_path.glob("audit.*.jsonl.gz"))
+    assert len(rotated) == 1
+    with gzip.open(rotated[0]) as f:
+        assert json.loads(f.readline())["input_file"] == "a.csv"
+    assert json.loads(log.read_text())["input_file"] == "b.csv"
+
+    segments = {r.input_file: r.segment for r in writer.query()}
+    assert segments == {"a.csv": rotated[0].name, "b.csv": "audit.jsonl"}
+    writer.close()
+
+def test_new_index_is_built_from_existing_segments(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "AUDIT_MAX_BYTES", 1)
+    log = tmp_path / "audit.jsonl"
+    writer = AuditWriter(str(log))
+    writer.write([_entry("a.csv", -0.1)])
+    writer.write([_entry("b.csv", -0.2)])
+    writer.close()
+    # History written before the index existed (or with the index lost)
+    (tmp_path / "audit.index.sqlite3").unlink()
+    with open(log, "ab") as f:
+        f.write(b"not json\n" + (json.dumps(_entry("c.csv", -0.3)) + "\n").encode())
+
+    writer = AuditWriter(str(log))
+    records = {r.input_file: r for r in writer.query(since="2000-01-01")}
+    assert set(records) == {"a.csv", "b.csv", "c.csv"}
+    assert records["a.csv"].segment.endswith(".jsonl.gz")
+    raw = log.read_bytes()[records["c.csv"].offset:].split(b"\n", 1)[0]
+    assert json.loads(raw)["input_file"] == "c.csv"
+    writer.close()
+
+def test_time_rotation_uses_first_entry_age(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "AUDIT_ROTATE_SECONDS", 3600.0)
+    monkeypatch.setattr(settings, "AUDIT_COMPRESS_ROTATED", False)
+    log = tmp_path / "audit.jsonl"
+    log.write_text(json.dumps(_entry("old.csv", -0.1, datetime.now() - timedelta(hours=2))) + "\n")
+
+    writer = AuditWriter(str(log))
+    writer.write([_entry("new.csv", -0.2)])
+    assert len(list(tmp_path.glob("audit.*.jsonl"))) == 1
+    assert json.loads(log.read_text())["input_file"] == "new.csv"
+    writer.close()
+
+def test_audit_endpoint(tmp_path, monkeypatch):
+    monkeypatch.setattr(audit, "AUDIT_FILE", str(tmp_path / "audit.jsonl"))
+    audit.write_audit_entries([_entry("x.csv", -0.05), _entry("y.csv", -0.5)])
+    response = client.get("/api/audit", params={"order_by": "worst_case_loss_pct", "limit": 1})
+    assert response.status_code == 200
+    assert [r["input_file"] for r in response.json()] == ["y.csv"]
+    audit.audit_writer.close()
+
+def test_query_reads_the_index_without_opening_the_log(tmp_path, monkeypatch):
+    log = tmp_path / "audit.jsonl"
+    assert AuditWriter(str(log)).query() == []
+    assert not log.exists()
+
+    writer = AuditWriter(str(log))
+    writer.write([_entry("a.csv", -0.1)])
+    writer.close()
+    reader = AuditWriter(str(log))
+    assert [r.input_file for r in reader.query()] == ["a.csv"]
+    assert reader._file is None
+    reader.close()
+
+def test_audit_endpoint_unavailable_when_index_disabled(monkeypatch):
+    monkeypatch.setattr(settings, "AUDIT_INDEX_ENABLED", False)
+    response = client.get("/api/audit")
+    assert response.status_code == 503
+    assert "disabled" in response.json()["detail"]
@@ -0,0 +1,95 @@
+import io
+import json
+import zipfile
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+import app.engine.library as library_module
+from app.core.batch import run_batch, list_batch_sources, main
+from app.core.exposure import calculate_exposure
+from app.core.frame import PortfolioFrame
+from app.core.ingest import parse_portfolio_frame
+from app.engine.library import ScenarioLibrary
+from app.engine.shared import SharedArray
+from app.engine.simulation import run_stress_test
+from benchmarks.generator import generate_portfolio_csv
+
+client = TestClient(app)
+
+@pytest.fixture(autouse=True)
+def library(tmp_path, monkeypatch):
+    lib = ScenarioLibrary(str(tmp_path / "library.sqlite3"))
+    monkeypatch.setattr(library_module, "_library", lib)
+    yield lib
+    lib.close()
+
+@pytest.fixture
+def funds(tmp_path):
+    root = tmp_path / "funds"
+    (root / "credit").mkdir(parents=True)
+    (root / "equity.csv").write_bytes(generate_portfolio_csv(200, seed=1))
+    (root / "credit" / "hy.csv").write_bytes(generate_portfolio_csv(150, seed=2))
+    (root / "broken.csv").write_bytes(b"not,a,portfolio\n1,2,3\n")
+    (root / ".hidden.csv").write_bytes(b"ignored")
+    (root / "notes.txt").write_bytes(b"ignored")
+    return root
+
+def _comparable(report):
+    return report.model_dump(exclude={"workers", "elapsed_seconds"})
+
+def test_sources_and_shared_array(funds):
+    assert [s[2] for s in list_batch_sources(str(funds))] == ["broken.csv", "credit/hy.csv", "equity.csv"]
+    with SharedArray.create(np.arange(6.0).reshape(2, 3)) as shared:
+        attached = SharedArray.attach(shared.spec)
+        np.testing.assert_array_equal(attached.array, [[0, 1, 2], [3, 4, 5]])
+        assert not attached.array.flags.writeable
+        attached.close()
+
+def test_batch_matches_single_portfolio_analysis(funds):
+    report = run_batch(str(funds), workers=1)
+    assert report.portfolio_count == 3 and report.failed_count == 1
+    failed, hy, equity = report.portfolios
+    assert failed.status == "failed" and failed.error
+
+    frames = [parse_portfolio_frame((funds / name).read_bytes(), name) for name in ("credit/hy.csv", "equity.csv")]
+    for result, frame in zip((hy, equity), frames):
+        exposure = calculate_exposure(frame)
+        assert result.exposure_report == exposure
+        expected = run_stress_test(frame, library_module._library.select(exposure))
+        assert [r["total_pnl"] for r in result.simulation_results] == [r.total_pnl for r in expected]
+        assert all(r["position_impacts"] == {} for r in result.simulation_results)
+
+    # Firm level: the combined book
+    combined = calculate_exposure(PortfolioFrame.concat(frames, frames[0].as_of_date))
+    assert report.firm_exposure.by_sector == pytest.approx(combined.by_sector, abs=1e-4)
+    assert report.total_value == pytest.approx(sum(f.total_value for f in frames), abs=0.01)
+    gfc = next(r for r in report.firm_stress if r.scenario_name == "Global Financial Crisis (2008)")
+    per_fund = [next(r["total_pnl"] for r in p.simulation_results if r["scenario_name"] == gfc.scenario_name)
+                for p in (hy, equity)]
+    assert gfc.total_pnl == pytest.approx(sum(per_fund), abs=0.02)
+    assert gfc.worst_portfolio == ("credit/hy.csv" if per_fund[0] < per_fund[1] else "equity.csv")
+    assert [r.total_pnl for r in report.firm_stress] == sorted(r.total_pnl for r in report.firm_stress)
+
+def test_process_pool_matches_serial(funds):
+    serial = run_batch(str(funds), workers=1, include_positions=True)
+    parallel = run_batch(str(funds), workers=2, include_positions=True)
+    assert parallel.workers == 2
+    assert _comparable(parallel) == _comparable(serial)
+    assert serial.portfolios[2].simulation_results[0]["position_impacts"]
+
+def test_batch_endpoint_and_cli(funds, tmp_path):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as z:
+        for name in ("equity.csv", "credit/hy.csv"):
+            z.writestr(f"funds/{name}", (funds / name).read_bytes())
+        z.writestr("__MACOSX/funds/._equity.csv", b"junk")
+    response = client.post("/api/batch", params={"workers": 1}, files={"file": ("funds.zip", buffer.getvalue())})
+    assert response.status_code == 200
+    body = response.json()
+    assert [p["filename"] for p in body["portfolios"]] == ["funds/credit/hy.csv", "funds/equity.csv"]
+    assert client.post("/api/batch", files={"file": ("x.zip", b"plain text")}).status_code == 400
+
+    out = tmp_path / "report.json"
+    assert main([str(funds), "--workers", "1", "-o", str(out)]) == 1 # broken.csv failed
+    assert json.loads(out.read_text())["portfolio_count"] == 3
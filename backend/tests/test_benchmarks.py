@@ -0,0 +1,27 @@
+from app.core.ingest import parse_portfolio_frame
+from app.core.exposure import calculate_exposure
+from benchmarks.generator import generate_portfolio, generate_portfolio_csv
+from benchmarks.run import find_regressions
+
+def test_generator_is_seeded_and_ingestible():
+    assert generate_portfolio_csv(500, seed=1) == generate_portfolio_csv(500, seed=1)
+    assert generate_portfolio_csv(500, seed=1) != generate_portfolio_csv(500, seed=2)
+
+    frame = parse_portfolio_frame(generate_portfolio_csv(2000, seed=1), "synthetic.csv")
+    assert len(frame) == 2000
+    exposure = calculate_exposure(frame)
+    assert set(exposure.by_asset_class) == {"Equity", "Debt", "Cash", "Derivative"}
+    assert len(exposure.by_rating) >= 6
+    assert 0 < exposure.weighted_average_duration < 30
+
+def test_generator_repeats_issuers_for_debt():
+    df = generate_portfolio(3000, seed=0)
+    debt = df[df["Duration"] > 2]
+    assert debt["Ticker"].duplicated().any()
+
+def test_find_regressions_uses_threshold():
+    baseline = {"1000": {"run_stress_test": {"seconds": 0.1, "peak_bytes": 10_000_000}}}
+    ok = {"1000": {"run_stress_test": {"seconds": 0.12, "peak_bytes": 11_000_000}}}
+    slow = {"1000": {"run_stress_test": {"seconds": 0.2, "peak_bytes": 30_000_000}}}
+    assert find_regressions(ok, baseline, 0.25) == []
+    assert len(find_regressions(slow, baseline, 0.25)) == 2
@@ -0,0 +1,73 @@
+from fastapi.testclient import TestClient
+from app.main import app
+from app.core.cache import ResultCache, result_cache, upload_key, portfolio_key
+from app.core.ingest import parse_portfolio_frame
+from app.core.pipeline import analyze_frame
+
+client = TestClient(app)
+
+CSV = b"""Asset Class,Ticker,Name,Quantity,Market Price,Market Value,Sector,Duration,Rating,Liquidity Score
+Equity,AAPL,Apple Inc,100,150,15000,Technology,0,NR,95
+Debt,US10Y,US Treasury 10Y,10,100,1000,Government,10,AAA,100
+"""
+
+# Same positions, different formatting
+CSV_REFORMATTED = b"""asset class , ticker,name,quantity,market price,market value,sector,duration,rating,liquidity score
+Stock,AAPL,Apple Inc,100.0,150.00,15000.00,Technology,0.0,NR,95
+Debt,US10Y,US Treasury 10Y,10,100,1000,Government,10,AAA,100
+"""
+
+def _response():
+    return analyze_frame(parse_portfolio_frame(CSV, "p.csv"))
+
+def test_lru_eviction_and_ttl(monkeypatch):
+    cache = ResultCache(max_entries=2, ttl_seconds=10)
+    r = _response()
+    cache.put("a", r)
+    cache.put("b", r)
+    assert cache.get("a") is r # a is now most recent
+    cache.put("c", r)
+    assert cache.get("b") is None
+    assert cache.stats().evictions == 1
+
+    import app.core.cache as cache_module
+    now = cache_module.time.time()
+    monkeypatch.setattr(cache_module.time, "time", lambda: now + 11)
+    assert cache.get("a") is None
+    assert cache.stats().expirations == 1
+
+def test_sqlite_tier_survives_restart(tmp_path):
+    db = str(tmp_path / "cache.sqlite3")
+    r = _response()
+    ResultCache(max_entries=4, ttl_seconds=60, db_path=db).put("k", r)
+
+    restarted = ResultCache(max_entries=4, ttl_seconds=60, db_path=db)
+    assert restarted.get("k") == r
+    assert restarted.stats().disk_hits == 1
+    assert restarted.get("k") == r
+    assert restarted.stats().hits == 1
+    assert restarted.invalidate() == 2 # memory + disk
+
+def test_keys_normalize_formatting():
+    assert upload_key(CSV) != upload_key(CSV_REFORMATTED)
+    assert portfolio_key(parse_portfolio_frame(CSV, "a.csv")) == portfolio_key(parse_portfolio_frame(CSV_REFORMATTED, "b.csv"))
+
+def test_analyze_uses_cache():
+    client.post("/api/cache/invalidate")
+    files = {'file': ('portfolio.csv', CSV, 'text/csv')}
+    start = client.get("/api/cache/stats").json()
+    first = client.post("/api/analyze", files=files).json()
+    before = client.get("/api/cache/stats").json()
+
+    second = client.post("/api/analyze", files=files).json()
+    third = client.post("/api/analyze", files={'file': ('other.csv', CSV_REFORMATTED, 'text/csv')}).json()
+    after = client.get("/api/cache/stats").json()
+
+    assert first == second == third
+    assert after["hits"] - before["hits"] == 2
+    # Each request is one lookup, although a cold one probes both keys
+    assert before["misses"] - start["misses"] == 1
+    assert after["misses"] == before["misses"]
+
+    assert client.post("/api/cache/invalidate").json()["invalidated"] > 0
+    assert result_cache.stats().entries == 0
@@ -0,0 +1,106 @@
+import json
+import numpy as np
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+import app.engine.library as library_module
+from app.core.config import settings
+from app.engine.calibration import (
+    load_factor_history, rolling_moves, worst_windows, calibrate_scenarios, CalibrationCache
+)
+from app.engine.library import ScenarioLibrary
+
+client = TestClient(app)
+
+def _history_csv(n=2000, seed=4) -> bytes:
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range("1995-01-02", periods=n)
+    equity = 1000 * np.exp(np.cumsum(rng.normal(0, 0.01, n)))
+    # A crash: -30% over 20 days
+    equity[1500:1520] *= np.linspace(1.0, 0.7, 20)
+    equity[1520:] *= 0.7
+    df = pd.DataFrame({
+        "Date": dates.strftime("%Y-%m-%d"),
+        "Equity": equity,
+        "Rate": 4 + np.cumsum(rng.normal(0, 0.03, n)),
+        "Spread": 150 + np.cumsum(rng.normal(0, 2, n)),
+    })
+    df.loc[10, "Spread"] = np.nan # Missing print, forward-filled
+    return df.to_csv(index=False).encode()
+
+def test_load_factor_history():
+    history = load_factor_history(_history_csv(), "history.csv")
+    assert len(history) == 2000
+    assert sorted(history.factors) == ["equity", "rate", "spread"]
+    assert history.factors["spread"][10] == history.factors["spread"][9]
+    with pytest.raises(ValueError):
+        load_factor_history(b"Day,Equity\n1,100\n", "bad.csv")
+
+def test_rolling_moves_match_pandas():
+    history = load_factor_history(_history_csv(), "history.csv")
+    moves, processed = rolling_moves(history, 20)
+    assert processed == len(history)
+    equity = pd.Series(history.factors["equity"])
+    np.testing.assert_allclose(moves["equity"], (equity.shift(-20) / equity - 1).dropna().to_numpy())
+    rate = pd.Series(history.factors["rate"])
+    np.testing.assert_allclose(moves["rate"], (rate.diff(20) * 100).dropna().to_numpy())
+
+def test_worst_windows_do_not_overlap():
+    moves = np.array([0.0, -0.5, -0.4, -0.3, 0.1, -0.2, np.nan, -0.45])
+    assert worst_windows(moves, 2, 3, -1.0) == [1, 7, 3]
+
+def test_calibration_finds_the_crash():
+    history = load_factor_history(_history_csv(), "history.csv")
+    scenarios = calibrate_scenarios(history, [20], top_n=2, liquidity_shock=0.5)
+    crash = scenarios[0]
+    assert crash.equity_shock < -0.25
+    assert crash.metadata["anchor"] == "equity"
+    assert 1480 <= list(history.dates.astype(str)).index(crash.metadata["start"]) <= 1520
+    assert crash.liquidity_shock == 0.5 and crash.vol_shock == 0.0
+    assert "calibrated" in crash.tags
+
+def test_cache_only_processes_appended_dates(tmp_path):
+    cache = CalibrationCache(str(tmp_path))
+    csv = _history_csv(2000)
+    lines = csv.splitlines(keepends=True)
+    partial = load_factor_history(b"".join(lines[:1801]), "history.csv")
+    full = load_factor_history(csv, "history.csv")
+
+    assert rolling_moves(partial, 20, cache)[1] == 1800
+    assert rolling_moves(partial, 20, cache)[1] == 0
+    moves, processed = rolling_moves(full, 20, cache)
+    assert processed == 200
+    reference, _ = rolling_moves(full, 20)
+    for f in reference:
+        np.testing.assert_array_equal(moves[f], reference[f])
+
+def test_calibrate_endpoint(tmp_path, monkeypatch):
+    lib = ScenarioLibrary(str(tmp_path / "library.sqlite3"))
+    monkeypatch.setattr(library_module, "_library", lib)
+    monkeypatch.setattr(settings, "CALIBRATION_CACHE_DIR", str(tmp_path / "calibration"))
+    files = {'file': ('history.csv', _history_csv(), 'text/csv')}
+    config = {"windows": [5, 20], "top_n": 2, "save": True}
+    response = client.post("/api/scenarios/calibrate", files=files, data={"config": json.dumps(config)})
+    assert response.status_code == 200
+    names = [s["name"] for s in response.json()]
+    assert len(names) == 4
+    assert [s.name for s in lib.entries("calibrated")] == names
+
+    bad = client.post("/api/scenarios/calibrate", files=files, data={"config": json.dumps({"anchor": "vol"})})
+    assert bad.status_code == 400
+    lib.close()
+
+def test_cache_replaces_the_history_it_extends(tmp_path):
+    cache = CalibrationCache(str(tmp_path))
+    lines = _history_csv(2000).splitlines(keepends=True)
+    # Daily appends: each run only processes its new date and leaves one file behind
+    for end in range(1801, 1806):
+        history = load_factor_history(b"".join(lines[:end]), "history.csv")
+        assert rolling_moves(history, 20, cache)[1] == (1800 if end == 1801 else 1)
+        assert len(list(tmp_path.glob("*.npz"))) == 1
+
+    # A history that is not an extension keeps its own file and becomes the prefix candidate
+    other = load_factor_history(b"".join(lines[:1701]), "history.csv")
+    assert rolling_moves(other, 20, cache)[1] == 1700
+    assert len(list(tmp_path.glob("*.npz"))) == 2
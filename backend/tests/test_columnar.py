@@ -0,0 +1,86 @@
+import io
+import json
+import numpy as np
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+from app.core.ingest import parse_portfolio_frame, PortfolioValidationError
+from app.engine.simulation import run_stress_test
+from app.engine.scenarios import select_scenarios
+from app.core.exposure import calculate_exposure
+from app.core.export import pnl_matrix_table
+from app.models import StressScenario
+
+pa = pytest.importorskip("pyarrow")
+import pyarrow.ipc
+import pyarrow.parquet
+
+client = TestClient(app)
+
+CSV = b"""Asset Class,Ticker,Name,Quantity,Market Price,Market Value,Sector,Duration,Rating,Liquidity Score
+Equity,AAPL,Apple Inc,100,150,15000,Technology,0,NR,95
+Debt,HY1,High Yield Co,10,90,900,Industrials,6,B,30
+Bond,US10Y,US Treasury 10Y,10,100,1000,Government,10,AAA,100
+"""
+
+def _table():
+    return pa.Table.from_pandas(pd.read_csv(io.BytesIO(CSV)), preserve_index=False)
+
+def _parquet(table):
+    sink = io.BytesIO()
+    pa.parquet.write_table(table, sink, row_group_size=2)
+    return sink.getvalue()
+
+def _arrow(table, stream=False):
+    sink = io.BytesIO()
+    with (pa.ipc.new_stream if stream else pa.ipc.new_file)(sink, table.schema) as writer:
+        writer.write_table(table, max_chunksize=2)
+    return sink.getvalue()
+
+def test_columnar_uploads_match_csv():
+    expected = parse_portfolio_frame(CSV, "p.csv").to_portfolio().model_dump()
+    table = _table()
+    for content in (_parquet(table), _arrow(table), _arrow(table, stream=True)):
+        assert parse_portfolio_frame(content, "upload.bin", chunksize=1).to_portfolio().model_dump() == expected
+
+def test_columnar_upload_validation_errors():
+    table = _table().set_column(5, "Market Value", pa.array([15000.0, -1.0, None]))
+    with pytest.raises(PortfolioValidationError) as exc:
+        parse_portfolio_frame(_parquet(table), "p.parquet")
+    assert exc.value.errors == [(2, "market_value", "must be >= 0"), (3, "market_value", "value is required")]
+
+def test_parquet_path_detected_by_extension(tmp_path):
+    path = tmp_path / "book.parquet"
+    path.write_bytes(_parquet(_table()))
+    assert len(parse_portfolio_frame(str(path), "book.parquet")) == 3
+
+def test_matrix_endpoint_returns_arrow_and_parquet():
+    frame = parse_portfolio_frame(CSV, "p.csv")
+    scenarios = select_scenarios(calculate_exposure(frame))
+    expected = run_stress_test(frame, scenarios)
+
+    files = {'file': ('p.parquet', _parquet(_table()), 'application/octet-stream')}
+    arrow = client.post("/api/analyze/matrix", files=files)
+    assert arrow.status_code == 200
+    assert arrow.headers["content-type"] == "application/vnd.apache.arrow.file"
+    table = pa.ipc.open_file(pa.BufferReader(arrow.content)).read_all()
+    assert table.column("ticker").to_pylist() == ["AAPL", "HY1", "US10Y"]
+    for r in expected:
+        assert np.round(table.column(f"pnl:{r.scenario_name}").to_numpy(), 2).tolist() == list(r.position_impacts.values())
+    meta = json.loads(table.schema.metadata[b"scenarios"])
+    assert [round(m["total_pnl"], 2) for m in meta] == [r.total_pnl for r in expected]
+
+    parquet = client.post("/api/analyze/matrix", params={"format": "parquet"}, files=files)
+    assert parquet.status_code == 200
+    assert pa.parquet.read_table(pa.BufferReader(parquet.content)).equals(table)
+
+def test_matrix_scenario_names_cannot_shadow_columns():
+    frame = parse_portfolio_frame(CSV, "p.csv")
+    table = pnl_matrix_table(frame, [StressScenario(name="ticker", description="", equity_shock=-0.1)])
+    assert table.column_names == ["ticker", "sector", "market_value", "pnl:ticker"]
+    assert table.column("ticker").to_pylist() == ["AAPL", "HY1", "US10Y"]
+
+    twice = [StressScenario(name="Crash", description="", equity_shock=s) for s in (-0.1, -0.2)]
+    with pytest.raises(ValueError, match="Duplicate scenario names: Crash"):
+        pnl_matrix_table(frame, twice)
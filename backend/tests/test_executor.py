@@ -0,0 +1,74 @@
+import asyncio
+import json
+import time
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+import app.core.audit as audit
+from app.main import app
+from app.core.executor import AdmissionController, run_cpu_bound
+from app.core.config import settings
+
+CSV = b"""Asset Class,Ticker,Name,Quantity,Market Price,Market Value,Sector,Duration,Rating,Liquidity Score
+Equity,AAPL,Apple Inc,100,150,15000,Technology,0,NR,95
+"""
+
+def test_admission_rejects_when_lane_full(monkeypatch):
+    monkeypatch.setattr(settings, "MAX_CONCURRENT_LARGE", 1)
+    monkeypatch.setattr(settings, "MAX_WAITING_LARGE", 1)
+    monkeypatch.setattr(settings, "LARGE_UPLOAD_BYTES", 100)
+    controller = AdmissionController()
+
+    async def scenario():
+        release = asyncio.Event()
+
+        async def hold(size):
+            async with controller.slot(size):
+                await release.wait()
+
+        first = asyncio.create_task(hold(1000)) # runs
+        await asyncio.sleep(0)
+        second = asyncio.create_task(hold(1000)) # waits
+        await asyncio.sleep(0)
+        with pytest.raises(HTTPException) as e:
+            async with controller.slot(1000):
+                pass
+        assert e.value.status_code == 503
+
+        # Small requests have their own lane and are unaffected
+        async with controller.slot(10):
+            assert controller.stats()["small"]["active"] == 1
+
+        release.set()
+        await asyncio.gather(first, second)
+        assert controller.stats()["large"] == {"active": 0, "waiting": 0, "max_concurrent": 1}
+
+    asyncio.run(scenario())
+
+def test_cpu_bound_work_does_not_block_loop():
+    async def scenario():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.001)
+
+        t = asyncio.create_task(ticker())
+        await run_cpu_bound(time.sleep, 0.1)
+        t.cancel()
+        return ticks
+
+    assert asyncio.run(scenario()) > 10
+
+def test_audit_queue_flushes_on_shutdown(tmp_path, monkeypatch):
+    log_file = tmp_path / "audit.jsonl"
+    monkeypatch.setattr(audit, "AUDIT_FILE", str(log_file))
+    with TestClient(app) as client:
+        for _ in range(3):
+            files = {'file': ('queued.csv', CSV, 'text/csv')}
+            assert client.post("/api/analyze", files=files).status_code == 200
+        assert client.get("/health").status_code == 200
+    entries = [json.loads(line) for line in log_file.read_text().splitlines()]
+    assert [e["input_file"] for e in entries] == ["queued.csv"] * 3
@@ -0,0 +1,44 @@
+from app.models import Portfolio
+from app.core.frame import PortfolioFrame, as_frame
+from app.core.ingest import parse_portfolio_csv, parse_portfolio_frame
+from app.core.exposure import calculate_exposure
+from app.engine.scenarios import SCENARIOS_DB
+from app.engine.simulation import run_stress_test
+from tests.test_vectorized import _random_portfolio
+
+CSV = b"""Asset Class,Ticker,Name,Quantity,Market Price,Market Value,Sector,Duration,Rating,Liquidity Score
+Equity,AAPL,Apple Inc,100,150,15000,Technology,0,NR,95
+Debt,US10Y,US Treasury 10Y,10,100,1000,Government,10,AAA,100
+Equity,AAPL,Apple Inc,10,150,1500,Technology,0,NR,95
+"""
+
+def test_frame_interns_labels():
+    frame = parse_portfolio_frame(CSV, "test.csv")
+    assert len(frame) == 3
+    assert frame.ticker_labels == ["AAPL", "US10Y"]
+    assert frame.ticker_code.tolist() == [0, 1, 0]
+    assert frame.sector_labels == ["Technology", "Government"]
+    assert frame.total_value == 17500
+
+def test_frame_round_trips_portfolio():
+    p = _random_portfolio(120)
+    frame = PortfolioFrame.from_portfolio(p)
+    assert as_frame(frame) is frame
+
+    # Fresh frame built from columns only must rebuild the same model
+    rebuilt = PortfolioFrame.concat([frame, PortfolioFrame.from_portfolio(Portfolio(
+        positions=[], total_value=0, as_of_date=p.as_of_date))], p.as_of_date).to_portfolio()
+    assert rebuilt.model_dump() == p.model_dump()
+
+def test_frame_and_portfolio_give_same_results():
+    p = parse_portfolio_csv(CSV, "test.csv")
+    frame = parse_portfolio_frame(CSV, "test.csv")
+    assert calculate_exposure(frame) == calculate_exposure(p)
+    assert run_stress_test(frame, SCENARIOS_DB) == run_stress_test(p, SCENARIOS_DB)
+
+def test_chunked_frames_concat():
+    whole = parse_portfolio_frame(CSV, "test.csv")
+    chunked = parse_portfolio_frame(CSV, "test.csv", chunksize=1)
+    assert chunked.ticker_labels == whole.ticker_labels
+    assert chunked.ticker_code.tolist() == whole.ticker_code.tolist()
+    assert chunked.to_portfolio().positions == whole.to_portfolio().positions
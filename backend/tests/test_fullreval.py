@@ -0,0 +1,109 @@
+import math
+import numpy as np
+from fastapi.testclient import TestClient
+from app.main import app
+from app.models import StressScenario
+from app.core.ingest import parse_portfolio_frame, PortfolioValidationError
+from app.core.frame import PortfolioFrame
+from app.engine.fullreval import black_scholes, norm_cdf
+from app.engine.matrix import evaluate_scenario_matrix, scenario_matrix
+from app.engine.simulation import run_stress_test
+from app.engine.scenarios import SCENARIOS_DB
+from tests.test_vectorized import _random_portfolio
+import pytest
+
+client = TestClient(app)
+
+CSV = b"""Asset Class,Ticker,Name,Quantity,Market Price,Market Value,Sector,Duration,Rating,Liquidity Score,Option Type,Strike,Expiry,Vol,Underlying Price,Beta,Convexity
+Equity,AAPL,Apple Inc,100,150,15000,Technology,0,NR,95,,,,,,1.3,
+Debt,UST30,US Treasury 30Y,100,100,10000,Government,18,AAA,100,,,,,,,420
+Debt,HY1,High Yield Co,10,90,900,Industrials,6,B,30,,,,,,,
+Option,SPXP,SPX Put,10,50,500,Index,0,NR,90,put,4000,0.5,0.2,4200,1.0,
+Derivative,FUT,Index Future,1,1000,1000,Index,0,NR,95,,,,,,,
+"""
+
+def _bs_reference(s, k, t, r, v, call):
+    d1 = (math.log(s / k) + (r + 0.5 * v * v) * t) / (v * math.sqrt(t))
+    d2 = d1 - v * math.sqrt(t)
+    n = lambda x: 0.5 * (1 + math.erf(x / math.sqrt(2)))
+    if call:
+        return s * n(d1) - k * math.exp(-r * t) * n(d2)
+    return k * math.exp(-r * t) * n(-d2) - s * n(-d1)
+
+def test_black_scholes_prices():
+    spot = np.array([80.0, 100.0, 120.0, 100.0])
+    strike = np.array([100.0, 100.0, 100.0, 90.0])
+    expiry = np.array([0.25, 1.0, 2.0, 0.1])
+    vol = np.array([0.3, 0.2, 0.25, 0.6])
+    kind = np.array([1.0, -1.0, 1.0, -1.0])
+    price = black_scholes(spot, strike, expiry, 0.03, vol, kind)
+    for i in range(4):
+        assert price[i] == pytest.approx(_bs_reference(spot[i], strike[i], expiry[i], 0.03, vol[i], kind[i] > 0), abs=1e-5)
+
+    # Put-call parity
+    call = black_scholes(spot, strike, expiry, 0.03, vol, 1.0)
+    put = black_scholes(spot, strike, expiry, 0.03, vol, -1.0)
+    np.testing.assert_allclose(call - put, spot - strike * np.exp(-0.03 * expiry), atol=1e-5)
+    assert norm_cdf(np.array([0.0]))[0] == pytest.approx(0.5)
+
+def test_full_reval_matches_linear_equity_and_adds_convexity():
+    # No term columns: equity, derivative and liquidity legs are unchanged
+    frame = PortfolioFrame.from_portfolio(_random_portfolio(200, seed=9))
+    shocks = scenario_matrix(SCENARIOS_DB)
+    linear = evaluate_scenario_matrix(frame, shocks)
+    full = evaluate_scenario_matrix(frame, shocks, revaluation="full")
+    np.testing.assert_array_equal(full.attribution[:, 0], linear.attribution[:, 0])
+    np.testing.assert_array_equal(full.attribution[:, 3], linear.attribution[:, 3])
+
+    # Convexity is positive: full reval is always above the linear estimate on rates
+    assert np.all(full.attribution[:, 1] >= linear.attribution[:, 1] - 1e-9)
+
+def test_full_reval_terms_from_csv():
+    frame = parse_portfolio_frame(CSV, "terms.csv")
+    assert frame.term("option_type").tolist()[3] == -1.0
+    crash = StressScenario(name="Crash", description="", equity_shock=-0.3, rate_shock=-200, vol_shock=0.2)
+    linear = run_stress_test(frame, [crash])[0].position_impacts
+    full = run_stress_test(frame, [crash], revaluation="full")[0].position_impacts
+
+    # Beta-scaled equity, untouched future
+    assert full["AAPL"] == round(15000 * 1.3 * -0.3, 2)
+    assert full["FUT"] == linear["FUT"]
+    # Long bond gains more than duration alone under a 200bp rally
+    dy = -0.02
+    assert full["UST30"] == round(10000 * (-18 * dy + 0.5 * 420 * dy * dy), 2)
+    assert full["UST30"] > linear["UST30"]
+    # The put gains in a crash (the linear model books it as a loss)
+    base = black_scholes(4200.0, 4000.0, 0.5, 0.04, 0.2, -1.0)
+    shocked = black_scholes(4200.0 * 0.7, 4000.0, 0.5, 0.02, 0.4, -1.0)
+    assert full["SPXP"] == pytest.approx(500 * (shocked / base - 1), abs=0.01)
+    assert full["SPXP"] > 0 > linear["SPXP"]
+
+def test_invalid_terms_are_reported():
+    bad = CSV.replace(b"put,4000", b"straddle,-5")
+    with pytest.raises(PortfolioValidationError) as exc:
+        parse_portfolio_frame(bad, "bad.csv")
+    assert (4, "option_type", "must be call or put") in exc.value.errors
+    assert (4, "strike", "must be > 0") in exc.value.errors
+
+def test_analyze_endpoint_full_revaluation():
+    files = {'file': ('terms.csv', CSV, 'text/csv')}
+    linear = client.post("/api/analyze", files=files).json()
+    full = client.post("/api/analyze", params={"revaluation": "full"}, files=files).json()
+    assert [r["scenario_name"] for r in full["simulation_results"]] == [r["scenario_name"] for r in linear["simulation_results"]]
+    assert full["simulation_results"] != linear["simulation_results"]
+    assert client.post("/api/analyze", params={"revaluation": "cubic"}, files=files).status_code == 422
+
+def test_expired_option_dates_are_valued_at_intrinsic():
+    expired = CSV.replace(b"put,4000,0.5,0.2,4200", b"put,4400,2025-01-17,0.2,4200")
+    frame = parse_portfolio_frame(expired, "expired.csv")
+    assert frame.term("expiry").tolist()[3] == 0.0
+    crash = StressScenario(name="Crash", description="", equity_shock=-0.3, rate_shock=-200, vol_shock=0.2)
+    full = run_stress_test(frame, [crash], revaluation="full")[0].position_impacts
+    # Intrinsic 200 -> 4400 - 2940 = 1460, booked at 500
+    assert full["SPXP"] == pytest.approx(500 * (1460 / 200 - 1), abs=0.01)
+    assert full["AAPL"] == round(15000 * 1.3 * -0.3, 2)
+
+    # A number of years must still be positive
+    with pytest.raises(PortfolioValidationError) as exc:
+        parse_portfolio_frame(CSV.replace(b"put,4000,0.5", b"put,4000,0"), "bad.csv")
+    assert (4, "expiry", "must be > 0") in exc.value.errors
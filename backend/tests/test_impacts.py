@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+from app.models import ImpactQuery
+from app.core.frame import PortfolioFrame
+from app.engine.impacts import PositionImpacts
+from app.engine.matrix import evaluate_scenario_matrix
+from app.engine.scenarios import SCENARIOS_DB
+from app.engine.simulation import run_stress_test
+from tests.test_vectorized import _random_portfolio
+
+client = TestClient(app)
+
+CSV = b"""Asset Class,Ticker,Name,Quantity,Market Price,Market Value,Sector,Duration,Rating,Liquidity Score
+Equity,AAPL,Apple Inc,100,150,15000,Technology,0,NR,95
+Equity,AAPL,Apple Inc (2nd lot),10,150,1500,Technology,0,NR,95
+Debt,HY1,High Yield Co,10,90,900,Industrials,6,B,30
+Debt,US10Y,US Treasury 10Y,10,100,1000,Government,10,AAA,100
+"""
+
+def _impacts(n=400, seed=8):
+    frame = PortfolioFrame.from_portfolio(_random_portfolio(n, seed=seed))
+    pnl = evaluate_scenario_matrix(frame, np.array([[-0.3, 150.0, 300.0, 0.2]])).pnl[0]
+    by_ticker = {}
+    for t, v in zip(frame.tickers, pnl.tolist()):
+        by_ticker[t] = by_ticker.get(t, 0.0) + v
+    return frame, PositionImpacts(frame, pnl), by_ticker
+
+def test_duplicate_tickers_are_added_up():
+    frame, impacts, by_ticker = _impacts()
+    assert impacts.to_dict() == {t: round(v, 2) for t, v in by_ticker.items()}
+    assert len(impacts.to_dict()) < len(frame)
+
+def test_top_k_and_threshold_queries():
+    _, impacts, by_ticker = _impacts()
+    worst = impacts.query(ImpactQuery(top_k=10, order="worst"))
+    assert list(worst) == sorted(by_ticker, key=by_ticker.get)[:10]
+    best = impacts.query(ImpactQuery(top_k=5, order="best"))
+    assert list(best) == sorted(by_ticker, key=by_ticker.get, reverse=True)[:5]
+    largest = impacts.query(ImpactQuery(top_k=7))
+    assert list(largest) == sorted(by_ticker, key=lambda t: -abs(by_ticker[t]))[:7]
+
+    beyond = impacts.query(ImpactQuery(order="worst", threshold=20000))
+    assert set(beyond) == {t for t, v in by_ticker.items() if v <= -20000}
+    assert list(beyond.values()) == sorted(beyond.values())
+    assert impacts.query(ImpactQuery(order="worst", threshold=1e12)) == {}
+
+def test_rollups():
+    frame, impacts, _ = _impacts()
+    sectors = impacts.rollup("sector")
+    assert sum(sectors.values()) == pytest.approx(impacts.pnl.sum(), abs=0.05)
+    assert set(sectors) == set(frame.sector_labels)
+    assert impacts.rollup("issuer") == impacts.to_dict()
+
+def test_run_stress_test_with_query():
+    frame = PortfolioFrame.from_portfolio(_random_portfolio(200, seed=9))
+    query = ImpactQuery(top_k=3, order="worst", rollup=["sector", "rating"])
+    full = run_stress_test(frame, SCENARIOS_DB)
+    narrowed = run_stress_test(frame, SCENARIOS_DB, impact_query=query)
+    for f, r in zip(full, narrowed):
+        assert r.total_pnl == f.total_pnl and len(r.position_impacts) == 3
+        assert list(r.position_impacts.values()) == sorted(f.position_impacts.values())[:3]
+        assert set(r.impact_rollups) == {"sector", "rating"}
+        assert f.impact_rollups is None
+
+def test_analyze_query_parameters():
+    files = {'file': ('p.csv', CSV, 'text/csv')}
+    full = client.post("/api/analyze", files=files).json()
+    assert all(set(r["position_impacts"]) == {"AAPL", "HY1", "US10Y"} for r in full["simulation_results"])
+
+    body = client.post("/api/analyze", files=files,
+                       params={"top_k": 1, "impact_order": "worst", "rollup": ["sector", "issuer"]}).json()
+    for r, f in zip(body["simulation_results"], full["simulation_results"]):
+        worst = min(f["position_impacts"], key=f["position_impacts"].get)
+        assert r["position_impacts"] == {worst: f["position_impacts"][worst]}
+        assert r["impact_rollups"]["issuer"] == f["position_impacts"]
+        assert sum(r["impact_rollups"]["sector"].values()) == pytest.approx(r["total_pnl"], abs=0.02)
+
+    assert client.post("/api/analyze", files=files, params={"rollup": "ticker"}).status_code == 422
@@ -0,0 +1,138 @@
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+from app.models import Portfolio, PortfolioPosition, PortfolioDelta, PositionUpdate
+from app.core.frame import PortfolioFrame
+from app.core.exposure import calculate_exposure
+from app.engine.scenarios import select_scenarios
+from app.core.pipeline import build_explanation
+from app.engine.simulation import run_stress_test
+from app.engine.incremental import IncrementalAnalysis
+from tests.test_vectorized import _random_portfolio
+
+client = TestClient(app)
+
+def _full(positions):
+    p = Portfolio(positions=positions, total_value=sum(x.market_value for x in positions), as_of_date="2024-01-01")
+    exposure = calculate_exposure(p)
+    return exposure, run_stress_test(p, select_scenarios(exposure))
+
+def test_delta_matches_full_recompute():
+    p = _random_portfolio(400, seed=5)
+    for pos in p.positions:
+        pos.rating = pos.rating or "NR"
+    state = IncrementalAnalysis("pid", PortfolioFrame.from_portfolio(p))
+
+    tickers = list(dict.fromkeys(pos.ticker for pos in p.positions))
+    new_pos = PortfolioPosition(
+        asset_class="Debt", ticker="NEW", name="New Bond", quantity=100, market_price=99,
+        market_value=9900, sector="Utilities", duration=7, rating="BB", liquidity_score=40
+    )
+    delta = PortfolioDelta(
+        add=[new_pos],
+        remove=[tickers[0], tickers[1]],
+        update=[PositionUpdate(ticker=tickers[2], quantity=5), PositionUpdate(ticker=tickers[3], market_price=1.5)]
+    )
+    result = state.apply(delta)
+
+    # Rebuild the changed book from scratch; the new quantity is split across the ticker's lines
+    held = sum(pos.quantity for pos in p.positions if pos.ticker == tickers[2])
+    positions = []
+    for pos in p.positions:
+        if pos.ticker in (tickers[0], tickers[1]):
+            continue
+        if pos.ticker == tickers[2]:
+            pos = pos.model_copy(update={"quantity": pos.quantity * 5 / held, "market_value": pos.market_value * 5 / held})
+        if pos.ticker == tickers[3]:
+            pos = pos.model_copy(update={"market_price": 1.5, "market_value": pos.quantity * 1.5})
+        positions.append(pos)
+    positions.append(new_pos)
+    exposure, results = _full(positions)
+
+    assert result.position_count == len(positions)
+    assert result.exposure_report.by_sector == exposure.by_sector
+    assert result.exposure_report.by_rating == exposure.by_rating
+    assert result.exposure_report.weighted_average_duration == exposure.weighted_average_duration
+    assert sorted(result.exposure_report.concentration_alerts) == sorted(exposure.concentration_alerts)
+    assert [s.name for s in result.selected_scenarios] == [r.scenario_name for r in results]
+    for inc, full in zip(result.simulation_results, results):
+        assert inc["total_pnl"] == pytest.approx(full.total_pnl, abs=0.02)
+        assert set(inc["position_impacts"]) == {tickers[2], tickers[3], "NEW"}
+        assert inc["position_impacts"]["NEW"] == full.position_impacts["NEW"]
+    assert result.risk_explanation == build_explanation(exposure, select_scenarios(exposure), results)
+
+def test_reselection_only_when_threshold_crossed():
+    p = Portfolio(positions=[
+        PortfolioPosition(asset_class="Equity", ticker="A", name="A", quantity=10, market_price=10,
+                          market_value=100, sector="Energy", duration=0, rating="AAA", liquidity_score=100),
+        PortfolioPosition(asset_class="Debt", ticker="B", name="B", quantity=10, market_price=10,
+                          market_value=100, sector="Gov", duration=8, rating="AAA", liquidity_score=100),
+    ], total_value=200, as_of_date="2024-01-01")
+    state = IncrementalAnalysis("pid", PortfolioFrame.from_portfolio(p))
+
+    small = state.apply(PortfolioDelta(update=[PositionUpdate(ticker="A", quantity=11)]))
+    assert not small.scenarios_reselected
+
+    # Push duration above 5 -> Inflation Shock gets selected
+    big = state.apply(PortfolioDelta(update=[PositionUpdate(ticker="B", quantity=1000)]))
+    assert big.scenarios_reselected
+    assert "Inflation Shock (1970s style)" in [s.name for s in big.selected_scenarios]
+
+    with pytest.raises(ValueError):
+        state.apply(PortfolioDelta(remove=["ZZZ"]))
+
+def test_delta_endpoint():
+    csv_content = b"""Asset Class,Ticker,Name,Quantity,Market Price,Market Value,Sector,Duration,Rating,Liquidity Score
+Equity,AAPL,Apple Inc,100,150,15000,Technology,0,NR,95
+Debt,US10Y,US Treasury 10Y,10,100,1000,Government,10,AAA,100
+"""
+    files = {'file': ('portfolio.csv', csv_content, 'text/csv')}
+    data = client.post("/api/analyze?track=true", files=files).json()
+    pid = data["portfolio_id"]
+    assert pid
+
+    response = client.post(f"/api/portfolios/{pid}/delta", json={"remove": ["AAPL"]})
+    assert response.status_code == 200
+    body = response.json()
+    assert body["total_value"] == 1000
+    assert body["exposure_report"]["by_sector"] == {"Government": 1.0}
+
+    assert client.post("/api/portfolios/nope/delta", json={}).status_code == 404
+    assert client.post(f"/api/portfolios/{pid}/delta", json={"remove": ["AAPL"]}).status_code == 400
+
+def test_duplicate_removes_rejected_without_changing_state():
+    csv_content = b"""Asset Class,Ticker,Name,Quantity,Market Price,Market Value,Sector,Duration,Rating,Liquidity Score
+Equity,AAPL,Apple Inc,100,150,15000,Technology,0,NR,95
+Debt,US10Y,US Treasury 10Y,10,100,1000,Government,10,AAA,100
+"""
+    files = {'file': ('portfolio.csv', csv_content, 'text/csv')}
+    pid = client.post("/api/analyze?track=true", files=files).json()["portfolio_id"]
+
+    response = client.post(f"/api/portfolios/{pid}/delta", json={"remove": ["AAPL", "AAPL"]})
+    assert response.status_code == 400
+
+    # The rejected delta left the tracked book untouched
+    body = client.post(f"/api/portfolios/{pid}/delta", json={}).json()
+    assert body["total_value"] == 16000
+    assert body["position_count"] == 2
+    assert set(body["exposure_report"]["by_sector"]) == {"Technology", "Government"}
+
+def test_updates_rescale_booked_value_and_split_quantity():
+    p = Portfolio(positions=[
+        # Quoted per 100: market value is not quantity x price
+        PortfolioPosition(asset_class="Debt", ticker="UST", name="UST", quantity=10000, market_price=98.5,
+                          market_value=9850, sector="Gov", duration=8, rating="AAA", liquidity_score=100),
+        PortfolioPosition(asset_class="Equity", ticker="A", name="A lot 1", quantity=30, market_price=10,
+                          market_value=300, sector="Tech", duration=0, rating="NR", liquidity_score=100),
+        PortfolioPosition(asset_class="Equity", ticker="A", name="A lot 2", quantity=10, market_price=10,
+                          market_value=100, sector="Tech", duration=0, rating="NR", liquidity_score=100),
+    ], total_value=10250, as_of_date="2024-01-01")
+    state = IncrementalAnalysis("pid", PortfolioFrame.from_portfolio(p))
+
+    result = state.apply(PortfolioDelta(update=[PositionUpdate(ticker="UST", market_price=99.0)]))
+    assert result.total_value == pytest.approx(10250 + 9850 * (99.0 / 98.5 - 1), abs=0.01)
+
+    # The new quantity is the ticker's total holding, split 3:1 across its lines
+    result = state.apply(PortfolioDelta(update=[PositionUpdate(ticker="A", quantity=80)]))
+    assert [pos.quantity for pos in state.positions["A"]] == [60, 20]
+    assert result.total_value == pytest.approx(9850 * 99.0 / 98.5 + 800, abs=0.01)
@@ -1,6 +1,6 @@
 from fastapi.testclient import TestClient
 from app.main import app
-from app.core.ingest import parse_portfolio_csv
+from app.core.ingest import parse_portfolio_csv, PortfolioValidationError
 import io
 
 client = TestClient(app)
@@ -37,3 +37,45 @@ Equity,AAPL,Apple Inc,100,150,15000
         assert False, "Should have raised ValidationError"
     except Exception:
         assert True
+
+def test_parse_asset_class_mapping_and_defaults():
+    csv_content = b"""Asset Class,Ticker,Name,Quantity,Market Price,Market Value,Sector,Duration,Rating,Liquidity Score
+Fixed Income,UST,Treasury,1,100,100,Government,9.5,AAA,10
+wc,C,Citigroup,1,45,45,Financials,,,9
+High Yield Bonds,HYB,HY Fund,1,45,45,Financials,4.5,BB,7
+Derivative,OPT,Option,1,5,5,Technology,0,NR,50
+Mystery,X,Unknown,1,1,1,Other,0,NR,50
+"""
+    portfolio = parse_portfolio_csv(csv_content, "test.csv")
+    classes = [p.asset_class.value for p in portfolio.positions]
+    assert classes == ["Debt", "Cash", "Debt", "Derivative", "Equity"]
+    assert portfolio.positions[1].duration == 0.0
+    assert portfolio.positions[1].rating.value == "NR"
+
+def test_parse_reports_per_row_errors():
+    csv_content = b"""Asset Class,Ticker,Name,Quantity,Market Price,Market Value,Sector,Duration,Rating,Liquidity Score
+Equity,AAPL,Apple Inc,100,150,15000,Technology,0,NR,95
+Equity,BAD,Bad Inc,-1,150,abc,Technology,0,ZZZ,150
+"""
+    try:
+        parse_portfolio_csv(csv_content, "bad.csv")
+        assert False, "Should have raised PortfolioValidationError"
+    except PortfolioValidationError as e:
+        columns = {c for row, c, _ in e.errors if row == 2}
+        assert columns == {"quantity", "market_value", "rating", "liquidity_score"}
+        assert "row 2" in str(e)
+
+def test_parse_chunked_matches_single_pass(tmp_path):
+    lines = ["Asset Class,Ticker,Name,Quantity,Market Price,Market Value,Sector,Duration,Rating,Liquidity Score"]
+    for i in range(250):
+        lines.append(f"Bond,B{i},Bond {i},{i},1.1,{i * 1.1},Financials,{i % 9},BBB,{i % 100}")
+    csv_content = ("\n".join(lines) + "\n").encode()
+
+    whole = parse_portfolio_csv(csv_content, "big.csv")
+    path = tmp_path / "big.csv"
+    path.write_bytes(csv_content)
+    chunked = parse_portfolio_csv(str(path), "big.csv", chunksize=16)
+
+    assert len(chunked.positions) == 250
+    assert chunked.positions == whole.positions
+    assert chunked.total_value == whole.total_value
@@ -0,0 +1,163 @@
+import time
+import threading
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+from app.core import jobs
+from app.core.config import settings
+from app.core.jobs import JobManager, JobStore
+from app.core.pipeline import analyze_frame
+from app.core.ingest import parse_portfolio_frame
+
+client = TestClient(app)
+
+CSV = b"""Asset Class,Ticker,Name,Quantity,Market Price,Market Value,Sector,Duration,Rating,Liquidity Score
+Equity,AAPL,Apple Inc,100,150,15000,Technology,0,NR,95
+Equity,MSFT,Microsoft,50,300,15000,Technology,0,NR,95
+Debt,US10Y,US Treasury 10Y,10,100,1000,Government,10,AAA,100
+"""
+
+def _wait(manager, job_id, timeout=10.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = manager.store.get(job_id)
+        if job.status in jobs.FINISHED_STATES:
+            return job
+        time.sleep(0.01)
+    raise AssertionError("job did not finish")
+
+@pytest.fixture
+def manager(tmp_path):
+    m = JobManager(str(tmp_path / "jobs.sqlite3"), workers=1)
+    yield m
+    m.shutdown()
+
+def test_job_result_matches_direct_analysis(manager):
+    job = manager.submit(CSV, "p.csv")
+    assert job.status == "queued"
+    done = _wait(manager, job.job_id)
+    assert done.status == "succeeded"
+    assert done.progress == 1.0
+
+    expected = analyze_frame(parse_portfolio_frame(CSV, "p.csv"))
+    assert manager.result(job.job_id).model_dump() == expected.model_dump()
+
+def test_failed_job_records_error(manager):
+    job = manager.submit(b"Ticker\nAAPL\n", "bad.csv")
+    done = _wait(manager, job.job_id)
+    assert done.status == "failed"
+    assert "Missing required columns" in done.error
+
+def test_cancel_running_job(manager, monkeypatch):
+    started, release = threading.Event(), threading.Event()
+    original = jobs.analyze_frame
+
+    def slow(frame, progress):
+        started.set()
+        release.wait(5)
+        return original(frame, progress)
+
+    monkeypatch.setattr(jobs, "analyze_frame", slow)
+    job = manager.submit(CSV, "p.csv")
+    assert started.wait(5)
+    assert manager.cancel(job.job_id).status == "running"
+    release.set()
+    assert _wait(manager, job.job_id).status == "cancelled"
+    assert manager.store.result_json(job.job_id) is None
+
+def test_unfinished_jobs_fail_on_restart(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    job = JobStore(path).create("p.csv")
+    restarted = JobStore(path).get(job.job_id)
+    assert restarted.status == "failed"
+    assert "restart" in restarted.error
+
+def test_jobs_api_paginates_positions(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "JOBS_DB_PATH", str(tmp_path / "jobs.sqlite3"))
+    monkeypatch.setattr(jobs, "_manager", None)
+
+    response = client.post("/api/jobs", files={'file': ('p.csv', CSV, 'text/csv')})
+    assert response.status_code == 202
+    job_id = response.json()["job_id"]
+    assert _wait(jobs.get_job_manager(), job_id).status == "succeeded"
+
+    page = client.get(f"/api/jobs/{job_id}/result", params={"offset": 1, "limit": 1}).json()
+    assert page["total_positions"] == 3
+    assert [p["ticker"] for p in page["result"]["portfolio_summary"]["positions"]] == ["MSFT"]
+    for r in page["result"]["simulation_results"]:
+        assert set(r["position_impacts"]) <= {"MSFT"}
+
+    assert client.get("/api/jobs/missing").status_code == 404
+    assert client.delete(f"/api/jobs/{job_id}").json()["status"] == "succeeded"
+    jobs.shutdown_job_manager()
+
+def test_queue_limit_rejects_with_503(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "JOBS_DB_PATH", str(tmp_path / "jobs.sqlite3"))
+    monkeypatch.setattr(settings, "JOB_WORKERS", 1)
+    monkeypatch.setattr(settings, "JOB_MAX_QUEUED", 1)
+    monkeypatch.setattr(settings, "JOB_SPOOL_DIR", str(tmp_path))
+    monkeypatch.setattr(jobs, "_manager", None)
+    started, release = threading.Event(), threading.Event()
+    original = jobs.analyze_frame
+
+    def slow(frame, progress):
+        started.set()
+        release.wait(5)
+        return original(frame, progress)
+
+    monkeypatch.setattr(jobs, "analyze_frame", slow)
+    post = lambda: client.post("/api/jobs", files={'file': ('p.csv', CSV, 'text/csv')})
+    running = post().json()["job_id"]
+    assert started.wait(5)
+    queued = post().json()["job_id"]
+    # Both uploads wait on disk, not in memory
+    assert len(list(tmp_path.glob("job-*.csv"))) == 2
+    rejected = post()
+    assert rejected.status_code == 503 and rejected.headers["Retry-After"]
+    assert len(list(tmp_path.glob("job-*.csv"))) == 2
+
+    release.set()
+    manager = jobs.get_job_manager()
+    assert {_wait(manager, j).status for j in (running, queued)} == {"succeeded"}
+    assert not list(tmp_path.glob("job-*"))
+    accepted = post()
+    assert accepted.status_code == 202
+    assert _wait(manager, accepted.json()["job_id"]).status == "succeeded"
+    jobs.shutdown_job_manager()
+
+def test_spool_files_removed_on_shutdown_and_failed_submit(tmp_path, monkeypatch):
+    manager = JobManager(str(tmp_path / "jobs.sqlite3"), workers=1)
+    started, release = threading.Event(), threading.Event()
+    original = jobs.analyze_frame
+
+    def slow(frame, progress):
+        started.set()
+        release.wait(5)
+        return original(frame, progress)
+
+    monkeypatch.setattr(jobs, "analyze_frame", slow)
+
+    def spool(name):
+        (tmp_path / name).write_bytes(CSV)
+        return str(tmp_path / name)
+
+    running = manager.submit(spool("job-a.csv"), "p.csv", delete_after=True)
+    assert started.wait(5)
+    manager.submit(spool("job-b.csv"), "p.csv", delete_after=True)
+
+    # The queued job is cancelled by shutdown and its upload removed
+    manager.shutdown()
+    assert not (tmp_path / "job-b.csv").exists()
+    release.set()
+    assert _wait(manager, running.job_id).status == "succeeded"
+    assert not list(tmp_path.glob("job-*"))
+
+    failing = JobManager(str(tmp_path / "jobs2.sqlite3"), workers=1, max_queued=1)
+    monkeypatch.setattr(failing.store, "create", lambda filename: (_ for _ in ()).throw(OSError("disk full")))
+    with pytest.raises(OSError):
+        failing.submit(spool("job-c.csv"), "p.csv", delete_after=True)
+    assert not (tmp_path / "job-c.csv").exists()
+    # The reserved queue slot was released
+    monkeypatch.undo()
+    assert _wait(failing, failing.submit(CSV, "p.csv").job_id).status == "succeeded"
+    failing.shutdown()
@@ -0,0 +1,137 @@
+import random
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+import app.engine.library as library_module
+from app.models import ExposureReport, LibraryScenario, SelectionRule
+from app.core.cache import result_cache, scenario_fingerprint
+from app.engine.library import ScenarioLibrary, ScenarioInUse
+from app.engine.matrix import build_scenario_matrix, scenario_matrix
+from app.engine.scenarios import SCENARIOS_DB, select_scenarios
+
+client = TestClient(app)
+
+CSV = b"""Asset Class,Ticker,Name,Quantity,Market Price,Market Value,Sector,Duration,Rating,Liquidity Score
+Equity,AAPL,Apple Inc,100,150,15000,Technology,0,NR,95
+Debt,UST10,US Treasury 10Y,100,100,10000,Government,8,AAA,100
+"""
+
+@pytest.fixture
+def library(tmp_path, monkeypatch):
+    lib = ScenarioLibrary(str(tmp_path / "library.sqlite3"))
+    monkeypatch.setattr(library_module, "_library", lib)
+    yield lib
+    lib.close()
+
+def _reference_selection(exposure: ExposureReport):
+    # The original hardcoded selection logic
+    selected = [SCENARIOS_DB[0]]
+    if exposure.by_sector.get('Technology', 0.0) + exposure.by_sector.get('Tech', 0.0) > 0.20:
+        selected.append(SCENARIOS_DB[4])
+    if exposure.weighted_average_duration > 5.0:
+        selected.append(SCENARIOS_DB[2])
+    if sum(w for r, w in exposure.by_rating.items() if r in ['BB', 'B', 'CCC', 'NR']) > 0.30:
+        selected.append(SCENARIOS_DB[3])
+    return [s.name for s in selected]
+
+def test_default_rules_match_original_selection(library):
+    rng = random.Random(3)
+    for _ in range(300):
+        report = ExposureReport(
+            by_asset_class={},
+            by_sector={s: round(rng.random() * 0.4, 2) for s in rng.sample(["Technology", "Tech", "Energy"], 2)},
+            by_rating={r: round(rng.random() * 0.3, 2) for r in rng.sample(["AAA", "BB", "B", "NR"], 3)},
+            weighted_average_duration=rng.choice([2.0, 5.0, 7.5]),
+            liquidity_profile=90
+        )
+        assert [s.name for s in library.select(report)] == _reference_selection(report)
+
+def test_rule_index_fires_by_threshold(library):
+    for i, threshold in enumerate([1.0, 3.0, 6.0]):
+        library.put_rule(SelectionRule(name=f"dur_{i}", metric="weighted_average_duration", threshold=threshold,
+                                       scenarios=["Dotcom Bubble Burst (2000)"], priority=10))
+    library.put_rule(SelectionRule(name="illiquid", metric="liquidity_profile", operator="<", threshold=50,
+                                   scenarios=["Covid-19 Crash (2020)"], priority=-1))
+    report = ExposureReport(by_asset_class={}, by_sector={}, by_rating={},
+                            weighted_average_duration=2.0, liquidity_profile=40)
+    assert [s.name for s in library.select(report)] == [
+        "Covid-19 Crash (2020)", "Global Financial Crisis (2008)", "Dotcom Bubble Burst (2000)"
+    ]
+
+def test_shock_matrix_is_cached(library):
+    scenarios = library.scenarios()
+    cached = scenario_matrix(scenarios)
+    np.testing.assert_array_equal(cached, build_scenario_matrix(scenarios))
+    # Copies (e.g. from a request body) are rebuilt rather than trusted
+    copies = [s.model_copy(update={"equity_shock": -0.9}) for s in scenarios]
+    assert scenario_matrix(copies)[0, 0] == -0.9
+
+def test_crud_and_versioning(library):
+    before = scenario_fingerprint()
+    new = LibraryScenario(name="Rates +500", description="Parallel shift", equity_shock=-0.1, rate_shock=500,
+                          tags=["regulatory", "rates"], metadata={"source": "internal"})
+    library.put_scenario(new)
+    assert scenario_fingerprint() != before
+    assert library.get("Rates +500").metadata == {"source": "internal"}
+    assert [s.name for s in library.entries("rates")] == ["Inflation Shock (1970s style)", "Rates +500"]
+
+    with pytest.raises(ScenarioInUse):
+        library.delete_scenario("Tech Wreck")
+    with pytest.raises(ValueError):
+        library.put_rule(SelectionRule(name="bad", metric="always", scenarios=["Missing"]))
+    library.delete_scenario("Rates +500")
+    with pytest.raises(KeyError):
+        library.get("Rates +500")
+
+def test_library_persists(tmp_path):
+    path = str(tmp_path / "library.sqlite3")
+    lib = ScenarioLibrary(path)
+    lib.put_scenario(LibraryScenario(name="Custom", description="", equity_shock=-0.05))
+    fingerprint = lib.fingerprint
+    lib.close()
+
+    reopened = ScenarioLibrary(path)
+    assert reopened.get("Custom").equity_shock == -0.05
+    assert reopened.fingerprint == fingerprint
+    assert len(reopened.scenarios()) == len(SCENARIOS_DB) + 1
+    reopened.close()
+
+def test_scenario_endpoints(library):
+    assert len(client.get("/api/scenarios").json()) == len(SCENARIOS_DB)
+    assert [s["name"] for s in client.get("/api/scenarios", params={"tag": "technology"}).json()] == [
+        "Dotcom Bubble Burst (2000)", "Tech Wreck"
+    ]
+    body = {"name": "Oil Spike", "description": "", "equity_shock": -0.15, "tags": ["commodities"]}
+    assert client.put("/api/scenarios/Oil Spike", json=body).status_code == 200
+    assert client.put("/api/scenarios/Other", json=body).status_code == 400
+    assert client.get("/api/scenarios/Oil Spike").json()["tags"] == ["commodities"]
+
+    response = client.put("/api/scenario_sets/energy", json={"name": "energy", "scenarios": ["Oil Spike", "Nope"]})
+    assert response.status_code == 400
+    assert client.put("/api/scenario_sets/energy", json={"name": "energy", "scenarios": ["Oil Spike"]}).status_code == 200
+    assert client.delete("/api/scenarios/Oil Spike").status_code == 409
+    assert client.delete("/api/scenario_sets/energy").status_code == 200
+    assert client.delete("/api/scenarios/Oil Spike").status_code == 200
+    assert client.get("/api/scenarios/Oil Spike").status_code == 404
+
+    assert [r["name"] for r in client.get("/api/selection_rules").json()][0] == "broad_market_crash"
+    assert client.delete("/api/selection_rules/nope").status_code == 404
+
+def test_analyze_with_scenario_set(library):
+    result_cache.invalidate()
+    files = {'file': ('p.csv', CSV, 'text/csv')}
+    selected = client.post("/api/analyze", files=files).json()
+    historical = client.post("/api/analyze", params={"scenario_set": "historical"}, files=files).json()
+    assert [s["name"] for s in historical["selected_scenarios"]] == [s.name for s in SCENARIOS_DB[:4]]
+    assert [s["name"] for s in selected["selected_scenarios"]] == [s.name for s in select_scenarios(
+        ExposureReport(**selected["exposure_report"])
+    )]
+    assert client.post("/api/analyze", params={"scenario_set": "nope"}, files=files).status_code == 404
+
+    # Editing a scenario invalidates cached results that used it
+    gfc = library.get("Global Financial Crisis (2008)")
+    assert client.get("/api/scenario_sets/historical").json()[0]["equity_shock"] == gfc.equity_shock
+    library.put_scenario(gfc.model_copy(update={"equity_shock": -0.6}))
+    again = client.post("/api/analyze", params={"scenario_set": "historical"}, files=files).json()
+    assert again["simulation_results"][0] != historical["simulation_results"][0]
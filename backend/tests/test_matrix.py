@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+from app.engine.scenarios import SCENARIOS_DB
+from app.engine.simulation import simulate_scenario_reference
+from app.engine.matrix import evaluate_scenario_matrix, scenario_matrix, ATTRIBUTION_LABELS
+from app.core.frame import as_frame
+from tests.test_vectorized import _random_portfolio
+
+def test_scenario_matrix_matches_reference():
+    p = _random_portfolio(300)
+    batch = evaluate_scenario_matrix(p, scenario_matrix(SCENARIOS_DB))
+
+    assert batch.pnl.shape == (len(SCENARIOS_DB), 300)
+    for i, s in enumerate(SCENARIOS_DB):
+        ref = simulate_scenario_reference(p, s)
+        assert round(float(batch.totals[i]), 2) == ref.total_pnl
+        for j, label in enumerate(ATTRIBUTION_LABELS):
+            assert round(float(batch.attribution[i, j]), 2) == ref.shock_details[label]
+
+def test_chunking_does_not_change_results():
+    frame = as_frame(_random_portfolio(200))
+    rng = np.random.default_rng(0)
+    shocks = np.column_stack([
+        rng.uniform(-0.6, 0.2, 1000),
+        rng.uniform(-200, 400, 1000),
+        rng.uniform(0, 600, 1000),
+        rng.uniform(0, 1, 1000),
+    ])
+    full = evaluate_scenario_matrix(frame, shocks)
+    chunked = evaluate_scenario_matrix(frame, shocks, keep_positions=False, chunk_size=7)
+
+    assert chunked.pnl is None
+    assert np.array_equal(full.totals, chunked.totals)
+    assert np.array_equal(full.attribution, chunked.attribution)
+
+def test_bad_matrix_shape():
+    with pytest.raises(ValueError):
+        evaluate_scenario_matrix(_random_portfolio(10), np.zeros((3, 2)))
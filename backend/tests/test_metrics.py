@@ -0,0 +1,55 @@
+from fastapi.testclient import TestClient
+from app.main import app
+from app.core.cache import result_cache
+from app.core.metrics import Histogram, REQUEST_LATENCY, POSITIONS_PROCESSED
+
+client = TestClient(app)
+
+CSV = b"""Asset Class,Ticker,Name,Quantity,Market Price,Market Value,Sector,Duration,Rating,Liquidity Score
+Equity,AAPL,Apple Inc,100,150,15000,Technology,0,NR,95
+Debt,US10Y,US Treasury 10Y,10,100,1000,Government,10,AAA,100
+"""
+
+def test_histogram_renders_cumulative_buckets():
+    h = Histogram("demo_seconds", "Demo", ("stage",), buckets=(0.1, 1.0))
+    for v in (0.05, 0.5, 0.5, 5.0):
+        h.observe(v, "x")
+    lines = h.render()
+    assert 'demo_seconds_bucket{stage="x",le="0.1"} 1' in lines
+    assert 'demo_seconds_bucket{stage="x",le="1"} 3' in lines
+    assert 'demo_seconds_bucket{stage="x",le="+Inf"} 4' in lines
+    assert 'demo_seconds_count{stage="x"} 4' in lines
+
+def test_profile_header_returns_stage_breakdown():
+    result_cache.invalidate()
+    before = REQUEST_LATENCY.count("POST", "/api/analyze", "200")
+    positions = POSITIONS_PROCESSED.value()
+
+    files = {'file': ('profiled.csv', CSV, 'text/csv')}
+    response = client.post("/api/analyze", files=files, headers={"X-Profile": "1"})
+    assert response.status_code == 200
+    stages = [part.split(";")[0] for part in response.headers["server-timing"].split(", ")]
+    for name in ("cache_lookup", "ingest", "exposure", "scenarios", "simulation", "response", "audit", "total"):
+        assert name in stages
+
+    assert REQUEST_LATENCY.count("POST", "/api/analyze", "200") == before + 1
+    assert POSITIONS_PROCESSED.value() == positions + 2
+
+    # No header, no breakdown
+    assert "server-timing" not in client.post("/api/analyze", files=files).headers
+
+def test_metrics_endpoint():
+    client.get("/health")
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    body = response.text
+    assert '# TYPE http_request_duration_seconds histogram' in body
+    assert 'http_request_duration_seconds_count{method="GET",route="/health",status="200"}' in body
+    assert "# TYPE pipeline_stage_seconds histogram" in body
+    assert "positions_processed_total" in body
+
+def test_request_latency_labels_use_route_templates():
+    client.get("/api/jobs/abc123")
+    client.get("/api/jobs/def456")
+    assert REQUEST_LATENCY.count("GET", "/api/jobs/{job_id}", "404") >= 2
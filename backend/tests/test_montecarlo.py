@@ -0,0 +1,96 @@
+import json
+import time
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+from app.models import Portfolio, PortfolioPosition, MonteCarloConfig
+from app.core.config import settings
+from app.core.frame import PortfolioFrame
+from app.engine.montecarlo import run_monte_carlo
+from tests.test_vectorized import _random_portfolio
+
+client = TestClient(app)
+
+COV = [
+    [0.04, -1.0, -2.0, 0.0],
+    [-1.0, 2500.0, 500.0, 0.0],
+    [-2.0, 500.0, 10000.0, 0.0],
+    [0.0, 0.0, 0.0, 0.01],
+]
+
+def _equity_portfolio():
+    return Portfolio(
+        positions=[
+            PortfolioPosition(
+                asset_class="Equity", ticker="A", name="A", quantity=10, market_price=100,
+                market_value=1000, sector="Tech", duration=0, rating="NR", liquidity_score=100
+            )
+        ],
+        total_value=1000,
+        as_of_date="2024-01-01"
+    )
+
+def test_monte_carlo_is_seeded_and_worker_independent():
+    p = _equity_portfolio()
+    config = MonteCarloConfig(covariance=COV, n_draws=25000, seed=11)
+    a = run_monte_carlo(p, config)
+    b = run_monte_carlo(p, config.model_copy(update={"workers": 2}))
+    assert a == b
+    assert a.n_draws == 25000 and not a.truncated
+
+def test_monte_carlo_gaussian_var():
+    # Equity-only book, equity vol 20% -> 99% VaR ~ 2.326 * 0.2 * 1000 = 465
+    p = _equity_portfolio()
+    result = run_monte_carlo(p, MonteCarloConfig(covariance=COV, n_draws=50000))
+    assert 440 < result.value_at_risk < 490
+    assert result.expected_shortfall > result.value_at_risk
+    assert result.tail_contributions["A"] == pytest.approx(-result.expected_shortfall, abs=0.05)
+
+def test_monte_carlo_student_t_has_fatter_tail():
+    p = _equity_portfolio()
+    gauss = run_monte_carlo(p, MonteCarloConfig(covariance=COV, n_draws=50000, confidence=0.999))
+    t = run_monte_carlo(p, MonteCarloConfig(covariance=COV, n_draws=50000, confidence=0.999,
+                                            distribution="student_t", degrees_of_freedom=4))
+    assert t.expected_shortfall > gauss.expected_shortfall
+
+def test_monte_carlo_rejects_bad_covariance():
+    with pytest.raises(ValueError):
+        run_monte_carlo(_equity_portfolio(), MonteCarloConfig(covariance=[[1.0, 2.0], [2.0, 1.0]]))
+
+def test_monte_carlo_endpoint():
+    csv_content = b"""Asset Class,Ticker,Name,Quantity,Market Price,Market Value,Sector,Duration,Rating,Liquidity Score
+Equity,AAPL,Apple Inc,100,150,15000,Technology,0,NR,95
+Debt,US10Y,US Treasury 10Y,10,100,1000,Government,10,AAA,100
+"""
+    files = {'file': ('portfolio.csv', csv_content, 'text/csv')}
+    response = client.post("/api/monte_carlo", files=files,
+                           data={"config": json.dumps({"covariance": COV, "n_draws": 5000})})
+    assert response.status_code == 200
+    data = response.json()
+    assert data["n_draws"] == 5000
+    assert set(data["tail_contributions"]) == {"AAPL", "US10Y"}
+
+    response = client.post("/api/monte_carlo", files=files,
+                           data={"config": json.dumps({"covariance": COV, "n_draws": 10**9})})
+    assert response.status_code == 400
+
+def test_monte_carlo_deadline_bounds_wall_time():
+    p = _random_portfolio(300, seed=2)
+    config = MonteCarloConfig(covariance=COV, n_draws=1_000_000, workers=2, deadline_seconds=0.5)
+    start = time.monotonic()
+    result = run_monte_carlo(p, config)
+    elapsed = time.monotonic() - start
+    assert result.truncated and 0 < result.n_draws < 1_000_000
+    # Returns at the deadline instead of waiting for in-flight batches
+    assert elapsed < config.deadline_seconds + 0.5
+
+def test_monte_carlo_serial_deadline_cuts_a_batch_short(monkeypatch):
+    # One batch would take far longer than the deadline
+    monkeypatch.setattr(settings, "MC_BATCH_SIZE", 1_000_000)
+    p = PortfolioFrame.from_portfolio(_random_portfolio(2000, seed=2))
+    config = MonteCarloConfig(covariance=COV, n_draws=1_000_000, deadline_seconds=1.0)
+    start = time.monotonic()
+    result = run_monte_carlo(p, config)
+    elapsed = time.monotonic() - start
+    assert result.truncated and 0 < result.n_draws < 1_000_000
+    assert elapsed < config.deadline_seconds + 0.5
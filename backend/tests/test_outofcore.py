@@ -0,0 +1,157 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+from app.models import ImpactQuery
+from app.core.config import settings
+from app.core.frame import PortfolioFrame
+from app.core.ingest import parse_portfolio_frame
+from app.core.outofcore import ColumnStore, analyze_column_store, analyze_out_of_core, main
+from app.core.pipeline import analyze_frame
+from app.engine.matrix import evaluate_scenario_matrix, ScenarioMatrixResult
+from tests.test_vectorized import _random_portfolio
+from tests.test_fullreval import CSV as TERMS_CSV
+
+client = TestClient(app)
+
+HEADER = "Asset Class,Ticker,Name,Quantity,Market Price,Market Value,Sector,Duration,Rating,Liquidity Score\n"
+
+def _csv(n=600, seed=21) -> bytes:
+    rows = [
+        f"{p.asset_class.value},{p.ticker},{p.name},{p.quantity!r},{p.market_price!r},{p.market_value!r},"
+        f"{p.sector},{p.duration!r},{p.rating.value if p.rating else ''},{p.liquidity_score!r}"
+        for p in _random_portfolio(n, seed=seed).positions
+    ]
+    return (HEADER + "\n".join(rows) + "\n").encode()
+
+def _store(tmp_path, content, name="book.csv", chunksize=None):
+    path = tmp_path / name
+    path.write_bytes(content)
+    return ColumnStore.convert(str(path), name, str(tmp_path / "columns"), chunksize)
+
+def test_block_carry_matches_one_pass():
+    frame = PortfolioFrame.from_portfolio(_random_portfolio(1000, seed=5))
+    shocks = np.random.default_rng(4).normal(size=(7, 4)) * [0.2, 100, 150, 0.3]
+    whole = evaluate_scenario_matrix(frame, shocks, keep_positions=False)
+    carry = ScenarioMatrixResult(np.zeros(7), np.zeros((7, 4)))
+    for start in range(0, 1000, 128):
+        block = PortfolioFrame(**_columns(frame, slice(start, start + 128)))
+        carry = evaluate_scenario_matrix(block, shocks, keep_positions=False, carry=carry)
+    np.testing.assert_array_equal(carry.totals, whole.totals)
+    np.testing.assert_array_equal(carry.attribution, whole.attribution)
+
+def _columns(frame, sl):
+    return dict(
+        asset_class=frame.asset_class[sl], rating=frame.rating[sl],
+        ticker_code=frame.ticker_code[sl], ticker_labels=frame.ticker_labels,
+        sector_code=frame.sector_code[sl], sector_labels=frame.sector_labels,
+        name_code=frame.name_code[sl], name_labels=frame.name_labels,
+        quantity=frame.quantity[sl], market_price=frame.market_price[sl], market_value=frame.market_value[sl],
+        duration=frame.duration[sl], liquidity_score=frame.liquidity_score[sl],
+        as_of_date=frame.as_of_date, total_value=frame.total_value
+    )
+
+def test_column_store_round_trip(tmp_path):
+    content = _csv()
+    store = _store(tmp_path, content, chunksize=100)
+    frame = parse_portfolio_frame(content, "book.csv")
+    assert store.rows == len(frame)
+    assert store.total_value == frame.total_value
+    assert store.ticker_labels == frame.ticker_labels
+    assert store.sector_labels == frame.sector_labels
+    blocks = list(store.blocks(250))
+    assert [start for start, _ in blocks] == [0, 250, 500]
+    tickers = [t for _, b in blocks for t in b.tickers]
+    assert tickers == frame.tickers
+    np.testing.assert_array_equal(np.concatenate([b.market_value for _, b in blocks]), frame.market_value)
+    # A second handle reads the same directory
+    assert ColumnStore(store.directory).rows == store.rows
+
+def test_failed_reconversion_keeps_existing_store(tmp_path):
+    store = _store(tmp_path, _csv(120))
+    bad = tmp_path / "bad.csv"
+    bad.write_bytes(_csv(300)[:-200] + b"\nEquity,X,X,-1,1,1,Tech,0,NR,50\n")
+    with pytest.raises(ValueError):
+        ColumnStore.convert(str(bad), "bad.csv", store.directory, chunksize=50)
+    again = ColumnStore(store.directory)
+    assert again.rows == 120 and again.total_value == store.total_value
+    assert not [p for p in tmp_path.iterdir() if p.name.startswith(".")]
+
+    # A successful re-conversion replaces it
+    assert _store(tmp_path, _csv(80)).rows == 80
+
+def test_concurrent_analyses_of_one_store(tmp_path):
+    store = _store(tmp_path, _csv(400))
+    expected = analyze_column_store(store, block_rows=50).model_dump()
+    with ThreadPoolExecutor(4) as pool:
+        reports = list(pool.map(lambda _: analyze_column_store(ColumnStore(store.directory), block_rows=50), range(4)))
+    assert all(r.model_dump() == expected for r in reports)
+    assert not list((tmp_path / "columns").glob("impacts-*"))
+
+def test_matches_in_memory_analysis(tmp_path):
+    content = _csv()
+    store = _store(tmp_path, content, chunksize=70)
+    frame = parse_portfolio_frame(content, "book.csv")
+    query = ImpactQuery(top_k=10, order="worst", rollup=["sector", "issuer"])
+    expected = analyze_frame(frame, impact_query=query)
+    report = analyze_column_store(store, query, block_rows=97)
+
+    assert report.blocks == 7
+    assert report.position_count == len(frame)
+    assert report.selected_scenarios == expected.selected_scenarios
+    got, want = report.exposure_report, expected.exposure_report
+    assert got.concentration_alerts == want.concentration_alerts
+    assert got.weighted_average_duration == want.weighted_average_duration
+    for field in ("by_asset_class", "by_sector", "by_rating"):
+        assert list(getattr(got, field)) == list(getattr(want, field))
+        assert getattr(got, field) == pytest.approx(getattr(want, field), abs=1e-4)
+    for r, e in zip(report.simulation_results, expected.simulation_results):
+        assert r["total_pnl"] == e["total_pnl"]
+        assert r["shock_details"] == e["shock_details"]
+        assert list(r["position_impacts"]) == list(e["position_impacts"])
+        assert r["position_impacts"] == pytest.approx(e["position_impacts"], abs=0.011)
+        assert list(r["impact_rollups"]["sector"]) == list(e["impact_rollups"]["sector"])
+        assert r["impact_rollups"]["issuer"] == pytest.approx(e["impact_rollups"]["issuer"], abs=0.011)
+
+def test_default_top_k_and_full_revaluation(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "OUT_OF_CORE_TOP_K", 3)
+    store = _store(tmp_path, _csv(200))
+    report = analyze_column_store(store, block_rows=64)
+    assert all(len(r["position_impacts"]) == 3 for r in report.simulation_results)
+
+    path = tmp_path / "terms.csv"
+    path.write_bytes(TERMS_CSV)
+    expected = analyze_frame(parse_portfolio_frame(TERMS_CSV, "terms.csv"), revaluation="full")
+    report = analyze_out_of_core(str(path), revaluation="full", block_rows=2)
+    assert [r["total_pnl"] for r in report.simulation_results] == [r["total_pnl"] for r in expected.simulation_results]
+
+def test_parquet_input_and_cli(tmp_path, capsys):
+    pa = pytest.importorskip("pyarrow")
+    import pyarrow.csv
+    import pyarrow.parquet
+    content = _csv(300)
+    table = pa.csv.read_csv(pa.BufferReader(content), convert_options=pa.csv.ConvertOptions(strings_can_be_null=True))
+    pa.parquet.write_table(table, str(tmp_path / "book.parquet"), row_group_size=64)
+
+    assert main([str(tmp_path / "book.parquet"), "--store", str(tmp_path / "cols"), "--top-k", "5"]) == 0
+    from_parquet = json.loads(capsys.readouterr().out)
+    assert from_parquet["position_count"] == 300
+    # The kept store is reused directly
+    assert main([str(tmp_path / "cols"), "--top-k", "5", "-o", str(tmp_path / "out.json")]) == 0
+    assert json.loads((tmp_path / "out.json").read_text()) == from_parquet
+    assert main([str(tmp_path / "missing.csv")]) == 2
+
+def test_analyze_large_endpoint():
+    content = _csv(150)
+    response = client.post("/api/analyze/large", params={"block_rows": 40, "top_k": 4, "rollup": "sector"},
+                           files={"file": ("book.csv", content, "text/csv")})
+    assert response.status_code == 200
+    body = response.json()
+    assert body["position_count"] == 150 and body["blocks"] == 4
+    assert all(len(r["position_impacts"]) == 4 for r in body["simulation_results"])
+    assert "sector" in body["simulation_results"][0]["impact_rollups"]
+
+    bad = client.post("/api/analyze/large", files={"file": ("bad.csv", b"Ticker\nAAPL\n", "text/csv")})
+    assert bad.status_code == 400
@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+from app.core.config import settings
+from app.core.frame import PortfolioFrame
+from app.core.ingest import parse_portfolio_frame
+from app.engine.matrix import evaluate_scenario_matrix
+from app.engine.parallel import (
+    evaluate_scenario_matrix_parallel, shard_bounds, get_simulation_pool, shutdown_simulation_pool
+)
+from app.engine.scenarios import SCENARIOS_DB
+from app.engine.simulation import run_stress_test
+from tests.test_vectorized import _random_portfolio
+from tests.test_fullreval import CSV as TERMS_CSV
+
+@pytest.fixture(autouse=True, scope="module")
+def pool():
+    yield
+    shutdown_simulation_pool()
+
+def _assert_identical(a, b):
+    np.testing.assert_array_equal(a.totals, b.totals)
+    np.testing.assert_array_equal(a.attribution, b.attribution)
+    np.testing.assert_array_equal(a.pnl, b.pnl)
+
+def test_shard_bounds():
+    assert shard_bounds(10, 4) == [(0, 2), (2, 5), (5, 8), (8, 10)]
+    assert shard_bounds(3, 8) == [(0, 1), (1, 2), (2, 3)]
+    assert shard_bounds(0, 4) == []
+
+def test_sharded_matches_serial_exactly():
+    frame = PortfolioFrame.from_portfolio(_random_portfolio(3000, seed=11))
+    shocks = np.random.default_rng(2).normal(size=(37, 4)) * [0.2, 100, 150, 0.3]
+    serial = evaluate_scenario_matrix(frame, shocks)
+    for workers in (2, 3):
+        _assert_identical(evaluate_scenario_matrix_parallel(frame, shocks, workers), serial)
+    totals_only = evaluate_scenario_matrix_parallel(frame, shocks, 2, keep_positions=False)
+    assert totals_only.pnl is None
+    np.testing.assert_array_equal(totals_only.totals, serial.totals)
+
+def test_sharded_full_revaluation_matches_serial():
+    frame = parse_portfolio_frame(TERMS_CSV, "terms.csv")
+    shocks = np.random.default_rng(3).normal(size=(9, 4)) * [0.2, 100, 150, 0.3]
+    vol_shocks = np.linspace(-0.1, 0.4, 9)
+    serial = evaluate_scenario_matrix(frame, shocks, revaluation="full", vol_shocks=vol_shocks)
+    _assert_identical(evaluate_scenario_matrix_parallel(frame, shocks, 2, revaluation="full",
+                                                        vol_shocks=vol_shocks), serial)
+
+def test_run_stress_test_uses_workers(monkeypatch):
+    frame = PortfolioFrame.from_portfolio(_random_portfolio(500, seed=12))
+    serial = [r.model_dump() for r in run_stress_test(frame, SCENARIOS_DB)]
+    monkeypatch.setattr(settings, "PARALLEL_MIN_CELLS", 0)
+    monkeypatch.setattr(settings, "SIMULATION_WORKERS", 2)
+    assert [r.model_dump() for r in run_stress_test(frame, SCENARIOS_DB)] == serial
+    with pytest.raises(ValueError):
+        evaluate_scenario_matrix_parallel(frame, np.zeros((2, 3)), 2)
+
+def test_pool_is_not_rebuilt_per_request(monkeypatch):
+    frame = PortfolioFrame.from_portfolio(_random_portfolio(200, seed=13))
+    monkeypatch.setattr(settings, "PARALLEL_MIN_CELLS", 0)
+    monkeypatch.setattr(settings, "SIMULATION_WORKERS", 2)
+    pool = get_simulation_pool()
+    # Different scenario counts only change the sharding
+    for scenarios in (SCENARIOS_DB[:2], SCENARIOS_DB, SCENARIOS_DB[:3]):
+        run_stress_test(frame, scenarios)
+        assert get_simulation_pool() is pool
@@ -0,0 +1,86 @@
+import json
+import time
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+from app.models import ReverseStressConfig
+from app.core.frame import PortfolioFrame
+from app.core.ingest import parse_portfolio_frame
+from app.engine.matrix import evaluate_scenario_matrix, SCENARIO_FACTORS
+from app.engine.reverse import reverse_stress_test, factor_sensitivities
+from app.engine.fullreval import full_reval_gradient
+from tests.test_vectorized import _random_portfolio
+from tests.test_fullreval import CSV as TERMS_CSV
+
+client = TestClient(app)
+
+COV = [
+    [0.04, -1.0, -2.0, 0.02],
+    [-1.0, 10000.0, 2000.0, 0.0],
+    [-2.0, 2000.0, 22500.0, 5.0],
+    [0.02, 0.0, 5.0, 0.25],
+]
+
+def test_sensitivities_are_exact():
+    frame = PortfolioFrame.from_portfolio(_random_portfolio(300, seed=2))
+    g = factor_sensitivities(frame)
+    x = np.array([-0.3, 150.0, 250.0, 0.4])
+    assert evaluate_scenario_matrix(frame, x[None, :]).totals[0] == pytest.approx(g @ x, rel=1e-10)
+
+def test_linear_solution_is_closed_form():
+    frame = PortfolioFrame.from_portfolio(_random_portfolio(300, seed=2))
+    result = reverse_stress_test(frame, ReverseStressConfig(target_loss_pct=0.1, covariance=COV))
+    assert result.converged and result.iterations == 1
+    assert result.achieved_pnl == pytest.approx(-0.1 * frame.total_value, abs=0.01)
+
+    g, sigma = factor_sensitivities(frame), np.array(COV)
+    expected = sigma @ g * (-0.1 * frame.total_value) / (g @ sigma @ g)
+    x = np.array([getattr(result.scenario, f) for f in SCENARIO_FACTORS])
+    np.testing.assert_allclose(x, expected, rtol=1e-9)
+    assert result.mahalanobis_distance == pytest.approx(np.sqrt(x @ np.linalg.solve(sigma, x)), rel=1e-9)
+
+    # Any other shock on the loss surface is less likely
+    rng = np.random.default_rng(0)
+    for _ in range(50):
+        y = x + rng.normal(size=4) * np.sqrt(np.diag(sigma))
+        y += (-0.1 * frame.total_value - g @ y) / (g @ g) * g
+        assert y @ np.linalg.solve(sigma, y) >= x @ np.linalg.solve(sigma, x) - 1e-9
+
+def test_full_revaluation_converges():
+    frame = parse_portfolio_frame(TERMS_CSV, "terms.csv")
+    result = reverse_stress_test(frame, ReverseStressConfig(target_loss_pct=0.15, revaluation="full"))
+    assert result.converged
+    assert result.achieved_pnl == pytest.approx(-0.15 * frame.total_value, rel=1e-5)
+
+def test_large_book_is_fast():
+    frame = PortfolioFrame.from_portfolio(_random_portfolio(100_000, seed=5))
+    start = time.perf_counter()
+    result = reverse_stress_test(frame, ReverseStressConfig(target_loss_pct=0.2, covariance=COV, revaluation="full"))
+    assert result.converged
+    assert time.perf_counter() - start < 1.0
+
+def test_reverse_stress_endpoint():
+    files = {'file': ('terms.csv', TERMS_CSV, 'text/csv')}
+    response = client.post("/api/reverse_stress", files=files, data={"config": json.dumps({"target_loss_pct": 0.05})})
+    assert response.status_code == 200
+    body = response.json()
+    assert body["scenario"]["equity_shock"] < 0
+    assert 0 < body["exceedance_probability"] < 0.5
+
+    frozen = [[0.0] * 4 for _ in range(4)] # No factor may move
+    response = client.post("/api/reverse_stress", files=files,
+                           data={"config": json.dumps({"target_loss_pct": 0.05, "covariance": frozen})})
+    assert response.status_code == 400
+
+def test_full_revaluation_gradient_is_analytic():
+    # Options, convex bonds and plain lines: the closed form matches central differences
+    frame = parse_portfolio_frame(TERMS_CSV, "terms.csv")
+    steps = np.array([1e-5, 1e-3, 1e-3, 1e-5])
+    for x in ([0.0, 0.0, 0.0, 0.0], [-0.3, 150.0, 250.0, 0.4], [0.2, -80.0, -40.0, 0.1]):
+        x = np.array(x)
+        bumps = np.diag(steps)
+        totals = evaluate_scenario_matrix(frame, np.vstack([x + bumps, x - bumps]),
+                                          keep_positions=False, revaluation="full").totals
+        numeric = (totals[:4] - totals[4:]) / (2 * steps)
+        np.testing.assert_allclose(full_reval_gradient(frame, *x), numeric, rtol=1e-4, atol=1e-6 * frame.total_value)
@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+from app.models import PortfolioDelta, PositionUpdate, WhatIfRequest
+from app.core.frame import PortfolioFrame
+from app.engine.incremental import IncrementalAnalysis
+from app.engine.matrix import evaluate_scenario_matrix
+from app.engine.sensitivity import position_sensitivities, portfolio_sensitivities
+from tests.test_vectorized import _random_portfolio
+
+client = TestClient(app)
+
+def test_sensitivities_reproduce_the_linear_model():
+    frame = PortfolioFrame.from_portfolio(_random_portfolio(500, seed=3))
+    sens = position_sensitivities(frame)
+    assert sens.shape == (500, 4) and position_sensitivities(frame) is sens # cached with the frame
+
+    shocks = np.random.default_rng(1).normal(size=(20, 4)) * [0.2, 100, 150, 0.3]
+    batch = evaluate_scenario_matrix(frame, shocks)
+    np.testing.assert_allclose(shocks @ sens.T, batch.pnl, rtol=1e-9, atol=1e-9)
+    np.testing.assert_allclose(shocks @ portfolio_sensitivities(frame), batch.totals, rtol=1e-9)
+    np.testing.assert_allclose(shocks * portfolio_sensitivities(frame), batch.attribution, rtol=1e-9, atol=1e-9)
+
+def test_what_if_follows_deltas():
+    p = _random_portfolio(400, seed=4)
+    state = IncrementalAnalysis("pid", PortfolioFrame.from_portfolio(p))
+    tickers = list(state.positions)
+    state.apply(PortfolioDelta(remove=[tickers[0]], update=[PositionUpdate(ticker=tickers[1], quantity=3)]))
+
+    request = WhatIfRequest(equity_shock=-0.25, rate_shock=80, credit_spread_shock=200, liquidity_shock=0.1,
+                            top_positions=5)
+    result = state.what_if(request)
+    positions = [pos for rows in state.positions.values() for pos in rows]
+    frame = PortfolioFrame.from_portfolio(p.model_copy(update={"positions": positions}))
+    batch = evaluate_scenario_matrix(frame, np.array([[-0.25, 80, 200, 0.1]]))
+    assert result.total_pnl == pytest.approx(batch.totals[0], abs=0.02)
+
+    # Worst-hit tickers, worst first, removed ticker excluded
+    by_ticker = {}
+    for t, pnl in zip(frame.tickers, batch.pnl[0]):
+        by_ticker[t] = by_ticker.get(t, 0.0) + pnl
+    worst = sorted(by_ticker, key=by_ticker.get)[:5]
+    assert list(result.position_impacts) == worst
+    assert tickers[0] not in state.sensitivity_report().by_ticker
+
+def test_what_if_endpoints():
+    csv_content = b"""Asset Class,Ticker,Name,Quantity,Market Price,Market Value,Sector,Duration,Rating,Liquidity Score
+Equity,AAPL,Apple Inc,100,150,15000,Technology,0,NR,95
+Debt,HY1,High Yield Bond,10,100,1000,Industrials,4,B,50
+"""
+    files = {'file': ('portfolio.csv', csv_content, 'text/csv')}
+    pid = client.post("/api/analyze?track=true", files=files).json()["portfolio_id"]
+
+    sens = client.get(f"/api/portfolios/{pid}/sensitivities").json()
+    assert sens["totals"]["equity_delta"] == 15000
+    assert sens["by_ticker"]["HY1"] == pytest.approx([0.0, -0.4, -0.4, -500.0])
+
+    body = client.post(f"/api/portfolios/{pid}/what_if",
+                       json={"equity_shock": -0.1, "credit_spread_shock": 100, "top_positions": 1}).json()
+    assert body["total_pnl"] == pytest.approx(-1500 - 40)
+    assert body["shock_details"]["Credit Spread Risk"] == -40
+    assert body["position_impacts"] == {"AAPL": -1500}
+    assert client.post("/api/portfolios/nope/what_if", json={}).status_code == 404
@@ -0,0 +1,73 @@
+import subprocess
+import sys
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+from app.core import warmup
+from app.core.config import settings
+from app.core.lazy import lazy_module
+
+client = TestClient(app)
+
+@pytest.fixture
+def cold():
+    warmup.readiness.reset()
+    yield warmup.readiness
+    warmup.readiness.reset()
+
+def _fresh(code: str) -> str:
+    return subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout.strip()
+
+def test_import_defers_pandas_and_builtin_scenarios():
+    out = _fresh("import sys, app.main, app.engine.scenarios as s; "
+                 "print('pandas' in sys.modules, 'SCENARIOS_DB' in vars(s))")
+    assert out == "False False"
+    # First access builds (and keeps) the built-in list
+    out = _fresh("from app.engine import scenarios as s; a = s.SCENARIOS_DB; print(len(a), a is s.SCENARIOS_DB)")
+    assert out == "5 True"
+
+def test_lazy_module_loads_on_attribute_access():
+    json = lazy_module("json")
+    assert json.dumps([1]) == "[1]"
+    assert "loaded" in repr(json)
+
+def test_ready_reports_warm_up(cold, monkeypatch):
+    response = client.get("/ready")
+    assert response.status_code == 503 and response.json()["status"] == "cold"
+    assert client.get("/health").status_code == 200
+
+    steps = warmup.warm_up()
+    assert list(steps) == [name for name, _ in warmup.WARMUP_STEPS]
+    ready = client.get("/ready")
+    assert ready.status_code == 200 and ready.json()["steps_ms"] == steps
+    # Already warm: nothing runs again
+    assert warmup.warm_up() == steps
+
+    cold.reset()
+    monkeypatch.setattr(settings, "WARMUP_MODE", "off")
+    assert client.get("/ready").status_code == 200
+
+def test_failed_warm_up_stays_unready(cold, monkeypatch):
+    def broken():
+        raise RuntimeError("no disk")
+
+    monkeypatch.setattr(warmup, "WARMUP_STEPS", [("scenario_library", broken)])
+    warmup.start_warm_up().join()
+    body = client.get("/ready").json()
+    assert body["status"] == "failed" and body["error"] == "scenario_library: no disk"
+
+def test_parse_importtime():
+    output = """import time: self [us] | cumulative | imported package
+import time:       120 |        120 |   zipimport
+import time:      1500 |       9000 |     pandas.core
+import time:       800 |      12000 |   pandas
+"""
+    timings = warmup.parse_importtime(output)
+    assert [t.module for t in timings] == ["pandas", "pandas.core", "zipimport"]
+    assert timings[0].self_ms == 0.8 and timings[0].cumulative_ms == 12.0
+
+def test_profile_cli_budget(capsys):
+    assert warmup.main(["--profile", "--top", "5"]) == 0
+    report = capsys.readouterr().out
+    assert "import app.main:" in report and "deferred until warm-up: pandas" in report
+    assert warmup.main(["--profile", "--max-ms", "1"]) == 1
@@ -0,0 +1,102 @@
+import json
+from fastapi.testclient import TestClient
+from app.main import app
+from app.models import ImpactQuery
+from app.core.frame import PortfolioFrame
+from app.core.exposure import calculate_exposure
+from app.core.pipeline import analyze_frame
+from app.core.streaming import stream_analysis
+from app.engine.scenarios import select_scenarios
+import app.core.streaming as streaming
+from tests.test_vectorized import _random_portfolio
+
+client = TestClient(app)
+
+CSV = b"""Asset Class,Ticker,Name,Quantity,Market Price,Market Value,Sector,Duration,Rating,Liquidity Score
+Equity,AAPL,Apple Inc,100,150,15000,Technology,0,NR,95
+Debt,HY1,High Yield Co,10,90,900,Industrials,6,B,30
+Debt,US10Y,US Treasury 10Y,10,100,1000,Government,10,AAA,100
+"""
+
+def _stream(frame, **kwargs):
+    exposure = calculate_exposure(frame)
+    lines = b"".join(stream_analysis(frame, exposure, select_scenarios(exposure), "p.csv", **kwargs))
+    return [json.loads(line) for line in lines.splitlines()]
+
+def test_stream_matches_full_response(monkeypatch):
+    monkeypatch.setattr(streaming, "POSITION_CHUNK", 7)
+    monkeypatch.setattr(streaming, "SCENARIO_CHUNK", 2)
+    frame = PortfolioFrame.from_portfolio(_random_portfolio(30, seed=3))
+    expected = analyze_frame(frame).model_dump(mode="json")
+
+    lines = _stream(frame)
+    assert [l["type"] for l in lines][:6] == ["summary"] + ["positions"] * 5
+    positions = [p for l in lines if l["type"] == "positions" for p in l["positions"]]
+    assert positions == expected["portfolio_summary"]["positions"]
+    assert next(l for l in lines if l["type"] == "exposure") == {"type": "exposure", **expected["exposure_report"]}
+    results = [{k: v for k, v in l.items() if k != "type"} for l in lines if l["type"] == "result"]
+    assert results == expected["simulation_results"]
+    assert lines[-1]["risk_explanation"] == expected["risk_explanation"]
+
+def test_stream_top_k_without_positions():
+    frame = PortfolioFrame.from_portfolio(_random_portfolio(50, seed=4))
+    full = {l["scenario_name"]: l for l in _stream(frame) if l["type"] == "result"}
+
+    lines = _stream(frame, include_positions=False, impact_query=ImpactQuery(top_k=3))
+    assert "positions" not in {l["type"] for l in lines}
+    for l in (l for l in lines if l["type"] == "result"):
+        impacts = list(l["position_impacts"].values())
+        assert len(impacts) <= 3
+        assert impacts == sorted(impacts, key=abs, reverse=True)
+        assert l["total_pnl"] == full[l["scenario_name"]]["total_pnl"]
+        assert abs(impacts[-1]) >= sorted(map(abs, full[l["scenario_name"]]["position_impacts"].values()))[-3]
+
+def test_stream_endpoint(monkeypatch):
+    from app.core.audit import audit_queue
+    entries = []
+
+    async def record(entry):
+        entries.append(entry)
+
+    monkeypatch.setattr(audit_queue, "submit_entry", record)
+    response = client.post("/api/analyze/stream", params={"top_k": 1},
+                           files={'file': ('p.csv', CSV, 'text/csv')})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert lines[0] == {"type": "summary", "total_value": 16900.0, "as_of_date": lines[0]["as_of_date"], "position_count": 3}
+    assert all(len(l["position_impacts"]) == 1 for l in lines if l["type"] == "result")
+    # The audit entry goes through the group-committed queue
+    assert [e["input_file"] for e in entries] == ["p.csv"]
+
+    bad = client.post("/api/analyze/stream", files={'file': ('p.csv', b"Ticker\nX\n", 'text/csv')})
+    assert bad.status_code == 400
+
+def test_stream_holds_admission_slot_until_done(monkeypatch):
+    from app.api import endpoints
+    from app.core.executor import admission
+    seen = []
+
+    def lines(*args):
+        for _ in range(3):
+            seen.append(admission.stats()["small"]["active"])
+            yield b"{}\n"
+
+    monkeypatch.setattr(endpoints, "stream_analysis", lines)
+    response = client.post("/api/analyze/stream", files={'file': ('p.csv', CSV, 'text/csv')})
+    assert response.status_code == 200
+    assert seen == [1, 1, 1]
+    assert admission.stats()["small"]["active"] == 0
+
+def test_stream_endpoint_matches_analyze_options():
+    files = {'file': ('p.csv', CSV, 'text/csv')}
+    params = {"revaluation": "full", "scenario_set": "historical"}
+    expected = client.post("/api/analyze", params=params, files=files).json()
+    response = client.post("/api/analyze/stream", params=params, files=files)
+    assert response.status_code == 200
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    results = [{k: v for k, v in l.items() if k != "type"} for l in lines if l["type"] == "result"]
+    assert results == expected["simulation_results"]
+    assert lines[-1]["risk_explanation"] == expected["risk_explanation"]
+
+    assert client.post("/api/analyze/stream", params={"scenario_set": "nope"}, files=files).status_code == 404
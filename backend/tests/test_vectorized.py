@@ -0,0 +1,49 @@
+import random
+from app.models import Portfolio, PortfolioPosition, StressScenario
+from app.engine.scenarios import SCENARIOS_DB
+from app.engine.simulation import simulate_scenario, simulate_scenario_reference, run_stress_test
+from app.core.frame import as_frame
+
+def _random_portfolio(n, seed=7):
+    rng = random.Random(seed)
+    positions = []
+    for i in range(n):
+        ac = rng.choice(["Equity", "Debt", "Cash", "Derivative"])
+        qty = rng.uniform(1, 1000)
+        price = rng.uniform(1, 500)
+        positions.append(PortfolioPosition(
+            asset_class=ac, ticker=f"T{i % (n // 2 or 1)}", name=f"Pos {i}",
+            quantity=qty, market_price=price, market_value=qty * price,
+            sector=rng.choice(["Technology", "Financials", "Energy"]),
+            duration=rng.uniform(0, 20) if ac == "Debt" else 0.0,
+            rating=rng.choice(["AAA", "AA", "BBB", "B", "NR", None]),
+            liquidity_score=rng.uniform(0, 100)
+        ))
+    return Portfolio(
+        positions=positions,
+        total_value=sum(p.market_value for p in positions),
+        as_of_date="2024-01-01"
+    )
+
+def test_vectorized_matches_reference_exactly():
+    p = _random_portfolio(500)
+    scenarios = SCENARIOS_DB + [
+        StressScenario(name="Mixed", description="Mixed", equity_shock=0.13, rate_shock=-37,
+                       credit_spread_shock=212, liquidity_shock=0.37)
+    ]
+    for s in scenarios:
+        assert simulate_scenario(p, s).model_dump() == simulate_scenario_reference(p, s).model_dump()
+
+def test_run_stress_test_accepts_packed_portfolio():
+    p = _random_portfolio(50)
+    frame = as_frame(p)
+    assert len(frame) == 50
+    packed = [r.model_dump() for r in run_stress_test(frame, SCENARIOS_DB)]
+    unpacked = [r.model_dump() for r in run_stress_test(p, SCENARIOS_DB)]
+    assert packed == unpacked
+
+def test_empty_portfolio():
+    p = Portfolio(positions=[], total_value=0, as_of_date="2024-01-01")
+    result = simulate_scenario(p, SCENARIOS_DB[0])
+    assert result.total_pnl == 0.0
+    assert result.position_impacts == {}